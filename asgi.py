@@ -0,0 +1,7 @@
+from hospital.asgi import create_asgi_app
+
+
+# ASGI entry point, e.g. `uvicorn asgi:app`. Uploads, downloads and /list/*
+# run as coroutines on an async database driver (aiosqlite / asyncpg); all
+# other routes are the same Flask views as app.py, run in a thread pool.
+app = create_asgi_app()
@@ -0,0 +1,134 @@
+"""Mixed read/write throughput across database backend settings.
+
+Usage: python benchmarks/bench_db_backend.py [--threads 16] [--seconds 10]
+                                              [--write-ratio 0.2] [--postgres URL]
+
+Compares default SQLite, tuned SQLite (WAL, synchronous=NORMAL, busy
+timeout, mmap) and, if a URL is given, pooled PostgreSQL. Reads are a
+doctor's appointments for a day; writes insert an appointment.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select  # noqa: E402
+
+from hospital.extensions import db  # noqa: E402
+from hospital.models import AppointmentFile, DoctorFile, PatientFile  # noqa: E402
+from hospital.database import engine_options, tune_sqlite  # noqa: E402
+
+DOCTORS = 50
+PATIENTS = 5000
+START = datetime(2020, 1, 1, 9)
+
+
+def seed(engine):
+    db.metadata.drop_all(engine)
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(DoctorFile.__table__.insert(), [
+            {"name": f"doctor{i}", "email": f"doctor{i}@hospital.test", "phone": 8000000000 + i,
+             "specialist": "general", "password": "x"}
+            for i in range(DOCTORS)
+        ])
+        conn.execute(PatientFile.__table__.insert(), [
+            {"name": f"patient{i}", "email": f"patient{i}@hospital.test", "gender": "others",
+             "age": 40, "password": "x"}
+            for i in range(PATIENTS)
+        ])
+        conn.execute(AppointmentFile.__table__.insert(), [
+            {"patient_id": random.randint(1, PATIENTS), "doctor_id": d + 1,
+             "appointment_time": START + timedelta(minutes=30 * i)}
+            for d in range(DOCTORS) for i in range(400)
+        ])
+
+
+def run(engine, threads, seconds, write_ratio):
+    table = AppointmentFile.__table__
+    counter = iter(range(10**9))
+    lock = threading.Lock()
+    latencies = {"read": [], "write": []}
+    deadline = time.perf_counter() + seconds
+
+    def worker():
+        local = {"read": [], "write": []}
+        while time.perf_counter() < deadline:
+            kind = "write" if random.random() < write_ratio else "read"
+            started = time.perf_counter()
+            try:
+                if kind == "write":
+                    with lock:
+                        n = next(counter)
+                    with engine.begin() as conn:
+                        conn.execute(table.insert().values(
+                            patient_id=random.randint(1, PATIENTS), doctor_id=random.randint(1, DOCTORS),
+                            appointment_time=START + timedelta(days=3650, minutes=30 * n),
+                        ))
+                else:
+                    day = START + timedelta(days=random.randint(0, 8))
+                    with engine.connect() as conn:
+                        conn.execute(select(table).where(
+                            table.c.doctor_id == random.randint(1, DOCTORS),
+                            table.c.appointment_time >= day,
+                            table.c.appointment_time < day + timedelta(days=1),
+                        )).all()
+            except Exception:
+                kind += "_error"
+                local.setdefault(kind, [])
+            local[kind].append(time.perf_counter() - started)
+        with lock:
+            for key, values in local.items():
+                latencies.setdefault(key, []).extend(values)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return latencies
+
+
+def p99(values):
+    values = sorted(values)
+    return values[int(len(values) * 0.99)] * 1000 if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--postgres", help="postgresql:// URL of a scratch database")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        setups = []
+        uri = f"sqlite:///{os.path.join(tmp, 'default.db')}"
+        setups.append(("sqlite-default", create_engine(uri)))
+        uri = f"sqlite:///{os.path.join(tmp, 'tuned.db')}"
+        tuned = create_engine(uri, **engine_options(uri, {}))
+        tune_sqlite(tuned)
+        setups.append(("sqlite-tuned", tuned))
+        if args.postgres:
+            setups.append(("postgresql-pooled", create_engine(args.postgres, **engine_options(args.postgres, {}))))
+
+        for name, engine in setups:
+            seed(engine)
+            latencies = run(engine, args.threads, args.seconds, args.write_ratio)
+            ops = len(latencies["read"]) + len(latencies["write"])
+            errors = sum(len(v) for k, v in latencies.items() if k.endswith("_error"))
+            print(f"{name:>18}: {ops / args.seconds:8.0f} ops/s  "
+                  f"read p99={p99(latencies['read']):7.2f}ms  write p99={p99(latencies['write']):7.2f}ms  "
+                  f"errors={errors}")
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
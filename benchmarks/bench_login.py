@@ -0,0 +1,112 @@
+"""Login lookup latency: three per-table queries vs. the login_identity index.
+
+Usage: python benchmarks/bench_login.py [--patients 1000000] [--lookups 2000]
+
+Seeds a throwaway SQLite database and times only the credential lookup,
+since password verification costs the same on both paths.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from hospital.extensions import db  # noqa: E402
+from hospital.models import AdminFile, PatientFile, DoctorFile, LoginIdentity, LOGIN_PRIORITY  # noqa: E402
+
+FAKE_HASH = "scrypt:32768:8:1$salt$" + "0" * 128
+
+
+def seed(engine, patients, doctors=500, admins=20):
+    db.metadata.create_all(engine)
+    batch = 50000
+    with engine.begin() as conn:
+        conn.execute(AdminFile.__table__.insert(), [
+            {"name": f"admin{i}", "email": f"admin{i}@hospital.test", "password": FAKE_HASH,
+             "role": "staff", "phone": str(9000000000 + i)}
+            for i in range(admins)
+        ])
+        conn.execute(DoctorFile.__table__.insert(), [
+            {"name": f"doctor{i}", "email": f"doctor{i}@hospital.test", "phone": 8000000000 + i,
+             "specialist": "general", "password": FAKE_HASH}
+            for i in range(doctors)
+        ])
+        for start in range(0, patients, batch):
+            conn.execute(PatientFile.__table__.insert(), [
+                {"name": f"patient{i}", "email": f"patient{i}@hospital.test", "gender": "others",
+                 "age": 40, "password": FAKE_HASH}
+                for i in range(start, min(start + batch, patients))
+            ])
+        identity = LoginIdentity.__table__
+        for model, user_type, pk in (
+            (AdminFile, "administrator", "admin_id"),
+            (PatientFile, "patient", "patient_id"),
+            (DoctorFile, "doctor", "doctor_id"),
+        ):
+            source = model.__table__
+            conn.execute(identity.insert().from_select(
+                ["email", "user_type", "user_id", "password"],
+                select(source.c.email, db.literal(user_type), source.c[pk], source.c.password),
+            ))
+
+
+def three_queries(session, email):
+    admin = session.execute(select(AdminFile).filter_by(email=email)).scalars().first()
+    patient = session.execute(select(PatientFile).filter_by(email=email)).scalars().first()
+    doctor = session.execute(select(DoctorFile).filter_by(email=email)).scalars().first()
+    return admin or patient or doctor
+
+
+def identity_lookup(session, email):
+    identities = session.execute(select(LoginIdentity).filter_by(email=email)).scalars().all()
+    identities.sort(key=lambda identity: LOGIN_PRIORITY.index(identity.user_type))
+    return identities[0] if identities else None
+
+
+def percentile(samples, pct):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def measure(engine, lookup, emails):
+    timings = []
+    with Session(engine) as session:
+        for email in emails:
+            start = time.perf_counter()
+            lookup(session, email)
+            timings.append((time.perf_counter() - start) * 1000)
+            session.expunge_all()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--patients", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        started = time.perf_counter()
+        seed(engine, args.patients)
+        print(f"seeded {args.patients} patients in {time.perf_counter() - started:.1f}s")
+
+        # Mostly patients, as in a real morning rush, plus some misses
+        emails = [f"patient{random.randrange(args.patients)}@hospital.test" for _ in range(args.lookups)]
+        emails += [f"doctor{random.randrange(500)}@hospital.test" for _ in range(args.lookups // 10)]
+        emails += [f"nobody{i}@hospital.test" for i in range(args.lookups // 10)]
+        random.shuffle(emails)
+
+        for name, lookup in (("three-query", three_queries), ("login_identity", identity_lookup)):
+            timings = measure(engine, lookup, emails)
+            print(f"{name:>15}: p50={percentile(timings, 50):.3f}ms p99={percentile(timings, 99):.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Slow-client capacity: sync WSGI workers vs the ASGI entry point.
+
+Usage: python benchmarks/bench_slow_clients.py [--slow 50] [--workers 4] [--mode upload]
+
+Opens --slow connections that trickle a file upload (or read a download)
+a few KiB at a time, then measures how quick requests fare meanwhile.
+Each server gets --workers request threads for Flask routes:
+
+  sync       gunicorn app:app, one sync worker process per request slot
+  async      uvicorn asgi:app; transfers are coroutines, Flask routes
+             share --workers threads
+
+A quick request that takes longer than --timeout counts as starved.
+Needs gunicorn and uvicorn installed (plus aiosqlite for asgi:app).
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+QUICK_REQUEST = "/search?q=patient1&scope=patients"
+SEED = (
+    "from hospital import create_app; from hospital.extensions import db; "
+    "from hospital.models import PatientFile; "
+    "app = create_app(); app.app_context().push(); db.create_all(); "
+    "db.session.add_all([PatientFile(name=f'patient{i}', email=f'patient{i}@hospital.test', "
+    "gender='others', age=40, password='x') for i in range(100)]); db.session.commit()"
+)
+SERVERS = {
+    "sync": lambda port, workers: ["gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                                   "--worker-class", "sync", "--timeout", "120", "app:app"],
+    "async": lambda port, workers: ["uvicorn", "--port", str(port), "--log-level", "warning", "asgi:app"],
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port, deadline=30):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/list/patients?limit=1", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def multipart(boundary, filename, size):
+    head = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+            "Content-Type: application/octet-stream\r\n\r\n").encode()
+    return head, os.urandom(size), f"\r\n--{boundary}--\r\n".encode()
+
+
+def upload_once(port, size):
+    boundary = "benchboundary"
+    body = b"".join(multipart(boundary, "seed.bin", size))
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/upload/1", data=body, method="POST",
+        headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
+    )
+    urllib.request.urlopen(request, timeout=60).read()
+
+
+async def slow_upload(port, size, rate, stop):
+    boundary = "benchboundary"
+    head, data, tail = multipart(boundary, "slow.bin", size)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        writer.write((f"POST /upload/1 HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+                      f"Content-Type: multipart/form-data; boundary={boundary}\r\n"
+                      f"Content-Length: {len(head) + len(data) + len(tail)}\r\n\r\n").encode() + head)
+        for i in range(0, len(data), rate):
+            if stop.is_set():
+                return
+            writer.write(data[i:i + rate])
+            await writer.drain()
+            await asyncio.sleep(1)
+        writer.write(tail)
+        await reader.read()
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def slow_download(port, rate, stop):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port, limit=rate)
+    try:
+        writer.write(b"GET /download/1 HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        while not stop.is_set():
+            if not await reader.read(rate):
+                return
+            await asyncio.sleep(1)
+    except OSError:
+        pass
+    finally:
+        writer.close()
+
+
+async def quick_requests(port, duration, timeout):
+    latencies, starved = [], 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(
+                lambda: urllib.request.urlopen(f"http://127.0.0.1:{port}{QUICK_REQUEST}", timeout=timeout).read()
+            ), timeout)
+            latencies.append(time.monotonic() - started)
+        except (OSError, asyncio.TimeoutError):
+            starved += 1
+        await asyncio.sleep(0.1)
+    return latencies, starved
+
+
+async def load(port, args):
+    stop = asyncio.Event()
+    if args.mode == "upload":
+        slow = [asyncio.create_task(slow_upload(port, args.size, args.rate, stop)) for _ in range(args.slow)]
+    else:
+        slow = [asyncio.create_task(slow_download(port, args.rate, stop)) for _ in range(args.slow)]
+    await asyncio.sleep(1)
+    latencies, starved = await quick_requests(port, args.duration, args.timeout)
+    stop.set()
+    await asyncio.gather(*slow, return_exceptions=True)
+    return latencies, starved
+
+
+def run(server, args, env):
+    port = free_port()
+    process = subprocess.Popen(SERVERS[server](port, args.workers), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(port)
+        # Download mode serves a file large enough not to fit in socket buffers
+        upload_once(port, args.size)
+        latencies, starved = asyncio.run(load(port, args))
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "server": server,
+        "slow_clients": args.slow,
+        "quick_requests": len(latencies) + starved,
+        "starved": starved,
+        "p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--slow", type=int, default=50)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--mode", choices=["upload", "download"], default="upload")
+    parser.add_argument("--size", type=int, default=20 * 1024 * 1024)
+    parser.add_argument("--rate", type=int, default=4096, help="bytes per second per slow client")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=2)
+    parser.add_argument("--servers", nargs="+", choices=sorted(SERVERS), default=sorted(SERVERS, reverse=True))
+    args = parser.parse_args()
+
+    for server in args.servers:
+        executable = SERVERS[server](0, 1)[0]
+        if shutil.which(executable) is None:
+            print(f"skipping {server}: {executable} is not installed")
+            continue
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "settings.py"), "w") as f:
+                f.write(f"BLOB_STORE_PATH = {os.path.join(tmp, 'blobs')!r}\n"
+                        f"ASGI_SYNC_WORKERS = {args.workers}\n")
+            env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'slow.db')}",
+                       HOSPITAL_SETTINGS=os.path.join(tmp, "settings.py"))
+            subprocess.run([sys.executable, "-c", SEED], cwd=ROOT, env=env, check=True)
+            print(json.dumps(run(server, args, env)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Worker startup cost: import time and time to first request.
+
+Usage: python benchmarks/bench_startup.py [--workers 4] [--runs 5]
+
+  import       fresh interpreter: `import hospital` and `create_app()`
+  preload      app built once in the parent, workers forked afterwards
+               (gunicorn --preload); measures fork -> first response
+  fork         workers forked first, each builds its own app (gunicorn's
+               default); measures fork -> first response
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRST_REQUEST = "/list/doctors"
+SCHEMA = (
+    "from hospital import create_app; from hospital.extensions import db; "
+    "app = create_app(); app.app_context().push(); db.create_all()"
+)
+
+
+def measure_import(runs):
+    code = (
+        "import time; t0 = time.perf_counter(); import hospital; t1 = time.perf_counter(); "
+        "app = hospital.create_app(); t2 = time.perf_counter(); "
+        "import json; print(json.dumps([t1 - t0, t2 - t1]))"
+    )
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+        samples.append(json.loads(out.stdout))
+    return samples
+
+
+def first_request(app):
+    response = app.test_client().get(FIRST_REQUEST)
+    assert response.status_code == 200, response.status_code
+
+
+def run_workers(workers, target):
+    # Fork `workers` children; each runs target() and reports seconds from
+    # fork to its first successful response through a pipe
+    results = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        started = time.perf_counter()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            try:
+                target()
+                os.write(write_fd, str(time.perf_counter() - started).encode())
+            finally:
+                os._exit(0)
+        os.close(write_fd)
+        with os.fdopen(read_fd) as pipe:
+            report = pipe.read()
+        if not report:
+            raise RuntimeError("worker failed before its first response")
+        results.append(float(report))
+        os.waitpid(pid, 0)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'startup.db')}"
+        subprocess.run([sys.executable, "-c", SCHEMA], cwd=ROOT, check=True)
+
+        samples = measure_import(args.runs)
+        print(f"import hospital: {1000 * sum(s[0] for s in samples) / len(samples):7.1f}ms")
+        print(f"create_app():    {1000 * sum(s[1] for s in samples) / len(samples):7.1f}ms")
+
+        def cold_worker():
+            from hospital import create_app
+            first_request(create_app())
+
+        # fork mode first, while this process has not imported the app yet
+        cold = run_workers(args.workers, cold_worker)
+
+        from hospital import create_app
+        app = create_app()
+        preload = run_workers(args.workers, lambda: first_request(app))
+
+        for name, values in (("fork", cold), ("preload", preload)):
+            print(f"{name:>8}: first response {1000 * sum(values) / len(values):7.1f}ms per worker "
+                  f"(max {1000 * max(values):.1f}ms)")
+
+
+if __name__ == "__main__":
+    main()
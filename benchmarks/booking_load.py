@@ -0,0 +1,101 @@
+"""Concurrent booking load test: many patients racing for the same slots.
+
+Usage: python benchmarks/booking_load.py [--bookings 5000] [--threads 32] [--workers 4]
+
+Each simulated worker process gets its own Scheduler (and so its own slot
+index), all sharing one SQLite database, and the run fails if any doctor
+ends up with two appointments in the same slot.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import scoped_session, sessionmaker  # noqa: E402
+
+from hospital.extensions import db  # noqa: E402
+from hospital.models import AppointmentFile, DoctorFile, PatientFile  # noqa: E402
+from hospital.scheduling import Scheduler, SlotUnavailable  # noqa: E402
+
+
+def seed(engine, doctors, patients):
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(DoctorFile.__table__.insert(), [
+            {"name": f"doctor{i}", "email": f"doctor{i}@hospital.test", "phone": 8000000000 + i,
+             "specialist": "general", "password": "x"}
+            for i in range(doctors)
+        ])
+        conn.execute(PatientFile.__table__.insert(), [
+            {"name": f"patient{i}", "email": f"patient{i}@hospital.test", "gender": "others",
+             "age": 40, "password": "x"}
+            for i in range(patients)
+        ])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bookings", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--doctors", type=int, default=5)
+    parser.add_argument("--days", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'load.db')}", connect_args={"timeout": 30})
+        seed(engine, args.doctors, 1000)
+        schedulers = [
+            Scheduler(scoped_session(sessionmaker(engine)), AppointmentFile, retries=20)
+            for _ in range(args.workers)
+        ]
+
+        # Few slots, many bookers: most requests contend for a taken slot
+        day = (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+        slots = [
+            day + timedelta(days=d, hours=h, minutes=m)
+            for d in range(args.days) for h in range(9, 17) for m in (0, 30)
+        ]
+
+        def book(_):
+            scheduler = random.choice(schedulers)
+            try:
+                scheduler.reserve(
+                    random.randint(1, 1000), random.randint(1, args.doctors), random.choice(slots)
+                )
+                return True
+            except SlotUnavailable:
+                return False
+            finally:
+                scheduler.session.remove()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(args.threads) as pool:
+            results = list(pool.map(book, range(args.bookings)))
+        elapsed = time.perf_counter() - started
+
+        with engine.connect() as conn:
+            doubles = conn.execute(
+                select(AppointmentFile.doctor_id, AppointmentFile.appointment_time)
+                .group_by(AppointmentFile.doctor_id, AppointmentFile.appointment_time)
+                .having(func.count() > 1)
+            ).all()
+            booked = conn.execute(select(func.count()).select_from(AppointmentFile)).scalar()
+
+        print(f"{args.bookings} attempts in {elapsed:.2f}s ({args.bookings / elapsed:.0f}/s)")
+        print(f"succeeded={sum(results)} rejected={len(results) - sum(results)} "
+              f"rows={booked} capacity={len(slots) * args.doctors}")
+        assert booked == sum(results), "booked rows do not match successful reservations"
+        assert not doubles, f"double bookings found: {doubles}"
+        print("no double bookings")
+
+
+if __name__ == "__main__":
+    main()
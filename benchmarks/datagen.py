@@ -0,0 +1,194 @@
+"""Synthetic hospital data for load tests.
+
+Usage: python benchmarks/datagen.py --database-url sqlite:///bench.db --blobs DIR
+                                    [--doctors 50] [--patients 5000] [--years 2]
+                                    [--fill 0.6] [--uploads 2000] [--upload-mb 500] [--seed 0]
+
+Seeds admins, doctors and patients (all sharing DATAGEN_PASSWORD, hashed
+once with the app's default method, so logins still pay for a real
+verify), treatments, appointments on weekday clinic slots from --years
+back to two weeks ahead, and patient uploads written to a blob store.
+Each doctor sees mostly their own panel of patients, so returning-patient
+figures look like a clinic's. Upload sizes are log-normal around 150 KiB
+(lab PDFs, photos) with a long tail of scans up to 25 MiB, capped at
+--upload-mb in total. Login identities, rollups and the search index are
+rebuilt at the end, as the bulk inserts skip the mapper events.
+
+The same --seed gives the same dataset, so runs stay comparable.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine  # noqa: E402
+from werkzeug.security import generate_password_hash  # noqa: E402
+
+from hospital import rollups, search  # noqa: E402
+from hospital.blobstore import LocalBlobStore  # noqa: E402
+from hospital.config import DEFAULTS  # noqa: E402
+from hospital.extensions import db  # noqa: E402
+from hospital.models import (  # noqa: E402
+    AdminFile, AppointmentFile, DoctorFile, PatientFile, TreatmentFile, Upload, rebuild_login_identity,
+)
+
+DATAGEN_PASSWORD = "bench-pass"
+# The login form's email validator rejects special-use TLDs such as .test
+DOMAIN = "hospital.example"
+ADMINS = 5
+BATCH = 20000
+SPECIALISTS = ["general", "cardiology", "dermatology", "neurology", "orthopedics", "pediatrics",
+               "psychiatry", "radiology", "oncology", "ent"]
+DIAGNOSES = ["seasonal influenza", "type 2 diabetes", "hypertension", "migraine", "lower back pain",
+             "fractured wrist", "asthma", "eczema", "anxiety disorder", "otitis media", "bronchitis",
+             "iron deficiency anaemia", "sprained ankle", "gastritis", "urinary tract infection"]
+FIRST_NAMES = ["asha", "bilal", "chen", "dara", "elena", "farid", "grace", "hiro", "ines", "jamal",
+               "kavya", "liam", "maya", "noor", "omar", "priya", "quinn", "rahul", "sara", "tomas"]
+# (filename pattern, leading magic bytes, weight)
+UPLOAD_KINDS = [
+    ("lab-{}.pdf", b"%PDF-1.7\n", 5),
+    ("photo-{}.jpg", b"\xff\xd8\xff\xe0", 3),
+    ("scan-{}.png", b"\x89PNG\r\n\x1a\n", 2),
+]
+UPLOAD_MEDIAN = 150 * 1024
+UPLOAD_SIGMA = 1.6
+UPLOAD_MIN, UPLOAD_MAX = 2 * 1024, 25 * 1024 * 1024
+
+
+def upload_size(rng, limit=UPLOAD_MAX):
+    return max(UPLOAD_MIN, min(int(rng.lognormvariate(math.log(UPLOAD_MEDIAN), UPLOAD_SIGMA)), limit))
+
+
+def upload_payload(rng, size, index):
+    name, magic, _ = rng.choices(UPLOAD_KINDS, weights=[k[2] for k in UPLOAD_KINDS])[0]
+    return name.format(index), magic + rng.randbytes(size - len(magic))
+
+
+def clinic_slots(day, config=DEFAULTS):
+    step = timedelta(minutes=config["APPOINTMENT_SLOT_MINUTES"])
+    slot = datetime.combine(day, datetime.min.time()).replace(hour=config["CLINIC_OPEN_HOUR"])
+    close = slot.replace(hour=config["CLINIC_CLOSE_HOUR"])
+    while slot < close:
+        yield slot
+        slot += step
+
+
+def clinic_days(start, end):
+    day = start
+    while day < end:
+        if day.weekday() < 5:
+            yield day
+        day += timedelta(days=1)
+
+
+def _insert(conn, table, rows):
+    for start in range(0, len(rows), BATCH):
+        conn.execute(table.insert(), rows[start:start + BATCH])
+
+
+def generate(engine, blob_root, doctors=50, patients=5000, years=2, fill=0.6, uploads=2000,
+             upload_mb=500, seed=0, today=None):
+    """Create the schema and seed it; returns a summary of what was written."""
+    rng = random.Random(seed)
+    today = today or date.today()
+    password = generate_password_hash(DATAGEN_PASSWORD, DEFAULTS["PASSWORD_HASH_METHOD"])
+    db.metadata.create_all(engine)
+
+    with engine.begin() as conn:
+        _insert(conn, AdminFile.__table__, [
+            {"name": f"admin{i}", "email": f"admin{i}@{DOMAIN}", "password": password,
+             "role": "staff", "phone": str(9000000000 + i)}
+            for i in range(ADMINS)
+        ])
+        _insert(conn, DoctorFile.__table__, [
+            {"name": f"dr {FIRST_NAMES[i % len(FIRST_NAMES)]} {i}", "email": f"doctor{i}@{DOMAIN}",
+             "phone": 8000000000 + i, "specialist": SPECIALISTS[i % len(SPECIALISTS)], "password": password}
+            for i in range(doctors)
+        ])
+        # Patient i belongs to doctor (i % doctors) + 1
+        _insert(conn, PatientFile.__table__, [
+            {"name": f"{rng.choice(FIRST_NAMES)} {i}", "email": f"patient{i}@{DOMAIN}",
+             "gender": rng.choice(["male", "female", "others"]), "age": rng.randint(1, 95),
+             "password": password, "doctor_id": i % doctors + 1}
+            for i in range(patients)
+        ])
+        _insert(conn, TreatmentFile.__table__, [
+            {"diagnosis": rng.choice(DIAGNOSES), "report_path": f"reports/{pid}-{n}.pdf", "patient_id": pid}
+            for pid in range(1, patients + 1) for n in range(rng.choice([0, 0, 1, 1, 2, 3]))
+        ])
+        rebuild_login_identity(conn)
+
+    # Appointments, one doctor at a time to bound memory
+    panels = [list(range(d + 1, patients + 1, doctors)) for d in range(doctors)]
+    days = list(clinic_days(today - timedelta(days=365 * years), today + timedelta(days=14)))
+    appointments = 0
+    for d in range(doctors):
+        rows = [
+            {"patient_id": rng.choice(panels[d]) if panels[d] and rng.random() < 0.75
+             else rng.randint(1, patients),
+             "doctor_id": d + 1, "appointment_time": slot, "description": rng.choice(DIAGNOSES)}
+            for day in days for slot in clinic_slots(day) if rng.random() < fill
+        ]
+        with engine.begin() as conn:
+            _insert(conn, AppointmentFile.__table__, rows)
+        appointments += len(rows)
+
+    store = LocalBlobStore(blob_root)
+    budget, stored, rows = upload_mb * 1024 * 1024, 0, []
+    started = datetime.now() - timedelta(days=365 * years)
+    for i in range(uploads):
+        size = upload_size(rng, UPLOAD_MAX)
+        if stored + size > budget:
+            break
+        filename, data = upload_payload(rng, size, i)
+        digest, size = store.put_bytes(data)
+        stored += size
+        rows.append({"filename": filename, "sha256": digest, "size": size,
+                     "patient_id": rng.randint(1, patients),
+                     "time": started + timedelta(seconds=rng.randrange(365 * years * 86400))})
+    with engine.begin() as conn:
+        _insert(conn, Upload.__table__, rows)
+        rollups.backfill(conn)
+        if conn.dialect.name in search.BACKENDS:
+            search.reindex(conn)
+
+    return {
+        "doctors": doctors,
+        "patients": patients,
+        "admins": ADMINS,
+        "appointments": appointments,
+        "uploads": len(rows),
+        "upload_bytes": stored,
+        "years": years,
+        "fill": fill,
+        "seed": seed,
+        "today": today.isoformat(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--blobs", required=True, help="blob store directory (BLOB_STORE_PATH)")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--fill", type=float, default=0.6, help="share of clinic slots booked")
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--upload-mb", type=int, default=500, help="cap on total upload bytes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    summary = generate(engine, args.blobs, args.doctors, args.patients, args.years, args.fill,
+                       args.uploads, args.upload_mb, args.seed)
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""Scripted user scenarios against a local server, stored per run.
+
+Usage: python benchmarks/loadtest.py [--server sync|async] [--workers 4] [--clients 32]
+                                     [--duration 30] [--scenarios login booking dashboard files api]
+                                     [--data DIR] [--label NAME] [--set KEY=VALUE ...]
+                                     [--compare latest|RUN.json] [--threshold 0.1]
+       python benchmarks/loadtest.py --diff OLD.json NEW.json
+
+Seeds a dataset with benchmarks/datagen.py (kept in --data for reuse; each
+run works on a fresh copy of the database so runs start from the same
+state), starts the server, then runs each scenario for --duration seconds
+with --clients concurrent keep-alive clients:
+
+  login      login storm: patients and doctors signing in, 5% wrong passwords
+  booking    booking rush: patients racing for the next days' slots of a
+             few popular doctors
+  dashboard  doctors and admins browsing dashboards, rosters, free slots,
+             stats, listings and reports
+  files      patient uploads (datagen size mix, capped by --max-upload-mb)
+             and downloads
+  api        integrations reading /api/v1: today's appointments, batch
+             patient lookups, treatments and upload metadata
+
+Throughput and latency percentiles per scenario and per endpoint go to
+--results/<run>.json along with the commit, server and settings. --compare
+checks them against an earlier run and reports a regression when
+throughput drops or p95 latency rises by more than --threshold; --diff does
+the same for two stored runs without running anything.
+
+CSRF checks are turned off on the server under test so the form posts do
+not need a page fetch first, and so is the per-IP login limit, as every
+client comes from 127.0.0.1 (per-email limits still apply). --set passes extra config, e.g.
+--set CACHE_BACKEND='"redis"'. Needs gunicorn (sync) or uvicorn (async).
+"""
+import argparse
+import glob
+import http.client
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from sqlalchemy import create_engine, select  # noqa: E402
+
+from benchmarks.datagen import (  # noqa: E402
+    DATAGEN_PASSWORD, DOMAIN, clinic_days, clinic_slots, generate, upload_size,
+)
+from hospital.models import DoctorFile, DoctorPatientLoad, Upload  # noqa: E402
+
+SERVERS = {
+    "sync": lambda port, workers: ["gunicorn", "--bind", f"127.0.0.1:{port}", "--workers", str(workers),
+                                   "--worker-class", "sync", "--timeout", "120", "app:app"],
+    "async": lambda port, workers: ["uvicorn", "--port", str(port), "--log-level", "warning", "asgi:app"],
+}
+RESULTS = os.path.join(ROOT, "benchmarks", "results")
+BOUNDARY = "loadtestboundary"
+SAMPLE = 2000
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(port, deadline=60):
+    started = time.monotonic()
+    while time.monotonic() - started < deadline:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/list/doctors?limit=1", timeout=1).read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+
+def percentile(samples, pct):
+    return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+
+def load_sample(database_url, rng):
+    # Ids the scenarios pick from, read before the server starts
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        doctors = conn.execute(select(DoctorFile.doctor_id)).scalars().all()
+        patients = conn.execute(select(DoctorPatientLoad.patient_id).distinct()).scalars().all()
+        pairs = conn.execute(select(DoctorPatientLoad.doctor_id, DoctorPatientLoad.patient_id)).all()
+        uploads = conn.execute(select(Upload.id)).scalars().all()
+    engine.dispose()
+    return {
+        "doctors": doctors,
+        "patients": rng.sample(patients, min(SAMPLE, len(patients))),
+        "pairs": [tuple(p) for p in rng.sample(pairs, min(SAMPLE, len(pairs)))],
+        "uploads": uploads,
+    }
+
+
+# Each scenario step returns (endpoint, method, path, body, headers)
+
+def form(fields):
+    return urllib.parse.urlencode(fields).encode(), {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+def login_step(rng, ctx):
+    if rng.random() < 0.9:
+        email = f"patient{rng.choice(ctx['patients']) - 1}@{DOMAIN}"
+    else:
+        email = f"doctor{rng.choice(ctx['doctors']) - 1}@{DOMAIN}"
+    password = DATAGEN_PASSWORD if rng.random() >= 0.05 else "wrong-password"
+    body, headers = form({"email": email, "password": password})
+    return "POST /login", "POST", "/login", body, headers
+
+
+def booking_step(rng, ctx):
+    body, headers = form({
+        "doctor_id": rng.choice(ctx["popular"]),
+        "appointment_time": rng.choice(ctx["slots"]).strftime("%Y-%m-%dT%H:%M"),
+        "description": "load test booking",
+    })
+    patient_id = rng.choice(ctx["patients"])
+    return "POST /book_appointment/<id>", "POST", f"/book_appointment/{patient_id}", body, headers
+
+
+DASHBOARD = [
+    (30, "GET /doctor/<id>", lambda rng, ctx: f"/doctor/{rng.choice(ctx['doctors'])}"),
+    (15, "GET /doctor/<id>/patients", lambda rng, ctx: f"/doctor/{rng.choice(ctx['doctors'])}/patients"),
+    (10, "GET /allPatients/<id>", lambda rng, ctx: f"/allPatients/{rng.choice(ctx['doctors'])}"),
+    (10, "GET /doctor/<id>/slots", lambda rng, ctx: f"/doctor/{rng.choice(ctx['doctors'])}/slots?n=10"),
+    (10, "GET /report/<doc>/<id>", lambda rng, ctx: "/report/{}/{}".format(*rng.choice(ctx["pairs"]))),
+    (10, "GET /list/appointments", lambda rng, ctx: "/list/appointments?limit=50"),
+    (5, "GET /admin/stats", lambda rng, ctx: "/admin/stats"),
+    (5, "GET /administrator", lambda rng, ctx: "/administrator"),
+    (5, "GET /search", lambda rng, ctx: f"/search?q=patient{rng.choice(ctx['patients'])}"),
+]
+
+
+def dashboard_step(rng, ctx):
+    _, endpoint, path = rng.choices(DASHBOARD, weights=[w for w, _, _ in DASHBOARD])[0]
+    return endpoint, "GET", path(rng, ctx), None, {}
+
+
+def files_step(rng, ctx):
+    if rng.random() < 0.3:
+        filename, payload = rng.choice(ctx["payloads"])
+        # A fresh prefix per request keeps content-addressed storage from deduplicating
+        head = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+                "Content-Type: application/octet-stream\r\n\r\n").encode()
+        body = b"".join([head, rng.randbytes(16), payload, f"\r\n--{BOUNDARY}--\r\n".encode()])
+        headers = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+        return "POST /upload/<id>", "POST", f"/upload/{rng.choice(ctx['patients'])}", body, headers
+    return "GET /download/<id>", "GET", f"/download/{rng.choice(ctx['uploads'])}", None, {}
+
+
+API = [
+    (30, "GET /api/v1/appointments", lambda rng, ctx: "/api/v1/appointments?doctor_id={}&from={}&limit=50"
+     "&fields=appointment_id,patient_id,appointment_time".format(rng.choice(ctx["doctors"]), date.today())),
+    (30, "GET /api/v1/patients?ids=", lambda rng, ctx: "/api/v1/patients?fields=patient_id,name,age&ids="
+     + ",".join(str(i) for i in rng.sample(ctx["patients"], min(20, len(ctx["patients"]))))),
+    (20, "GET /api/v1/treatments", lambda rng, ctx: f"/api/v1/treatments?patient_id={rng.choice(ctx['patients'])}"),
+    (20, "GET /api/v1/uploads", lambda rng, ctx: f"/api/v1/uploads?patient_id={rng.choice(ctx['patients'])}"),
+]
+
+
+def api_step(rng, ctx):
+    _, endpoint, path = rng.choices(API, weights=[w for w, _, _ in API])[0]
+    return endpoint, "GET", path(rng, ctx), None, {}
+
+
+SCENARIOS = {
+    "login": login_step,
+    "booking": booking_step,
+    "dashboard": dashboard_step,
+    "files": files_step,
+    "api": api_step,
+}
+
+
+def scenario_context(sample, rng, args):
+    # Booking rush: a handful of popular doctors, the next few clinic days
+    today = date.today()
+    days = list(clinic_days(today + timedelta(days=1), today + timedelta(days=8)))[:args.rush_days]
+    payloads = []
+    for i in range(8):
+        size = upload_size(rng, args.max_upload_mb * 1024 * 1024)
+        payloads.append((f"upload-{i}.pdf", rng.randbytes(size)))
+    return dict(
+        sample,
+        popular=sample["doctors"][:args.rush_doctors],
+        slots=[slot for day in days for slot in clinic_slots(day)],
+        payloads=payloads,
+    )
+
+
+def client(port, step, ctx, seed, deadline, record):
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+    while time.monotonic() < deadline:
+        endpoint, method, path, body, headers = step(rng, ctx)
+        started = time.perf_counter()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            while response.read(64 * 1024):
+                pass
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            status = None
+        record(endpoint, status, time.perf_counter() - started)
+    conn.close()
+
+
+def run_scenario(port, name, ctx, args):
+    samples = []
+    lock = threading.Lock()
+
+    def record(endpoint, status, elapsed):
+        with lock:
+            samples.append((endpoint, status, elapsed))
+
+    def ignore(endpoint, status, elapsed):
+        pass
+
+    for duration, sink in ((args.warmup, ignore), (args.duration, record)):
+        if duration <= 0:
+            continue
+        deadline = time.monotonic() + duration
+        threads = [
+            threading.Thread(target=client, args=(port, SCENARIOS[name], ctx, f"{name}:{args.seed}:{i}",
+                                                  deadline, sink))
+            for i in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed)
+
+
+def summarize(samples, elapsed):
+    def stats(rows):
+        latencies = sorted(s[2] for s in rows)
+        errors = sum(1 for _, status, _ in rows if status is None or status >= 500)
+        result = {"requests": len(rows), "errors": errors, "rps": round(len(rows) / elapsed, 1)}
+        if latencies:
+            result.update({
+                f"p{pct}_ms": round(percentile(latencies, pct) * 1000, 2) for pct in (50, 90, 95, 99)
+            })
+            result["max_ms"] = round(latencies[-1] * 1000, 2)
+        return result
+
+    by_endpoint = defaultdict(list)
+    for row in samples:
+        by_endpoint[row[0]].append(row)
+    result = stats(samples)
+    result["seconds"] = round(elapsed, 2)
+    result["status"] = {str(k): v for k, v in sorted(Counter(s[1] for s in samples).items(), key=str)}
+    result["endpoints"] = {endpoint: stats(rows) for endpoint, rows in sorted(by_endpoint.items())}
+    return result
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("-dirty" if dirty else "")
+
+
+def prepare_data(args):
+    # Generate once into --data; reused as long as dataset.json is there
+    manifest = os.path.join(args.data, "dataset.json")
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            return json.load(f)
+    os.makedirs(args.data, exist_ok=True)
+    engine = create_engine(f"sqlite:///{os.path.join(args.data, 'hospital.db')}")
+    started = time.perf_counter()
+    dataset = generate(engine, os.path.join(args.data, "blobs"), args.doctors, args.patients, args.years,
+                       args.fill, args.uploads, args.upload_mb, args.seed)
+    engine.dispose()
+    print(f"generated dataset in {time.perf_counter() - started:.1f}s: {json.dumps(dataset)}")
+    with open(manifest, "w") as f:
+        json.dump(dataset, f)
+    return dataset
+
+
+def run(args):
+    dataset = prepare_data(args)
+    started_at = datetime.now()
+    settings = dict(kv.split("=", 1) for kv in args.set)
+    with tempfile.TemporaryDirectory() as tmp:
+        database = os.path.join(tmp, "hospital.db")
+        shutil.copyfile(os.path.join(args.data, "hospital.db"), database)
+        with open(os.path.join(tmp, "settings.py"), "w") as f:
+            f.write(f"BLOB_STORE_PATH = {os.path.join(args.data, 'blobs')!r}\n"
+                    f"ASGI_SYNC_WORKERS = {args.workers}\n"
+                    "WTF_CSRF_ENABLED = False\n"
+                    "LOGIN_LIMIT_PER_IP = None\n")
+            for key, value in settings.items():
+                f.write(f"{key} = {value}\n")
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{database}",
+                   HOSPITAL_SETTINGS=os.path.join(tmp, "settings.py"))
+
+        rng = random.Random(args.seed)
+        ctx = scenario_context(load_sample(env["DATABASE_URL"], rng), rng, args)
+        port = free_port()
+        process = subprocess.Popen(SERVERS[args.server](port, args.workers), cwd=ROOT, env=env,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            scenarios = {}
+            for name in args.scenarios:
+                scenarios[name] = run_scenario(port, name, ctx, args)
+                print(f"{name:10} {scenarios[name]['rps']:>8} req/s  p50 {scenarios[name].get('p50_ms')} ms  "
+                      f"p95 {scenarios[name].get('p95_ms')} ms  errors {scenarios[name]['errors']}")
+        finally:
+            process.terminate()
+            process.wait()
+
+    run_id = started_at.strftime("%Y%m%dT%H%M%S") + f"-{args.server}" + (f"-{args.label}" if args.label else "")
+    return {
+        "run": run_id,
+        "label": args.label,
+        "started_at": started_at.isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "server": args.server,
+        "workers": args.workers,
+        "clients": args.clients,
+        "duration": args.duration,
+        "settings": settings,
+        "dataset": dataset,
+        "host": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "scenarios": scenarios,
+    }
+
+
+def latest_run(results, current):
+    # Most recent earlier run on the same server
+    candidates = []
+    for path in glob.glob(os.path.join(results, "*.json")):
+        with open(path) as f:
+            data = json.load(f)
+        if data["run"] != current["run"] and data["server"] == current["server"]:
+            candidates.append((data["started_at"], path))
+    return max(candidates)[1] if candidates else None
+
+
+def compare(baseline, current, threshold):
+    """Print per-scenario changes; returns the regressed scenario names."""
+    print(f"baseline {baseline['run']} ({baseline['commit']}) -> {current['run']} ({current['commit']})")
+    regressions = []
+    for name, now in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if not before or not before["requests"] or not now["requests"]:
+            print(f"{name:10} no baseline")
+            continue
+        rps = now["rps"] / before["rps"] - 1
+        p95 = now["p95_ms"] / before["p95_ms"] - 1
+        regressed = rps < -threshold or p95 > threshold
+        if regressed:
+            regressions.append(name)
+        print(f"{name:10} rps {before['rps']} -> {now['rps']} ({rps:+.1%})  "
+              f"p95 {before['p95_ms']} -> {now['p95_ms']} ms ({p95:+.1%})"
+              + ("  REGRESSION" if regressed else ""))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=sorted(SERVERS), default="sync")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--data", default=os.path.join(tempfile.gettempdir(), "hospital-loadtest"),
+                        help="dataset directory, generated on first use")
+    parser.add_argument("--doctors", type=int, default=50)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--fill", type=float, default=0.6)
+    parser.add_argument("--uploads", type=int, default=2000)
+    parser.add_argument("--upload-mb", type=int, default=500)
+    parser.add_argument("--max-upload-mb", type=int, default=5, help="largest file the files scenario posts")
+    parser.add_argument("--rush-doctors", type=int, default=3)
+    parser.add_argument("--rush-days", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra server config; VALUE is a Python literal")
+    parser.add_argument("--label", default="")
+    parser.add_argument("--results", default=RESULTS)
+    parser.add_argument("--compare", metavar="latest|RUN.json")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--diff", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.diff:
+        runs = []
+        for path in args.diff:
+            with open(path) as f:
+                runs.append(json.load(f))
+        sys.exit(1 if compare(*runs, args.threshold) else 0)
+
+    executable = SERVERS[args.server](0, 1)[0]
+    if shutil.which(executable) is None:
+        sys.exit(f"{args.server} needs {executable} installed")
+
+    result = run(args)
+    os.makedirs(args.results, exist_ok=True)
+    path = os.path.join(args.results, f"{result['run']}.json")
+    with open(path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"saved {path}")
+
+    if args.compare:
+        baseline = latest_run(args.results, result) if args.compare == "latest" else args.compare
+        if baseline is None:
+            print("no earlier run to compare against")
+            return
+        with open(baseline) as f:
+            regressions = compare(json.load(f), result, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
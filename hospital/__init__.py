@@ -0,0 +1,130 @@
+import math
+import os
+import secrets
+
+from flask import Flask, url_for
+
+from .config import DEFAULTS
+from .extensions import db
+
+
+BLUEPRINTS = ("auth", "admin", "doctor", "patient", "files", "search", "jobs", "uploads", "api", "archive")
+
+
+def create_app(config=None):
+    # Templates and static files live next to app.py, one level up
+    app = Flask(__name__, template_folder="../templates", static_folder="../static")
+    app.config.from_mapping(DEFAULTS)
+    app.config["BLOB_STORE_PATH"] = os.path.join(app.instance_path, "blobs")
+    app.config["UPLOAD_SPOOL_PATH"] = os.path.join(app.instance_path, "upload_spool")
+    app.config.from_envvar("HOSPITAL_SETTINGS", silent=True)
+    if config is not None:
+        app.config.from_mapping(config)
+    if not app.config["SECRET_KEY"]:
+        app.config["SECRET_KEY"] = _instance_secret_key(app.instance_path)
+    if app.config["TRUSTED_PROXIES"]:
+        # Otherwise remote_addr is the proxy's, and every client shares one
+        # per-IP login bucket
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        hops = app.config["TRUSTED_PROXIES"]
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops, x_host=hops)
+
+    # DATABASE_URL selects the backend; defaults to sqlite:///app_user.db
+    from .database import configure_database, init_engine
+    configure_database(app.config)
+    db.init_app(app)
+    init_engine(app, db)
+
+    from .querycount import init_query_counter
+    from .instrumentation import init_instrumentation
+    init_query_counter(app)
+    with app.app_context():
+        metrics = init_instrumentation(app, db.engine)
+    # Only report hasher stats once something has started the pool
+    metrics.gauges["password_hasher"] = lambda: (
+        app.extensions["hasher"].stats() if "hasher" in app.extensions else {}
+    )
+    metrics.gauges["cache"] = lambda: (
+        app.extensions["cache"].stats() if "cache" in app.extensions else {}
+    )
+    metrics.gauges["rate_limiter"] = lambda: (
+        app.extensions["rate_limiter"].stats() if "rate_limiter" in app.extensions else {}
+    )
+
+    if app.config["SESSION_BACKEND"] != "cookie":
+        from .extensions import session_store
+        from .sessions import ServerSessionInterface
+        app.session_interface = ServerSessionInterface(session_store)
+
+    register_error_handlers(app)
+    register_blueprints(app)
+
+    # After the blueprints, so their migrations.backfills hooks are registered
+    from .migrations import db_upgrade_command, upgrade_database
+    app.cli.add_command(db_upgrade_command)
+    if app.config["DB_AUTO_UPGRADE"]:
+        with app.app_context():
+            changes, conflicts = upgrade_database(db.engine)
+            for change in changes:
+                app.logger.info("schema upgrade: %s", change)
+            for conflict in conflicts:
+                app.logger.warning("schema upgrade: %s", conflict)
+    return app
+
+
+def _instance_secret_key(instance_path):
+    # Shared by every worker on this host and kept across restarts;
+    # O_EXCL makes concurrent first starts agree on one key
+    path = os.path.join(instance_path, "secret_key")
+    os.makedirs(instance_path, exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        with open(path) as f:
+            return f.read().strip()
+    with os.fdopen(fd, "w") as f:
+        key = secrets.token_hex(32)
+        f.write(key)
+    return key
+
+
+def register_error_handlers(app):
+    from .hashing import HasherBusy
+    from .pagination import InvalidPageRequest
+    from .ratelimit import RateLimited
+
+    @app.errorhandler(InvalidPageRequest)
+    def invalid_page_request(e):
+        return f"Invalid listing parameters: {e}", 400
+
+    @app.errorhandler(HasherBusy)
+    def hasher_busy(e):
+        return "Server is busy, please try again shortly.", 503, {"Retry-After": "1"}
+
+    @app.errorhandler(RateLimited)
+    def rate_limited(e):
+        retry_after = str(max(1, math.ceil(e.retry_after)))
+        return "Too many login attempts, please try again later.", 429, {"Retry-After": retry_after}
+
+
+def register_blueprints(app):
+    from importlib import import_module
+
+    legacy = {}
+    for name in BLUEPRINTS:
+        module = import_module(f".{name}", __name__)
+        app.register_blueprint(module.bp)
+        legacy.update({
+            endpoint.split(".", 1)[1]: endpoint
+            for endpoint in app.view_functions
+            if endpoint.startswith(f"{name}.")
+        })
+
+    # Templates predate the blueprints and still call url_for('log') etc.;
+    # resolve those old endpoint names to their blueprint equivalents
+    def build_legacy_endpoint(error, endpoint, values):
+        if endpoint in legacy:
+            return url_for(legacy[endpoint], **values)
+        return None
+
+    app.url_build_error_handlers.append(build_legacy_endpoint)
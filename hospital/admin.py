@@ -0,0 +1,335 @@
+import os
+from datetime import date, datetime
+from importlib.util import find_spec
+
+import click
+from flask import Blueprint, current_app, render_template, flash, redirect, url_for, request
+from werkzeug.datastructures import MultiDict
+
+from .extensions import db, hasher
+from .forms import SignupForm, DoctorForm
+from .importer import Importer, ImportSpec, RowError, spool_upload
+from .listings import LISTINGS, list_page, listing_for, cached_list_page
+from .migrations import duplicate_groups
+from .rollups import backfill, dashboard_stats, record_imported, stats
+from .search import index_patients_by_email
+from .models import AdminFile, DoctorFile, PatientFile, AppointmentFile, LoginIdentity, LOGIN_SOURCES
+
+
+bp = Blueprint("admin", __name__, cli_group=None)
+
+
+@bp.route("/administrator")
+def administrator():
+    return render_template("ADMIN/administrator.html", stats=dashboard_stats(db.session))
+
+
+@bp.route("/admin/stats")
+def admin_stats():
+    # Served from the appointment rollups; ?from=&to= are ISO dates, to exclusive
+    try:
+        start, end = (date.fromisoformat(request.args[arg]) if request.args.get(arg) else None
+                      for arg in ("from", "to"))
+        doctor_id = int(request.args["doctor_id"]) if request.args.get("doctor_id") else None
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    return stats(db.session, start, end, doctor_id)
+
+
+def _form_errors(form):
+    return "; ".join(f"{field}: {', '.join(messages)}" for field, messages in form.errors.items())
+
+
+def _validate_patient_row(row):
+    # Same rules as the signup page
+    data = dict(row)
+    data.setdefault("confirm_password", data.get("password"))
+    form = SignupForm(formdata=MultiDict(data), meta={"csrf": False})
+    if not form.validate():
+        raise RowError(_form_errors(form))
+    if not form.gender.data or form.age.data is None:
+        raise RowError("gender and age are required")
+    return {"name": form.name.data, "email": form.email.data, "gender": form.gender.data,
+            "age": form.age.data, "password": form.password.data}
+
+
+def _validate_doctor_row(row):
+    form = DoctorForm(formdata=MultiDict(dict(row)), meta={"csrf": False})
+    if not form.validate():
+        raise RowError(_form_errors(form))
+    return {"name": form.name.data, "email": form.email.data, "phone": form.phone.data,
+            "specialist": form.specialist.data, "password": form.password.data}
+
+
+def _validate_appointment_row(row):
+    try:
+        return {
+            "patient_id": int(row["patient_id"]),
+            "doctor_id": int(row["doctor_id"]),
+            "appointment_time": datetime.fromisoformat(row["appointment_time"]),
+            "description": (row.get("description") or None),
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise RowError(f"invalid appointment: {e}")
+
+
+def _index_imported_logins(model):
+    # Bulk inserts skip mapper events, so add login_identity rows directly
+    user_type, pk = LOGIN_SOURCES[model]
+    source = model.__table__
+
+    def after_chunk(session, rows):
+        session.execute(LoginIdentity.__table__.insert().from_select(
+            ["email", "user_type", "user_id", "password"],
+            db.select(
+                db.func.lower(db.func.trim(source.c.email)),
+                db.literal(user_type),
+                source.c[pk],
+                source.c.password,
+            ).where(source.c.email.in_([row["email"] for row in rows])),
+        ))
+        if model is PatientFile:
+            index_patients_by_email(session.connection(), [row["email"] for row in rows])
+    return after_chunk
+
+
+IMPORT_SPECS = {
+    "patients": ImportSpec(PatientFile, _validate_patient_row, unique="email", password="password",
+                           after_chunk=_index_imported_logins(PatientFile)),
+    "doctors": ImportSpec(DoctorFile, _validate_doctor_row, unique="email", password="password",
+                          after_chunk=_index_imported_logins(DoctorFile)),
+    "appointments": ImportSpec(AppointmentFile, _validate_appointment_row,
+                               references={"patient_id": PatientFile.patient_id, "doctor_id": DoctorFile.doctor_id},
+                               after_chunk=lambda session, rows: record_imported(session.connection(), rows)),
+}
+
+
+@bp.cli.command("import")
+@click.argument("kind", type=click.Choice(sorted(IMPORT_SPECS)))
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--chunk-size", type=int, default=None, help="Rows per transaction.")
+@click.option("--restart", is_flag=True, help="Ignore the saved checkpoint and error report.")
+def import_command(kind, path, chunk_size, restart):
+    """Bulk import doctors, patients or appointments from CSV or JSON lines."""
+    importer = Importer(db.session, hasher, chunk_size or current_app.config["IMPORT_CHUNK_SIZE"])
+    summary = importer.run(IMPORT_SPECS[kind], path, restart=restart)
+    print(f"Imported {summary['imported']}, skipped {summary['skipped']} already-imported rows, "
+          f"{summary['failed']} failed")
+    if summary["error_report"]:
+        print(f"Errors written to {summary['error_report']}")
+
+
+@bp.cli.command("rollups-backfill")
+@click.option("--since", type=click.DateTime(formats=["%Y-%m-%d"]), default=None,
+              help="Only rebuild daily counts from this date on.")
+@click.option("--engine", type=click.Choice(["auto", "sql", "pandas"]), default="auto",
+              help="Aggregate in the database or with pandas (auto: pandas if installed).")
+def rollups_backfill(since, engine):
+    """Rebuild the appointment rollup tables from appointment_file."""
+    if engine == "auto":
+        engine = "pandas" if find_spec("pandas") else "sql"
+    with db.engine.begin() as conn:
+        rows = backfill(conn, since.date() if since else None, engine=engine)
+    print(f"Rolled up {rows} appointments ({engine})")
+
+
+@bp.cli.command("appointments-double-booked")
+@click.option("--cancel-later", is_flag=True,
+              help="Keep the first booking of each doctor and time and delete the others.")
+def appointments_double_booked(cancel_later):
+    """List appointments sharing a doctor and start time (booked before the unique constraint existed)."""
+    constraint = next(c for c in AppointmentFile.__table__.constraints if c.name == "uq_appointment_doctor_time")
+    groups = duplicate_groups(db.session.connection(), constraint)
+    cancelled = 0
+    for doctor_id, appointment_time, _ in groups:
+        appointments = (AppointmentFile.query.filter_by(doctor_id=doctor_id, appointment_time=appointment_time)
+                        .order_by(AppointmentFile.appointment_id).all())
+        print(f"doctor {doctor_id} at {appointment_time}: " + ", ".join(
+            f"appointment {a.appointment_id} (patient {a.patient_id})" for a in appointments))
+        if cancel_later:
+            # Through the ORM, so the rollups and caches follow
+            for appointment in appointments[1:]:
+                db.session.delete(appointment)
+                cancelled += 1
+    db.session.commit()
+    print(f"{len(groups)} double-booked slots" + (f"; cancelled {cancelled} appointments" if cancel_later else ""))
+
+
+@bp.route("/admin/import/<kind>", methods=["POST"])
+def import_upload(kind):
+    if kind not in IMPORT_SPECS:
+        return {"error": f"unknown import {kind!r}"}, 404
+    file = request.files.get("file")
+    if not file:
+        return {"error": "No file uploaded!"}, 400
+    extension = os.path.splitext(file.filename or "")[1].lower() or ".csv"
+    path = spool_upload(file.stream, os.path.join(current_app.instance_path, "imports"), extension)
+    importer = Importer(db.session, hasher, current_app.config["IMPORT_CHUNK_SIZE"])
+    return importer.run(IMPORT_SPECS[kind], path, restart=request.args.get("restart") == "1")
+
+
+@bp.route("/list/<resource>")
+def list_resource(resource):
+    if resource not in LISTINGS:
+        return {"error": f"unknown listing {resource!r}"}, 404
+    listing = listing_for(resource)
+    page = listing.page(request.args, limit=current_app.config["PAGE_SIZE"])
+    return {
+        "items": [listing.to_dict(row) for row in page.items],
+        "next_cursor": page.next_cursor,
+        "sort": page.sort,
+        "limit": page.limit,
+    }
+
+
+@bp.route("/receptionist")
+def reception():
+    return render_template("receptionist.html")
+
+
+@bp.route("/addAdmin", methods=["GET", "POST"])
+def addAdmin():
+    if request.method == "POST":
+        name = request.form.get('name', '')
+        email = request.form.get('email', '')
+        password = request.form.get('password', '')
+        role = request.form.get('role', '')
+        phone = request.form.get('phone', '')
+        is_active = bool(request.form.get('is_active', '0'))  # Default to inactive
+
+        # Validate required fields
+        if not (name and email and password and role and phone):
+            flash("All fields are required.", "danger")
+            return redirect(url_for('admin.addAdmin'))
+
+        # Hash the password
+        hashed_password = hasher.hash(password)
+
+        # Add new admin to the database
+        new_admin = AdminFile(
+            name=name,
+            email=email,
+            password=hashed_password,
+            role=role,
+            phone=int(phone),
+            is_active=is_active,
+            last_login=datetime.utcnow()
+        )
+        try:
+            db.session.add(new_admin)
+            db.session.commit()
+            flash("Admin added successfully!", "success")
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Error: {str(e)}", "danger")
+
+    # Retrieve all admins to display on the page
+    page = list_page("admins")
+    return render_template("ADMIN/add_admin.html", admins=page.items, page=page)
+
+
+@bp.route('/manageAdmin', methods=['GET', 'POST'])
+def manage_admin():
+    if request.method == 'POST':
+        action = request.form['action']
+
+        if action.startswith('edit_'):
+            admin_id = int(action.split('_')[1])
+            admin = AdminFile.query.get(admin_id)
+
+            # Update admin details
+            admin.name = request.form[f'name_{admin_id}']
+            admin.email = request.form[f'email_{admin_id}']
+            admin.role = request.form[f'role_{admin_id}']
+            admin.phone = request.form[f'phone_{admin_id}']
+            admin.is_active = bool(int(request.form[f'is_active_{admin_id}']))
+
+            db.session.commit()
+            flash('Admin details updated successfully!', 'success')
+
+        elif action.startswith('delete_'):
+            admin_id = int(action.split('_')[1])
+            admin = AdminFile.query.get(admin_id)
+
+            # Delete the selected admin
+            db.session.delete(admin)
+            db.session.commit()
+            flash('Admin deleted successfully!', 'success')
+
+        return redirect('/manageAdmin')
+
+    # GET request: Fetch all admins from the database
+    page = list_page("admins")
+    return render_template('Admin/admin_management.html', admins=page.items, page=page)
+
+
+
+
+
+
+@bp.route('/addDoctor', methods=['GET', 'POST'])
+def add_doctor():
+    if request.method == 'POST':
+        # Get data from the form
+        name = request.form['name']
+        email = request.form['email']
+        password = request.form['password']
+        phone = request.form['phone']
+        specialist = request.form['specialist']
+
+
+        hashed_password = hasher.hash(password)
+
+        # Create a new doctor record
+        new_doctor = DoctorFile(
+            name=name,
+            email=email,
+            password=hashed_password,
+            phone=phone,
+            specialist=specialist
+        )
+        db.session.add(new_doctor)
+        db.session.commit()
+        flash('Doctor added successfully!', 'success')
+
+        return redirect('/addDoctor')
+
+    # Retrieve all doctors from the database
+    page = cached_list_page("doctors", ["doctors"])
+    return render_template('ADMIN/add_doctor.html', doctors=page.items, page=page)
+
+
+
+@bp.route('/manageDoctor', methods=['GET', 'POST'])
+def manage_doctor():
+    if request.method == 'POST':
+        # Get action from the form submission
+        action = request.form['action']
+
+        if action.startswith('edit_'):
+            doctor_id = int(action.split('_')[1])
+            doctor = DoctorFile.query.get(doctor_id)
+
+            # Update the doctor information
+            doctor.name = request.form[f'name_{doctor_id}']
+            doctor.email = request.form[f'email_{doctor_id}']
+            doctor.phone = request.form[f'phone_{doctor_id}']
+            doctor.specialist = request.form[f'specialist_{doctor_id}']
+
+            db.session.commit()
+            flash('Doctor information updated successfully!', 'success')
+
+        elif action.startswith('delete_'):
+            doctor_id = int(action.split('_')[1])
+            doctor = DoctorFile.query.get(doctor_id)
+
+            # Delete the doctor from the database
+            db.session.delete(doctor)
+            db.session.commit()
+            flash('Doctor deleted successfully!', 'success')
+
+        return redirect('/manageDoctor')
+
+    # GET request: Fetch all doctors from the database
+    page = cached_list_page("doctors", ["doctors"])
+    return render_template('ADMIN/doctor_management.html', doctors=page.items, page=page)
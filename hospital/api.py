@@ -0,0 +1,140 @@
+import json
+from datetime import datetime
+
+from flask import Blueprint, Response, current_app, request
+from sqlalchemy import select
+
+from .extensions import db
+from .listings import HISTORY, LISTINGS, listing_for
+from .pagination import InvalidPageRequest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Resources served read-only under /api/v1; the listings define their
+# fields, filters and sorts
+RESOURCES = ("patients", "doctors", "appointments", "treatments", "uploads")
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"cannot serialize {type(value).__name__}")
+
+
+def _dump_json(data):
+    if orjson is not None:
+        # Serializes naive datetimes in isoformat() form natively
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=_default, separators=(",", ":")).encode()
+
+
+SERIALIZERS = {"application/json": _dump_json}
+if msgpack is not None:
+    SERIALIZERS["application/msgpack"] = lambda data: msgpack.packb(data, default=_default, datetime=False)
+    SERIALIZERS["application/x-msgpack"] = SERIALIZERS["application/msgpack"]
+
+
+def _render(data, status=200):
+    if not request.accept_mimetypes:
+        mimetype = "application/json"
+    else:
+        mimetype = request.accept_mimetypes.best_match(list(SERIALIZERS))
+    if mimetype is None:
+        return _render_error(f"can only produce {', '.join(SERIALIZERS)}", 406)
+    response = Response(SERIALIZERS[mimetype](data), status=status, mimetype=mimetype)
+    response.vary.add("Accept")
+    return response
+
+
+def _render_error(message, status):
+    return Response(_dump_json({"error": message}), status=status, mimetype="application/json")
+
+
+def _unknown(resource):
+    return _render_error(f"unknown resource {resource!r}; available: {', '.join(RESOURCES)}", 404)
+
+
+def _fields(listing):
+    # ?fields=a,b picks a subset of the listing's fields; only those columns
+    # (plus the key and sort column the cursor needs) are selected
+    requested = [name for name in request.args.get("fields", "").split(",") if name]
+    unknown = sorted(set(requested) - set(listing.fields))
+    if unknown:
+        raise InvalidPageRequest(f"unknown fields {', '.join(unknown)}; available: {', '.join(listing.fields)}")
+    return requested or listing.fields
+
+
+def _select(listing, fields, *extra):
+    names = list(dict.fromkeys([*fields, *extra]))
+    return select(*[getattr(listing.model, name) for name in names])
+
+
+def _ids():
+    try:
+        return [int(i) for i in request.args["ids"].split(",") if i]
+    except ValueError:
+        raise InvalidPageRequest("ids must be a comma-separated list of integers")
+
+
+bp = Blueprint("api", __name__, url_prefix="/api/v1", cli_group=None)
+
+
+@bp.errorhandler(InvalidPageRequest)
+def invalid_request(e):
+    return _render_error(str(e), 400)
+
+
+@bp.route("/<resource>")
+def list_resource(resource):
+    """A keyset-paginated page, or the rows for ?ids=1,2,3 in that order."""
+    if resource not in RESOURCES:
+        return _unknown(resource)
+    if "ids" in request.args:
+        # By id, archived rows are as reachable as live ones
+        listing = HISTORY.get(resource, LISTINGS[resource])
+        fields = _fields(listing)
+        ids = _ids()
+        if len(ids) > listing.max_limit:
+            raise InvalidPageRequest(f"at most {listing.max_limit} ids per request")
+        statement = _select(listing, fields, listing.pk).where(getattr(listing.model, listing.pk).in_(ids))
+        rows = {getattr(row, listing.pk): row for row in db.session.execute(statement)}
+        return _render({
+            "items": [{name: getattr(rows[i], name) for name in fields} for i in ids if i in rows],
+            "missing": [i for i in ids if i not in rows],
+        })
+
+    listing = listing_for(resource)
+    fields = _fields(listing)
+    sort = request.args.get("sort", listing.default_sort).lstrip("-")
+    statement = _select(listing, fields, listing.pk, *([sort] if sort in listing.sorts else []))
+    statement, sort, limit = listing.prepare(request.args, statement, current_app.config["PAGE_SIZE"])
+    page = listing.paginate(db.session.execute(statement.limit(limit + 1)).all(), sort, limit)
+    return _render({
+        "items": [{name: getattr(row, name) for name in fields} for row in page.items],
+        "next_cursor": page.next_cursor,
+        "sort": page.sort,
+        "limit": page.limit,
+    })
+
+
+@bp.route("/<resource>/<int:item_id>")
+def show_resource(resource, item_id):
+    if resource not in RESOURCES:
+        return _unknown(resource)
+    listing = HISTORY.get(resource, LISTINGS[resource])
+    fields = _fields(listing)
+    row = db.session.execute(
+        _select(listing, fields).where(getattr(listing.model, listing.pk) == item_id)
+    ).first()
+    if row is None:
+        return _render_error(f"no {resource} with id {item_id}", 404)
+    return _render({name: getattr(row, name) for name in fields})
@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, current_app
+from sqlalchemy import delete, func, insert, literal, select
+
+from .extensions import db, blob_store
+from .jobs import enqueue, task
+from .models import AppointmentArchive, AppointmentFile, HISTORY_COLUMNS, Job, Upload
+
+
+def horizon(days, now=None):
+    # Cutoff for a *_AFTER_DAYS setting; None disables that half of the archive
+    if days is None:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=days)
+
+
+def archive_appointments(session, before, batch_size=5000):
+    """Move appointments older than `before` to appointment_archive; returns how many.
+
+    Each batch is copied and deleted in one transaction, so a row is always
+    in exactly one of the two tables. The delete is an ORM bulk statement:
+    cached appointment pages are invalidated, while the rollups (which
+    count archived appointments too) are left alone.
+    """
+    hot = AppointmentFile.__table__
+    moved = 0
+    while True:
+        ids = session.scalars(
+            select(hot.c.appointment_id).where(hot.c.appointment_time < before)
+            .order_by(hot.c.appointment_id).limit(batch_size)
+        ).all()
+        if not ids:
+            return moved
+        session.execute(insert(AppointmentArchive.__table__).from_select(
+            [*HISTORY_COLUMNS, "archived_at"],
+            select(*[hot.c[name] for name in HISTORY_COLUMNS], literal(datetime.utcnow()))
+            .where(hot.c.appointment_id.in_(ids)),
+        ))
+        session.execute(
+            delete(AppointmentFile).where(AppointmentFile.appointment_id.in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        moved += len(ids)
+
+
+def cold_candidates(session, before):
+    # Blobs whose most recent upload is older than `before`; a blob shared
+    # with a newer upload stays hot
+    return session.scalars(
+        select(Upload.sha256).where(Upload.sha256.is_not(None))
+        .group_by(Upload.sha256).having(func.max(Upload.time) < before)
+    ).all()
+
+
+def freeze_uploads(session, store, before):
+    """Compress old blobs into the store's cold tier; returns (blobs, bytes saved)."""
+    frozen, saved = 0, 0
+    for digest in cold_candidates(session, before):
+        sizes = store.freeze(digest)
+        if sizes is not None:
+            frozen += 1
+            saved += sizes[0] - sizes[1]
+    return frozen, saved
+
+
+def run_archive(session, config, now=None):
+    summary = {"appointments": 0, "blobs": 0, "bytes_saved": 0}
+    before = horizon(config["ARCHIVE_APPOINTMENTS_AFTER_DAYS"], now)
+    if before is not None:
+        summary["appointments"] = archive_appointments(session, before, config["ARCHIVE_BATCH_SIZE"])
+    before = horizon(config["ARCHIVE_UPLOADS_AFTER_DAYS"], now)
+    if before is not None and hasattr(blob_store, "freeze"):
+        summary["blobs"], summary["bytes_saved"] = freeze_uploads(session, blob_store, before)
+    return summary
+
+
+def schedule(delay=0):
+    # At most one archive job waiting at a time; the caller commits
+    if db.session.scalar(select(func.count()).select_from(Job).where(Job.kind == "archive", Job.status == "queued")):
+        return None
+    return enqueue("archive", {}, delay=delay)
+
+
+@task("archive", priority=-10)
+def archive_job():
+    summary = run_archive(db.session, current_app.config)
+    schedule(current_app.config["ARCHIVE_INTERVAL_SECONDS"])
+    return summary
+
+
+bp = Blueprint("archive", __name__, cli_group=None)
+
+
+@bp.cli.command("archive-run")
+@click.option("--appointments-days", type=int, default=None, help="Override ARCHIVE_APPOINTMENTS_AFTER_DAYS.")
+@click.option("--uploads-days", type=int, default=None, help="Override ARCHIVE_UPLOADS_AFTER_DAYS.")
+def archive_run(appointments_days, uploads_days):
+    """Archive old appointments and freeze old upload blobs now."""
+    config = dict(current_app.config)
+    if appointments_days is not None:
+        config["ARCHIVE_APPOINTMENTS_AFTER_DAYS"] = appointments_days
+    if uploads_days is not None:
+        config["ARCHIVE_UPLOADS_AFTER_DAYS"] = uploads_days
+    summary = run_archive(db.session, config)
+    print(f"Archived {summary['appointments']} appointments; froze {summary['blobs']} blobs, "
+          f"saving {summary['bytes_saved']} bytes")
+
+
+@bp.cli.command("archive-schedule")
+def archive_schedule():
+    """Queue the archive job; it then re-queues itself every ARCHIVE_INTERVAL_SECONDS."""
+    job = schedule()
+    db.session.commit()
+    print(f"Queued archive job {job.id}" if job is not None else "An archive job is already queued")
@@ -0,0 +1,357 @@
+import asyncio
+import json
+import mimetypes
+import os
+import re
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, quote
+
+from sqlalchemy import select
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.http import dump_options_header, http_date, parse_etags, parse_options_header, parse_range_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+from . import create_app
+from .blobstore import CHUNK_SIZE
+from .database import init_async_engine
+from .extensions import blob_store, db
+from .jobs import make_job
+from .listings import ARCHIVED_UNTIL, HISTORY, LISTINGS, choose_listing
+from .models import PatientFile, Upload
+from .pagination import InvalidPageRequest
+
+
+class ClientDisconnected(Exception):
+    pass
+
+
+class AsyncRequest:
+    def __init__(self, scope, receive):
+        self.scope = scope
+        self.receive = receive
+        self.method = scope["method"]
+        self.headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        self.args = MultiDict(parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=True))
+
+    async def stream(self):
+        while True:
+            message = await self.receive()
+            if message["type"] == "http.disconnect":
+                raise ClientDisconnected()
+            yield message.get("body", b"")
+            if not message.get("more_body"):
+                return
+
+
+async def respond(send, status, body=b"", content_type="text/html; charset=utf-8", headers=()):
+    if isinstance(body, str):
+        body = body.encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", content_type.encode()), (b"content-length", str(len(body)).encode()),
+                    *((name.encode(), value.encode()) for name, value in headers)],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def respond_json(send, status, data):
+    await respond(send, status, json.dumps(data), "application/json")
+
+
+def _content_disposition(filename):
+    try:
+        filename.encode("ascii")
+        return dump_options_header("attachment", {"filename": filename})
+    except UnicodeEncodeError:
+        return f"attachment; filename*=UTF-8''{quote(filename)}"
+
+
+class WSGIBridge:
+    # Serves every route without a native async handler through the Flask
+    # app. Each request runs on a worker from a bounded pool and the
+    # response body is passed back to the event loop chunk by chunk.
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="wsgi")
+
+    def environ(self, scope, body):
+        script_name = scope.get("root_path", "").encode().decode("latin-1")
+        path_info = scope["path"].encode().decode("latin-1")
+        if path_info.startswith(script_name):
+            path_info = path_info[len(script_name):]
+        server = scope.get("server") or ("localhost", 80)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": script_name,
+            "PATH_INFO": path_info,
+            "QUERY_STRING": scope["query_string"].decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+            "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": body,
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope["headers"]:
+            name = name.decode("latin-1").upper().replace("-", "_")
+            if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+                name = "HTTP_" + name
+            value = value.decode("latin-1")
+            environ[name] = f"{environ[name]},{value}" if name in environ else value
+        return environ
+
+    async def __call__(self, scope, receive, send):
+        body = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            async for chunk in AsyncRequest(scope, receive).stream():
+                body.write(chunk)
+        except ClientDisconnected:
+            body.close()
+            return
+        body.seek(0)
+        loop = asyncio.get_running_loop()
+
+        def push(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        def run():
+            start = {}
+
+            def start_response(status, headers, exc_info=None):
+                if exc_info and start.get("sent"):
+                    raise exc_info[1].with_traceback(exc_info[2])
+                start.update(message={
+                    "type": "http.response.start",
+                    "status": int(status.split(" ", 1)[0]),
+                    "headers": [(name.lower().encode("latin-1"), value.encode("latin-1"))
+                                for name, value in headers],
+                })
+
+            result = self.app(self.environ(scope, body), start_response)
+            try:
+                for chunk in result:
+                    if not chunk:
+                        continue
+                    if not start.get("sent"):
+                        push(start["message"])
+                        start["sent"] = True
+                    push({"type": "http.response.body", "body": chunk, "more_body": True})
+                if not start.get("sent"):
+                    push(start["message"])
+                push({"type": "http.response.body", "body": b""})
+            finally:
+                if hasattr(result, "close"):
+                    result.close()
+                body.close()
+
+        await loop.run_in_executor(self.executor, run)
+
+
+class AsyncApp:
+    # ASGI entry point. File transfers and JSON listings are served by
+    # coroutines on the async engine, so a slow client only holds a socket
+    # and a small buffer instead of a worker; everything else goes to Flask.
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.wsgi = WSGIBridge(flask_app, self.config["ASGI_SYNC_WORKERS"])
+        with flask_app.app_context():
+            self.blob_store = blob_store._get_current_object()
+            self.database_url = db.engine.url
+        self.engine = None
+        self.sessions = None
+        self.routes = [
+            ({"POST"}, re.compile(r"/upload/(\d+)"), self.upload),
+            ({"GET", "HEAD"}, re.compile(r"/download/(\d+)"), self.download),
+            ({"GET"}, re.compile(r"/list/(\w+)"), self.list_resource),
+        ]
+
+    def start(self):
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+
+        if self.engine is None:
+            self.engine = init_async_engine(self.config, self.database_url)
+            self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            return await self.lifespan(receive, send)
+        if scope["type"] == "http":
+            for methods, pattern, handler in self.routes:
+                match = pattern.fullmatch(scope["path"])
+                if match and scope["method"] in methods:
+                    self.start()
+                    request = AsyncRequest(scope, receive)
+                    try:
+                        if await handler(request, send, *match.groups()) is not NotImplemented:
+                            return
+                    except ClientDisconnected:
+                        return
+                    break
+        await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                self.wsgi.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def upload(self, request, send, patient_id):
+        async with self.sessions() as session:
+            patient = await session.get(PatientFile, int(patient_id))
+            if patient is None:
+                return await respond(send, 404, "Not Found")
+
+            mimetype, options = parse_options_header(request.headers.get("content-type", ""))
+            if mimetype != "multipart/form-data" or "boundary" not in options:
+                return await respond(send, 400, "No file uploaded!")
+            limit = self.config["UPLOAD_DIRECT_MAX_SIZE"]
+            if limit and int(request.headers.get("content-length") or 0) > limit:
+                return await respond(send, 413, "File too large")
+
+            decoder = MultipartDecoder(
+                options["boundary"].encode(), max_form_memory_size=self.config["MAX_FORM_MEMORY_SIZE"]
+            )
+            writer = filename = None
+            in_file = False
+            received = 0
+            try:
+                async for chunk in request.stream():
+                    received += len(chunk)
+                    if limit and received > limit:
+                        return await respond(send, 413, "File too large")
+                    decoder.receive_data(chunk)
+                    # Disk writes go to a thread; the socket is never blocked on them
+                    event = decoder.next_event()
+                    while not isinstance(event, (NeedData, Epilogue)):
+                        if isinstance(event, File) and event.name == "file" and writer is None and event.filename:
+                            writer = await asyncio.to_thread(self.blob_store.writer)
+                            filename, in_file = event.filename, True
+                        elif isinstance(event, (Field, File)):
+                            in_file = False
+                        elif isinstance(event, Data) and in_file:
+                            await asyncio.to_thread(writer.write, event.data)
+                        event = decoder.next_event()
+                if writer is None:
+                    return await respond(send, 400, "No file uploaded!")
+                digest, size = await asyncio.to_thread(writer.commit)
+            except RequestEntityTooLarge:
+                return await respond(send, 413, "File too large")
+            except ValueError:
+                return await respond(send, 400, "Malformed upload")
+            finally:
+                if writer is not None and not writer.out.closed:
+                    await asyncio.to_thread(writer.abort)
+
+            upload = Upload(filename=filename, sha256=digest, size=size, patient_id=patient.patient_id)
+            session.add(upload)
+            await session.flush()
+            session.add(make_job("upload.postprocess", {"upload_id": upload.id}, self.config))
+            await session.commit()
+        await respond(send, 200, f"File {filename} uploaded for patient {patient.name}")
+
+    async def download(self, request, send, file_id):
+        async with self.sessions() as session:
+            row = (await session.execute(
+                select(Upload.filename, Upload.sha256).where(Upload.id == int(file_id))
+            )).first()
+        if row is None:
+            return await respond(send, 404, "Not Found")
+        path = self.blob_store.path(row.sha256) if row.sha256 else None
+        if path is None:
+            # Legacy in-database payloads and non-local stores stay on Flask
+            return NotImplemented
+        stat = await asyncio.to_thread(os.stat, path)
+
+        headers = [
+            ("content-type", mimetypes.guess_type(row.filename or "")[0] or "application/octet-stream"),
+            ("content-disposition", _content_disposition(row.filename or row.sha256)),
+            ("etag", f'"{row.sha256}"'),
+            ("last-modified", http_date(stat.st_mtime)),
+            ("accept-ranges", "bytes"),
+            ("cache-control", "no-cache"),
+        ]
+        if parse_etags(request.headers.get("if-none-match")).contains(row.sha256):
+            return await self._start(send, 304, headers)
+
+        start, stop, status = 0, stat.st_size, 200
+        if_range = request.headers.get("if-range")
+        ranges = parse_range_header(request.headers.get("range"))
+        if ranges is not None and (if_range is None or if_range.strip('"') == row.sha256):
+            span = ranges.range_for_length(stat.st_size)
+            if span is None:
+                return await respond(send, 416, "", headers=[("content-range", f"bytes */{stat.st_size}")])
+            start, stop = span
+            status = 206
+            headers.append(("content-range", f"bytes {start}-{stop - 1}/{stat.st_size}"))
+        headers.append(("content-length", str(stop - start)))
+        await self._start(send, status, headers)
+        if request.method == "HEAD":
+            return await send({"type": "http.response.body", "body": b""})
+
+        # send() waits for the transport to drain, so a slow reader only
+        # ever has one chunk buffered
+        f = await asyncio.to_thread(open, path, "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            await asyncio.to_thread(f.close)
+
+    async def _start(self, send, status, headers):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.encode(), value.encode()) for name, value in headers],
+        })
+        if status == 304:
+            await send({"type": "http.response.body", "body": b""})
+
+    async def list_resource(self, request, send, resource):
+        if resource not in LISTINGS:
+            return await respond_json(send, 404, {"error": f"unknown listing {resource!r}"})
+        async with self.sessions() as session:
+            archived_until = await session.scalar(ARCHIVED_UNTIL) if resource in HISTORY else None
+            listing = choose_listing(resource, request.args, archived_until)
+            try:
+                statement, sort, limit = listing.prepare(request.args, select(listing.model), self.config["PAGE_SIZE"])
+            except InvalidPageRequest as e:
+                return await respond(send, 400, f"Invalid listing parameters: {e}")
+            rows = (await session.scalars(statement.limit(limit + 1))).all()
+        page = listing.paginate(rows, sort, limit)
+        await respond_json(send, 200, {
+            "items": [listing.to_dict(row) for row in page.items],
+            "next_cursor": page.next_cursor,
+            "sort": page.sort,
+            "limit": page.limit,
+        })
+
+
+def create_asgi_app(config=None):
+    return AsyncApp(create_app(config))
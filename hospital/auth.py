@@ -0,0 +1,150 @@
+from datetime import datetime
+
+import click
+from flask import Blueprint, render_template, flash, redirect, request, session, url_for
+
+from .extensions import db, hasher, rate_limiter, session_store
+from .forms import SignupForm, LoginForm
+from .models import (
+    AdminFile, PatientFile, LoginIdentity, LOGIN_SOURCES, LOGIN_PRIORITY, normalize_email, rebuild_login_identity,
+)
+from .sessions import regenerate_session, revoke_user_sessions
+
+
+bp = Blueprint("auth", __name__, cli_group=None)
+
+
+@bp.route("/")
+@bp.route("/home")
+def home():
+    return render_template("home.html")
+
+
+@bp.route("/sign", methods=["GET", "POST"])
+def sign():
+    form = SignupForm()  
+    if form.validate_on_submit():
+        # Check if the email is already registered
+        existing_user = PatientFile.query.filter_by(email=form.email.data).first()
+        if existing_user:
+            flash("Email already registered. Please log in.", "danger")
+            return redirect(url_for('auth.log'))
+        
+        # Hash the password and create a new user
+        hashed_password = hasher.hash(form.password.data)
+        new_user = PatientFile(name=form.name.data, email=form.email.data, age=form.age.data, gender = form.gender.data, password=hashed_password)
+
+        # Add the new user to the database
+        db.session.add(new_user)
+        db.session.commit()
+
+        flash("Sign up Successful! You can now log in.", "success")
+        return redirect(url_for("auth.log"))  # Redirect to login after signup
+
+    return render_template("LOG-SIGN/signup.html", form=form)
+
+
+
+
+@bp.route('/login', methods=["GET", "POST"])
+def log():
+    form = LoginForm()
+    if form.validate_on_submit():
+        # Throttle before any password hashing; raises RateLimited (429)
+        email = normalize_email(form.email.data)
+        rate_limiter.check(ip=request.remote_addr, email=email)
+
+        # One indexed lookup covers admins, patients and doctors
+        identities = LoginIdentity.query.filter_by(email=email).all()
+        identities.sort(key=lambda identity: LOGIN_PRIORITY.index(identity.user_type))
+        identity = next(
+            (i for i in identities if hasher.verify(i.password, form.password.data)), None
+        )
+
+        # Upgrade hashes stored with older parameters while we have the password
+        if identity and hasher.needs_rehash(identity.password):
+            model = next(m for m, (t, _) in LOGIN_SOURCES.items() if t == identity.user_type)
+            user = db.session.get(model, identity.user_id)
+            user.password = hasher.hash(form.password.data)
+            db.session.commit()
+
+        if identity:
+            # A typo before a successful login shouldn't count against the user
+            rate_limiter.reset("email", email)
+            regenerate_session()
+
+        # Check for Admin Login
+        if identity and identity.user_type == "administrator":
+            admin = db.session.get(AdminFile, identity.user_id)
+            session['user_id'] = admin.admin_id
+            session['user_type'] = "administrator"
+            admin.last_login = datetime.now()
+            db.session.commit()  # Save last_login
+
+            flash("Login Successful!", "success")
+            return redirect(url_for("admin.administrator"))
+
+        # Check for Patient Login
+        elif identity and identity.user_type == "patient":
+            session['user_id'] = identity.user_id
+            session['user_type'] = "patient"
+
+            flash("Login Successful!", "success")
+            return redirect(url_for("patient.pat", patient_id = identity.user_id))
+
+        # Check for Doctor Login
+        elif identity and identity.user_type == "doctor":
+            session['user_id'] = identity.user_id
+            session['user_type'] = "doctor"
+
+            flash("Login Successful!", "success")
+            return redirect(url_for("doctor.doc", doctor_id = identity.user_id))
+
+        # Invalid Credentials
+        else:
+            flash("Invalid email or password. Please try again.", "danger")
+
+    return render_template('LOG-SIGN/login.html', form=form)
+
+
+
+
+
+@bp.route("/logout")
+def logout():
+    # Clearing the session drops it from the store; the flash below
+    # starts a fresh, anonymous one under a new id
+    session.clear()
+    regenerate_session()
+    flash("You have been logged out.", "success")
+    return redirect(url_for("auth.log"))
+
+
+@bp.route("/forgetPassword")
+def forget():
+    return render_template("forgetpassword.html")
+
+
+@bp.cli.command("sessions-revoke")
+@click.argument("email")
+def sessions_revoke(email):
+    """Log every account with this email out of all sessions."""
+    revoked = sum(
+        revoke_user_sessions(identity.user_type, identity.user_id)
+        for identity in LoginIdentity.query.filter_by(email=normalize_email(email))
+    )
+    print(f"Revoked {revoked} sessions")
+
+
+@bp.cli.command("sessions-purge")
+def sessions_purge():
+    """Delete expired sessions from the session store."""
+    print(f"Purged {session_store.purge()} expired sessions")
+
+
+@bp.cli.command("rebuild-login-index")
+def rebuild_login_index():
+    """Rebuild login_identity from the admin, patient and doctor tables."""
+    rebuild_login_identity(db.session.connection())
+    db.session.commit()
+    print(f"Indexed {LoginIdentity.query.count()} login identities")
@@ -0,0 +1,213 @@
+import gzip
+import hashlib
+import os
+import shutil
+import tempfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+CHUNK_SIZE = 64 * 1024
+# Cold-tier codecs, in the order reads look for them
+COLD_EXTENSIONS = {"zstd": ".zst", "gzip": ".gz"}
+
+
+class BlobStore:
+    # Interface every blob backend implements. Blobs are addressed by the
+    # hex SHA-256 of their content, so identical files are stored once.
+
+    def put_stream(self, stream):
+        raise NotImplementedError
+
+    def exists(self, digest):
+        raise NotImplementedError
+
+    def open(self, digest):
+        raise NotImplementedError
+
+    def path(self, digest):
+        # Local filesystem path for zero-copy serving, or None if the
+        # backend cannot provide one.
+        return None
+
+    def delete(self, digest):
+        # Unconditional. Identical uploads share a blob, so callers go
+        # through hospital.files.release_blob, which checks for references.
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    # Content-addressed files on local disk, sharded as ab/cd/abcd...
+    # Blobs nobody has needed for a while can be frozen into a compressed
+    # cold tier under cold/ (zstd, or gzip without the zstandard package);
+    # open() decompresses them transparently.
+
+    def __init__(self, root, chunk_size=CHUNK_SIZE, cold_codec="zstd"):
+        self.root = os.path.abspath(root)
+        self.chunk_size = chunk_size
+        self.cold_codec = cold_codec if cold_codec != "zstd" or zstandard is not None else "gzip"
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+
+    def _hot_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _cold_path(self, digest, codec):
+        return os.path.join(self.root, "cold", digest[:2], digest[2:4], digest + COLD_EXTENSIONS[codec])
+
+    def _find_cold(self, digest):
+        for codec in COLD_EXTENSIONS:
+            path = self._cold_path(digest, codec)
+            if os.path.exists(path):
+                return codec, path
+        return None, None
+
+    def path(self, digest):
+        # Cold blobs have no servable file; callers fall back to open()
+        hot = self._hot_path(digest)
+        if not os.path.exists(hot) and self._find_cold(digest)[0] is not None:
+            return None
+        return hot
+
+    def is_cold(self, digest):
+        return not os.path.exists(self._hot_path(digest)) and self._find_cold(digest)[0] is not None
+
+    def exists(self, digest):
+        return os.path.exists(self._hot_path(digest)) or self._find_cold(digest)[0] is not None
+
+    def writer(self):
+        return BlobWriter(self)
+
+    def put_stream(self, stream):
+        # Stream to a temp file while hashing, then move it into place.
+        # Returns (digest, size).
+        writer = self.writer()
+        try:
+            while True:
+                chunk = stream.read(self.chunk_size)
+                if not chunk:
+                    break
+                writer.write(chunk)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    def put_bytes(self, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.exists(digest):
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+            with os.fdopen(fd, "wb") as out:
+                out.write(data)
+            self.adopt(tmp_path, digest)
+        return digest, len(data)
+
+    def adopt(self, tmp_path, digest):
+        # Move an already-written file (same filesystem) into the store.
+        target = self._hot_path(digest)
+        if os.path.exists(target):
+            # Deduplicated: identical content is already stored
+            os.remove(tmp_path)
+            return digest
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(tmp_path, target)
+        # Uploaded again, so it is hot again
+        self._remove_cold(digest)
+        return digest
+
+    def open(self, digest):
+        hot = self._hot_path(digest)
+        if os.path.exists(hot):
+            return open(hot, "rb")
+        codec, cold = self._find_cold(digest)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError(f"blob {digest} is zstd-compressed; install the zstandard package")
+            return zstandard.ZstdDecompressor().stream_reader(open(cold, "rb"), closefd=True)
+        if codec == "gzip":
+            return gzip.open(cold, "rb")
+        # Not stored at all; raise the usual FileNotFoundError
+        return open(hot, "rb")
+
+    def freeze(self, digest):
+        """Compress a hot blob into the cold tier; returns (size, stored size) or None.
+
+        None also when compression would not shrink the blob, which then
+        stays hot.
+        """
+        hot = self._hot_path(digest)
+        if not os.path.exists(hot):
+            return None
+        cold = self._cold_path(digest, self.cold_codec)
+        os.makedirs(os.path.dirname(cold), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cold))
+        try:
+            with open(hot, "rb") as src, os.fdopen(fd, "wb") as out:
+                if self.cold_codec == "zstd":
+                    zstandard.ZstdCompressor(level=9).copy_stream(src, out, read_size=self.chunk_size)
+                else:
+                    with gzip.GzipFile(fileobj=out, mode="wb", compresslevel=6, mtime=0) as packed:
+                        shutil.copyfileobj(src, packed, self.chunk_size)
+            size, stored = os.path.getsize(hot), os.path.getsize(tmp_path)
+            if stored >= size:
+                os.remove(tmp_path)
+                return None
+            os.replace(tmp_path, cold)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.remove(hot)
+        return size, stored
+
+    def _remove_cold(self, digest):
+        for codec in COLD_EXTENSIONS:
+            try:
+                os.remove(self._cold_path(digest, codec))
+            except FileNotFoundError:
+                pass
+
+    def delete(self, digest):
+        try:
+            os.remove(self._hot_path(digest))
+        except FileNotFoundError:
+            pass
+        self._remove_cold(digest)
+
+
+class BlobWriter:
+    # Incremental put for callers that receive a blob piece by piece (the
+    # ASGI upload handler): write() chunks, then commit() or abort().
+
+    def __init__(self, store):
+        self.store = store
+        self.sha = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=os.path.join(store.root, "tmp"))
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, chunk):
+        self.sha.update(chunk)
+        self.size += len(chunk)
+        self.out.write(chunk)
+
+    def commit(self):
+        self.out.close()
+        return self.store.adopt(self.tmp_path, self.sha.hexdigest()), self.size
+
+    def abort(self):
+        self.out.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+BACKENDS = {
+    "local": LocalBlobStore,
+}
+
+
+def make_blob_store(config):
+    backend = BACKENDS[config.get("BLOB_STORE_BACKEND", "local")]
+    return backend(config["BLOB_STORE_PATH"], cold_codec=config.get("BLOB_COLD_CODEC", "zstd"))
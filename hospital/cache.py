@@ -0,0 +1,232 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from flask import has_app_context
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+
+MISS = object()
+
+
+class LRUBackend:
+    # In-process LRU with per-entry TTL. Tag versions are kept apart from the
+    # entries so evicting data can never reset a tag and resurrect stale keys.
+    # They are per process too: with several workers, pair the entries with
+    # DatabaseTags (the default) so an invalidation reaches every worker.
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.tags = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return MISS
+            value, expires = item
+            if expires < time.monotonic():
+                del self.entries[key]
+                return MISS
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + ttl)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def tag_versions(self, tags):
+        with self.lock:
+            return [self.tags.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.tags[tag] = self.tags.get(tag, 0) + 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class DatabaseTags:
+    # Tag versions in the cache_tag table, read and bumped on their own
+    # connection. A lookup is one primary-key query per cache read.
+
+    def __init__(self, engine, table):
+        self.engine = engine
+        self.table = table
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        with self.engine.connect() as conn:
+            versions = dict(conn.execute(
+                select(self.table.c.tag, self.table.c.version).where(self.table.c.tag.in_(tags))
+            ).all())
+        return [versions.get(tag, 0) for tag in tags]
+
+    def bump_tags(self, tags, attempts=2):
+        for attempt in range(attempts):
+            try:
+                with self.engine.begin() as conn:
+                    for tag in tags:
+                        bumped = conn.execute(
+                            update(self.table).where(self.table.c.tag == tag)
+                            .values(version=self.table.c.version + 1)
+                        ).rowcount
+                        if not bumped:
+                            conn.execute(insert(self.table).values(tag=tag, version=1))
+                return
+            except IntegrityError:
+                # Another worker added the same new tag first; bump it now
+                if attempt == attempts - 1:
+                    raise
+
+
+class RedisBackend:
+    # Shared cache for several workers or hosts; needs the redis package
+
+    def __init__(self, url, prefix="hospital:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.client.get(self.prefix + key)
+        return MISS if raw is None else pickle.loads(raw)
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, pickle.dumps(value), ex=max(1, int(ttl)))
+
+    def tag_versions(self, tags):
+        if not tags:
+            return []
+        values = self.client.mget([f"{self.prefix}tag:{tag}" for tag in tags])
+        return [int(v) if v is not None else 0 for v in values]
+
+    def bump_tags(self, tags):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f"{self.prefix}tag:{tag}")
+        pipe.execute()
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class Cache:
+    # Entries are stored under their key plus the current version of each
+    # tag they depend on. Invalidating a tag bumps its version, so every
+    # dependent entry misses from then on without enumerating keys.
+
+    def __init__(self, backend, default_ttl=300, tags=None):
+        self.backend = backend
+        self.tags = tags or backend  # where tag versions live
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _versioned(self, key, tags):
+        versions = self.tags.tag_versions(tags)
+        return key + "|" + ",".join(f"{tag}={v}" for tag, v in zip(tags, versions))
+
+    def get_or_set(self, key, tags, compute, ttl=None):
+        tags = sorted(set(tags))
+        full_key = self._versioned(key, tags)
+        value = self.backend.get(full_key)
+        if value is not MISS:
+            self.hits += 1
+            return value
+        self.misses += 1
+        value = compute()
+        self.backend.set(full_key, value, ttl or self.default_ttl)
+        return value
+
+    def invalidate(self, tags):
+        if tags:
+            self.invalidations += 1
+            self.tags.bump_tags(sorted(set(tags)))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations}
+
+
+def make_cache(config, engine=None):
+    backend = config.get("CACHE_BACKEND", "lru")
+    tags = None
+    if backend == "redis":
+        store = RedisBackend(config["CACHE_REDIS_URL"])
+    else:
+        store = LRUBackend(config.get("CACHE_MAX_ENTRIES", 1024))
+        if config.get("CACHE_TAG_STORE", "database") == "database" and engine is not None:
+            from .models import CacheTag
+            tags = DatabaseTags(engine, CacheTag.__table__)
+    return Cache(store, config.get("CACHE_DEFAULT_TTL", 300), tags=tags)
+
+
+def snapshot(obj, **related):
+    # Plain-dict copy of a model row that is safe to keep across sessions;
+    # Jinja's attribute lookup falls back to keys, so templates still work
+    data = {
+        column.key: getattr(obj, column.key)
+        for column in obj.__table__.columns
+        if column.key != "password"
+    }
+    data.update(related)
+    return data
+
+
+# model -> function(row) returning the cache tags a change to row affects
+_tag_functions = {}
+
+
+def track_changes(model, tags_for):
+    # Collect tags at flush and invalidate only once the transaction commits,
+    # so a concurrent reader can't re-cache data that is about to roll back
+    _tag_functions[model] = tags_for
+
+    def collect(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info.setdefault("cache_tags", set()).update(tags_for(target))
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, collect)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk(state):
+    # Bulk insert/update/delete statements skip mapper events; drop the
+    # whole model's tags (tags_for(None)) instead
+    if state.is_insert or state.is_update or state.is_delete:
+        mapper = state.bind_mapper
+        tags_for = _tag_functions.get(mapper.class_) if mapper is not None else None
+        if tags_for is not None:
+            state.session.info.setdefault("cache_tags", set()).update(tags_for(None))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags and has_app_context():
+        from .extensions import cache
+        cache.invalidate(tags)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back(session):
+    session.info.pop("cache_tags", None)
@@ -0,0 +1,57 @@
+import os
+
+
+# Defaults for create_app(); anything passed to create_app() overrides them.
+# Paths that depend on the instance folder are filled in by create_app().
+DEFAULTS = {
+    "SECRET_KEY": os.environ.get("SECRET_KEY"),  # unset: generated once into the instance folder
+    "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+    "SQLALCHEMY_COMMIT_ON_TEARDOWN": True,
+    "BLOB_STORE_BACKEND": "local",
+    "PASSWORD_HASH_METHOD": "scrypt",
+    "PASSWORD_HASH_WORKERS": None,  # defaults to the CPU count
+    "PASSWORD_HASH_MAX_PENDING": 64,
+    "PAGE_SIZE": 50,
+    "APPOINTMENT_SLOT_MINUTES": 30,
+    "CLINIC_OPEN_HOUR": 9,
+    "CLINIC_CLOSE_HOUR": 17,
+    "SLOT_INDEX_TTL": 60,  # seconds a worker trusts its cached view of a doctor's bookings
+    "IMPORT_CHUNK_SIZE": 1000,
+    "SLOW_QUERY_SECONDS": 0.1,
+    "CACHE_BACKEND": "lru",  # or "redis" with CACHE_REDIS_URL
+    "CACHE_REDIS_URL": None,
+    "CACHE_MAX_ENTRIES": 1024,
+    "CACHE_DEFAULT_TTL": 300,
+    # Where the lru backend keeps invalidation versions: "database" reaches
+    # every worker; "memory" is only correct with a single worker process
+    "CACHE_TAG_STORE": "database",
+    "ASGI_SYNC_WORKERS": 16,  # threads for Flask routes under asgi:app
+    "ASYNC_DATABASE_URI": None,  # derived from SQLALCHEMY_DATABASE_URI
+    "JOB_WORKERS": 2,  # processes started by `flask jobs-worker`
+    "JOB_POLL_SECONDS": 1.0,
+    "JOB_LEASE_SECONDS": 300,  # a job held longer than this is handed out again
+    "JOB_MAX_ATTEMPTS": 3,
+    "REPORT_PRERENDER_DIR": None,  # write rendered reports here and serve them as files
+    "UPLOAD_DIRECT_MAX_SIZE": 100 * 1024 * 1024,  # single-request uploads; bigger files use sessions
+    "UPLOAD_MAX_SIZE": 4 * 1024 * 1024 * 1024,  # resumable upload sessions
+    "UPLOAD_CHUNK_SIZE": 8 * 1024 * 1024,
+    "UPLOAD_MAX_SESSIONS": 32,  # open resumable uploads across all patients
+    "UPLOAD_SESSION_TTL": 24 * 3600,
+    "ARCHIVE_APPOINTMENTS_AFTER_DAYS": 730,  # older appointments move to appointment_archive; None keeps them
+    "ARCHIVE_UPLOADS_AFTER_DAYS": 365,  # blobs no upload newer than this uses go to the cold tier; None keeps them
+    "ARCHIVE_BATCH_SIZE": 5000,  # appointments moved per transaction
+    "ARCHIVE_INTERVAL_SECONDS": 24 * 3600,  # the archive job re-queues itself this far ahead
+    "BLOB_COLD_CODEC": "zstd",  # falls back to gzip without the zstandard package
+    "SESSION_BACKEND": "database",  # or "memory", or "redis" with SESSION_REDIS_URL; "cookie" keeps signed cookies
+    "SESSION_REDIS_URL": None,
+    "SESSION_MAX_ENTRIES": 100_000,  # memory backend only
+    "RATE_LIMIT_BACKEND": "memory",  # per worker; "redis" with RATE_LIMIT_REDIS_URL shares buckets
+    "RATE_LIMIT_REDIS_URL": None,
+    "RATE_LIMIT_MAX_KEYS": 100_000,
+    # (attempts, seconds); None disables. Generous because a hospital NAT puts
+    # whole wards behind one address; the per-email limit stops guessing
+    "LOGIN_LIMIT_PER_IP": (300, 60),
+    "LOGIN_LIMIT_PER_EMAIL": (5, 300),
+    "TRUSTED_PROXIES": 0,  # reverse proxies in front of the app; their X-Forwarded-* headers are believed
+    "PROFILER_ENABLED": os.environ.get("PROFILER_ENABLED") == "1",
+}
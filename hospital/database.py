@@ -0,0 +1,97 @@
+import os
+
+from sqlalchemy import event
+
+
+DEFAULT_DATABASE_URI = "sqlite:///app_user.db"
+
+# Applied to every new SQLite connection when SQLITE_TUNED is on. WAL lets
+# readers proceed while a write is in progress; NORMAL sync is safe in WAL.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "cache_size": -20000,  # KiB
+}
+
+
+# asyncio drivers used by the ASGI entry point for the same database
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
+
+
+def database_uri():
+    uri = os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URI)
+    # Heroku-style URLs use the scheme SQLAlchemy dropped in 1.4
+    if uri.startswith("postgres://"):
+        uri = "postgresql://" + uri[len("postgres://"):]
+    return uri
+
+
+def configure_database(config):
+    # Fill in backend-specific engine options; must run before SQLAlchemy(app)
+    config.setdefault("SQLALCHEMY_DATABASE_URI", database_uri())
+    config.setdefault("DB_POOL_SIZE", 10)
+    config.setdefault("DB_MAX_OVERFLOW", 20)
+    config.setdefault("DB_POOL_RECYCLE", 1800)
+    config.setdefault("DB_POOL_TIMEOUT", 30)
+    config.setdefault("SQLITE_TUNED", True)
+    config.setdefault("DB_AUTO_UPGRADE", True)  # add missing tables, columns and indexes at startup
+    config.setdefault("SQLITE_PRAGMAS", dict(SQLITE_PRAGMAS))
+    config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", engine_options(config["SQLALCHEMY_DATABASE_URI"], config))
+
+
+def engine_options(uri, config):
+    if uri.startswith("sqlite"):
+        busy_ms = config.get("SQLITE_PRAGMAS", SQLITE_PRAGMAS).get("busy_timeout", 5000)
+        return {"connect_args": {"timeout": busy_ms / 1000}}
+    return {
+        "pool_size": config.get("DB_POOL_SIZE", 10),
+        "max_overflow": config.get("DB_MAX_OVERFLOW", 20),
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_timeout": config.get("DB_POOL_TIMEOUT", 30),
+        "pool_pre_ping": True,
+    }
+
+
+def tune_sqlite(engine, pragmas=None):
+    pragmas = SQLITE_PRAGMAS if pragmas is None else pragmas
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_engine(app, db):
+    with app.app_context():
+        engine = db.engine
+        if engine.dialect.name == "sqlite" and app.config["SQLITE_TUNED"]:
+            tune_sqlite(engine, app.config["SQLITE_PRAGMAS"])
+
+
+def async_database_uri(url):
+    # From the sync engine's URL rather than the configured URI, which
+    # Flask-SQLAlchemy rewrites (relative SQLite paths go under instance/)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise RuntimeError(f"No async driver known for {backend!r}; set ASYNC_DATABASE_URI")
+    return url.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+
+def init_async_engine(config, url):
+    # Needs the async driver (aiosqlite / asyncpg) and greenlet installed;
+    # url is the sync engine's (db.engine.url)
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    uri = config.get("ASYNC_DATABASE_URI") or async_database_uri(url)
+    engine = create_async_engine(uri, **engine_options(uri, config))
+    if engine.dialect.name == "sqlite" and config["SQLITE_TUNED"]:
+        tune_sqlite(engine.sync_engine, config["SQLITE_PRAGMAS"])
+    return engine
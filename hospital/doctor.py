@@ -0,0 +1,188 @@
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, Response, abort, current_app, render_template, request, send_file, session
+
+from .cache import snapshot
+from .extensions import cache, db, scheduler
+from .jobs import accepted, enqueue, store_artifact, task
+from .listings import cached_list_page, seen_by
+from .models import AppointmentHistory, DoctorFile, DoctorPatientLoad, PatientFile
+from .querycount import query_budget
+from .reports import FORMATS as REPORT_FORMATS, cached_report, prerender, render_report, report_version
+
+
+bp = Blueprint("doctor", __name__, cli_group=None)
+
+
+def _doctor_tags(doctor_id):
+    return [f"doctor:{doctor_id}", "doctor:all"]
+
+
+def _appointment_tags(doctor_id):
+    # Rows embed patient and doctor details, so depend on those too
+    return [f"doctor:{doctor_id}:appointments", "appointments:all", "patients"] + _doctor_tags(doctor_id)
+
+
+def cached_doctor(doctor_id):
+    def load():
+        doctor = db.session.get(DoctorFile, doctor_id)
+        return snapshot(doctor) if doctor is not None else None
+    doctor = cache.get_or_set(f"doctor:{doctor_id}", _doctor_tags(doctor_id), load)
+    if doctor is None:
+        abort(404)
+    return doctor
+
+
+def _appointment_rows(doctor, *where):
+    # Live and archived appointments with their patients in one query; the
+    # history relation has no relationships, and the doctor is the page's own
+    rows = db.session.execute(
+        db.select(AppointmentHistory, PatientFile)
+        .join(PatientFile, PatientFile.patient_id == AppointmentHistory.patient_id)
+        .where(AppointmentHistory.doctor_id == doctor["doctor_id"], *where)
+        .order_by(AppointmentHistory.appointment_time)
+    ).all()
+    return [snapshot(a, patient=snapshot(p), doctor=doctor) for a, p in rows]
+
+
+@bp.route("/doctor/<int:doctor_id>")
+@query_budget(4)  # two cached reads, each a cache-tag lookup plus its query on a miss
+def doc(doctor_id):
+    doctor = cached_doctor(doctor_id)
+    appointments = cache.get_or_set(
+        f"doctor:{doctor_id}:appointments",
+        _appointment_tags(doctor_id),
+        lambda: _appointment_rows(doctor),
+    )
+    return render_template("DOCTOR/doctor.html", doctor=doctor, appointments=appointments)
+
+@bp.route("/doctor/<int:doctor_id>/profile")
+def doc_profile(doctor_id):
+    doctor = cached_doctor(doctor_id)
+    # Pending flash messages are rendered into the page, so skip the cache
+    if "_flashes" in session:
+        return render_template('DOCTOR/doctor_profile.html', doctor = doctor)
+    return cache.get_or_set(
+        f"html:doctor_profile:{doctor_id}",
+        _doctor_tags(doctor_id),
+        lambda: render_template('DOCTOR/doctor_profile.html', doctor = doctor),
+    )
+
+@bp.route("/doctor/<int:doctor_id>/patients")
+@query_budget(4)  # as doc()
+def doctorsPatients(doctor_id):
+    doctor = cached_doctor(doctor_id)
+    # Get today's start and end times
+    start_of_day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    end_of_day = start_of_day + timedelta(days=1)
+    
+    # Filter appointments for today
+    appointments = cache.get_or_set(
+        f"doctor:{doctor_id}:appointments:{start_of_day:%Y-%m-%d}",
+        _appointment_tags(doctor_id),
+        lambda: _appointment_rows(
+            doctor,
+            AppointmentHistory.appointment_time >= start_of_day,
+            AppointmentHistory.appointment_time < end_of_day,
+        ),
+    )
+
+    return render_template(
+        "DOCTOR/doctorspatients.html",
+        doctor=doctor,
+        appointments=appointments
+    )
+
+
+@bp.route("/doctor/<int:doctor_id>/slots")
+def free_slots(doctor_id):
+    db.get_or_404(DoctorFile, doctor_id)
+    try:
+        after = datetime.fromisoformat(request.args["after"]) if "after" in request.args else None
+        n = max(1, min(int(request.args.get("n", 5)), 100))
+    except ValueError:
+        return {"error": "invalid 'after' or 'n'"}, 400
+    slots = scheduler.next_free(doctor_id, after, n)
+    return {"doctor_id": doctor_id, "slots": [slot.isoformat() for slot in slots]}
+
+
+@bp.route("/allPatients/<int:doctor_id>")
+@query_budget(5)  # as doc(), and the page is a query plus selectinload
+def allPatients(doctor_id):
+    doctor = cached_doctor(doctor_id)
+
+    # Fetch distinct patients who have appointments with this doctor
+    page = cached_list_page(
+        "patients",
+        [f"doctor:{doctor_id}:appointments", "appointments:all", "patients", "doctors"],
+        lambda: PatientFile.profile("roster").filter(seen_by(doctor_id)),
+        key=f"doctor:{doctor_id}",
+        to_row=lambda p: snapshot(p, doctor=snapshot(p.doctor) if p.doctor else None),
+    )
+
+    return render_template(
+        "DOCTOR/totalPatient.html",
+        doctor=doctor,
+        patients=page.items,
+        page=page
+    )
+
+
+@bp.route('/report/<int:doc_id>/<int:id>')
+def generate(id, doc_id):
+    fmt = request.args.get("format", "html")
+    if fmt not in REPORT_FORMATS:
+        return "Unknown report format", 404
+    # One query decides everything: the version is the strong ETag and the
+    # cache key, so a repeat view is a 304 and a cold one renders once
+    version = report_version(db.session, id, doc_id)
+    if version is None:
+        abort(404)
+    if request.args.get("background") == "1":
+        # Rendered by a job worker; poll the returned status URL
+        job = enqueue("report", {"patient_id": id, "doctor_id": doc_id, "fmt": fmt})
+        db.session.commit()
+        return accepted(job)
+
+    if request.if_none_match.contains(version):
+        response = Response(status=304)
+    else:
+        try:
+            kind, value = cached_report(id, doc_id, version, fmt)
+        except RuntimeError as e:
+            return str(e), 501
+        if kind == "path":
+            response = send_file(value, mimetype=REPORT_FORMATS[fmt], etag=False, conditional=False)
+        else:
+            response = Response(value, content_type=REPORT_FORMATS[fmt])
+    response.set_etag(version)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+@task("report", priority=10)
+def report_job(patient_id, doctor_id, fmt="html"):
+    body = render_report(patient_id, doctor_id, fmt)
+    return store_artifact([body], f"report-{doctor_id}-{patient_id}.{fmt}", REPORT_FORMATS[fmt])
+
+
+@bp.cli.command("reports-prerender")
+@click.option("--doctor-id", type=int, default=None, help="Only this doctor's patients.")
+@click.option("--format", "fmt", type=click.Choice(sorted(REPORT_FORMATS)), default="html")
+def reports_prerender(doctor_id, fmt):
+    """Render every (patient, doctor) report with appointments to REPORT_PRERENDER_DIR."""
+    directory = current_app.config["REPORT_PRERENDER_DIR"]
+    if not directory:
+        raise click.UsageError("Set REPORT_PRERENDER_DIR first")
+    pairs = db.select(DoctorPatientLoad.patient_id, DoctorPatientLoad.doctor_id)
+    if doctor_id is not None:
+        pairs = pairs.where(DoctorPatientLoad.doctor_id == doctor_id)
+    rendered = 0
+    for patient_id, doc_id in db.session.execute(pairs).all():
+        version = report_version(db.session, patient_id, doc_id)
+        if version is not None:
+            prerender(directory, patient_id, doc_id, version, fmt)
+            rendered += 1
+    print(f"Pre-rendered {rendered} reports to {directory}")
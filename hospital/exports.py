@@ -0,0 +1,75 @@
+import csv
+import json
+import zlib
+from datetime import date, datetime
+
+
+EXPORT_BATCH_SIZE = 1000
+FLUSH_BYTES = 64 * 1024
+
+
+class _Lines:
+    # Minimal file-like sink so csv.writer output can be yielded piecemeal
+    def __init__(self):
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+
+    def drain(self):
+        text = "".join(self.parts)
+        self.parts = []
+        self.size = 0
+        return text
+
+
+def stream_rows(session, statement, batch_size=EXPORT_BATCH_SIZE):
+    # yield_per fetches in batches and, on PostgreSQL, uses a server-side
+    # cursor, so memory stays flat however many rows match
+    result = session.execute(statement.execution_options(yield_per=batch_size))
+    for partition in result.partitions():
+        yield from partition
+
+
+def _jsonable(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(header, rows):
+    sink = _Lines()
+    writer = csv.writer(sink)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if sink.size >= FLUSH_BYTES:
+            yield sink.drain()
+    yield sink.drain()
+
+
+def ndjson_chunks(header, rows):
+    sink = _Lines()
+    for row in rows:
+        sink.write(json.dumps(dict(zip(header, map(_jsonable, row))), separators=(",", ":")))
+        sink.write("\n")
+        if sink.size >= FLUSH_BYTES:
+            yield sink.drain()
+    yield sink.drain()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+FORMATS = {
+    "csv": (csv_chunks, "text/csv"),
+    "ndjson": (ndjson_chunks, "application/x-ndjson"),
+}
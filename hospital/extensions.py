@@ -0,0 +1,57 @@
+from flask import current_app
+from flask_sqlalchemy import SQLAlchemy
+from werkzeug.local import LocalProxy
+
+
+db = SQLAlchemy()
+
+
+def _service(name, factory):
+    # Build a per-app service on first use and keep it in app.extensions, so
+    # workers and CLI commands only pay for the subsystems they touch
+    def get():
+        app = current_app._get_current_object()
+        service = app.extensions.get(name)
+        if service is None:
+            service = app.extensions.setdefault(name, factory(app))
+        return service
+    return LocalProxy(get)
+
+
+def _make_blob_store(app):
+    from .blobstore import make_blob_store
+    return make_blob_store(app.config)
+
+
+def _make_hasher(app):
+    from .hashing import PasswordHasher
+    return PasswordHasher.from_config(app.config)
+
+
+def _make_scheduler(app):
+    from .models import AppointmentFile
+    from .scheduling import Scheduler
+    return Scheduler.from_config(db.session, AppointmentFile, app.config)
+
+
+def _make_cache(app):
+    from .cache import make_cache
+    return make_cache(app.config, db.engine)
+
+
+def _make_session_store(app):
+    from .sessions import make_session_store
+    return make_session_store(app.config)
+
+
+def _make_rate_limiter(app):
+    from .ratelimit import make_rate_limiter
+    return make_rate_limiter(app.config)
+
+
+blob_store = _service("blob_store", _make_blob_store)
+hasher = _service("hasher", _make_hasher)
+scheduler = _service("scheduler", _make_scheduler)
+cache = _service("cache", _make_cache)
+session_store = _service("session_store", _make_session_store)
+rate_limiter = _service("rate_limiter", _make_rate_limiter)
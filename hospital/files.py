@@ -0,0 +1,251 @@
+import hashlib
+from io import BytesIO
+from datetime import datetime
+
+from flask import (
+    Blueprint, current_app, has_app_context, render_template, request, Response, send_file, stream_with_context,
+)
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+
+from .blobstore import CHUNK_SIZE
+from .exports import FORMATS, stream_rows, gzip_chunks
+from .extensions import db, blob_store
+from .jobs import accepted, enqueue, store_artifact, task
+from .listings import patients_of, seen_by
+from .models import PatientFile, Upload, TreatmentFile, AppointmentHistory
+from .querycount import query_budget
+
+
+bp = Blueprint("files", __name__, cli_group=None)
+
+
+@bp.route('/generate_csv')
+def generate_csv():
+    # Create a CSV in memory
+    output = []
+    output.append(['Name', 'Score'])
+    output.append(['Alice', 95])
+    output.append(['Bob', 89])
+    
+    # Convert list to CSV
+    response = Response(
+        '\n'.join([','.join(map(str, row)) for row in output]),
+        mimetype='text/csv'
+    )
+    response.headers["Content-Disposition"] = "attachment;filename=report.csv"
+    return response
+
+# Exportable resources: columns to select, the condition for the doctor_id
+# filter (patients and treatments go by who the doctor has seen) and the
+# column the from/to filters apply to (None if not applicable). Appointments
+# include archived ones.
+EXPORTS = {
+    "patients": {
+        "columns": [PatientFile.patient_id, PatientFile.name, PatientFile.email,
+                    PatientFile.gender, PatientFile.age, PatientFile.doctor_id],
+        "doctor": seen_by,
+        "time": None,
+    },
+    "appointments": {
+        "columns": [AppointmentHistory.appointment_id, AppointmentHistory.patient_id, AppointmentHistory.doctor_id,
+                    AppointmentHistory.appointment_time, AppointmentHistory.description],
+        "doctor": lambda doctor_id: AppointmentHistory.doctor_id == doctor_id,
+        "time": AppointmentHistory.appointment_time,
+    },
+    "treatments": {
+        "columns": [TreatmentFile.treatment_id, TreatmentFile.patient_id,
+                    TreatmentFile.diagnosis, TreatmentFile.report_path],
+        "doctor": lambda doctor_id: TreatmentFile.patient_id.in_(patients_of(doctor_id)),
+        "time": None,
+    },
+}
+
+
+def _export_statement(resource, args):
+    # Raises ValueError with a message for the client on bad filters
+    spec = EXPORTS[resource]
+    statement = db.select(*spec["columns"]).order_by(spec["columns"][0])
+
+    if spec["time"] is None and (args.get("from") or args.get("to")):
+        raise ValueError(f"{resource} cannot be filtered by date")
+    try:
+        if args.get("doctor_id"):
+            statement = statement.where(spec["doctor"](int(args["doctor_id"])))
+        for arg, compare in (("from", "__ge__"), ("to", "__lt__")):
+            if args.get(arg):
+                bound = datetime.fromisoformat(args[arg])
+                statement = statement.where(getattr(spec["time"], compare)(bound))
+    except ValueError:
+        raise ValueError("Invalid export filter")
+    return statement, [column.key for column in spec["columns"]]
+
+
+def _export_chunks(resource, fmt, args):
+    statement, header = _export_statement(resource, args)
+    render, mimetype = FORMATS[fmt]
+    chunks = render(header, stream_rows(db.session, statement))
+    filename = f"{resource}.{fmt}"
+    if args.get("gzip") == "1":
+        chunks = gzip_chunks(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    return chunks, mimetype, filename
+
+
+@bp.route('/export/<resource>.<fmt>')
+def export(resource, fmt):
+    if resource not in EXPORTS or fmt not in FORMATS:
+        return "Unknown export", 404
+    try:
+        chunks, mimetype, filename = _export_chunks(resource, fmt, request.args)
+    except ValueError as e:
+        return str(e), 400
+
+    if request.args.get("background") == "1":
+        # Written to the blob store by a job worker; poll the returned status URL
+        job = enqueue("export", {"resource": resource, "fmt": fmt, "args": request.args.to_dict()})
+        db.session.commit()
+        return accepted(job)
+
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment;filename={filename}"
+    return response
+
+
+@task("export")
+def export_job(resource, fmt, args):
+    chunks, mimetype, filename = _export_chunks(resource, fmt, args)
+    return store_artifact(chunks, filename, mimetype)
+
+
+@bp.route('/upload/<int:patient_id>', methods=['GET', 'POST'])
+def upload_file(patient_id):
+    patient = PatientFile.query.get_or_404(patient_id)
+    
+    if request.method == 'POST':
+        # Beyond this, clients should use a resumable upload session
+        request.max_content_length = current_app.config["UPLOAD_DIRECT_MAX_SIZE"]
+        file = request.files.get('file')
+        if not file:
+            return "No file uploaded!", 400
+        
+        digest, size = blob_store.put_stream(file.stream)
+        upload = Upload(filename=file.filename, sha256=digest, size=size, patient_id=patient_id)
+        db.session.add(upload)
+        db.session.flush()
+        enqueue("upload.postprocess", {"upload_id": upload.id})
+        db.session.commit()
+        return f'File {file.filename} uploaded for patient {patient.name}'
+
+    return render_template("index.html", patient_id=patient_id, patient_name=patient.name)
+
+
+@bp.route('/patient_files/<int:patient_id>')
+@query_budget(2)
+def patient_files(patient_id):
+    patient = PatientFile.profile("files").get_or_404(patient_id)
+
+    files = patient.uploads 
+    return render_template(
+        "patient_files.html", 
+        patient=patient, 
+        files=files
+    )
+
+@bp.route('/download/<int:file_id>')
+def download_file(file_id):
+    file = Upload.query.get_or_404(file_id)
+    if file.sha256 is None:
+        # Row not migrated out of the database yet
+        return send_file(BytesIO(file.data), as_attachment=True, download_name=file.filename)
+    # Serving from a path lets the WSGI server use sendfile; conditional
+    # enables Range requests and If-None-Match against the content hash.
+    # Cold blobs have no path and are streamed through the decompressor.
+    path = blob_store.path(file.sha256)
+    return send_file(
+        path if path is not None else blob_store.open(file.sha256),
+        as_attachment=True,
+        download_name=file.filename,
+        conditional=True,
+        etag=file.sha256,
+    )
+
+
+# Stand-in for a virus scanner: the EICAR test signature
+EICAR = b"X5O!P%@AP[4\\PZX54(P^)7CC)7}$EICAR-STANDARD-ANTIVIRUS-TEST-FILE!$H+H*"
+# (offset, signature, mimetype)
+MAGIC = [
+    (0, b"%PDF-", "application/pdf"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (128, b"DICM", "application/dicom"),
+]
+
+
+@task("upload.postprocess", priority=5)
+def postprocess_upload(upload_id):
+    # Re-hash the stored blob, sniff its type and scan it, off the request path
+    upload = db.session.get(Upload, upload_id)
+    if upload is None or upload.sha256 is None:
+        raise LookupError(f"no stored upload {upload_id}")
+    sha = hashlib.sha256()
+    head = tail = b""
+    infected = False
+    with blob_store.open(upload.sha256) as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            head = head or chunk[:132]
+            sha.update(chunk)
+            infected = infected or EICAR in tail + chunk
+            tail = chunk[-len(EICAR):]
+    if sha.hexdigest() != upload.sha256:
+        raise ValueError(f"blob {upload.sha256} is corrupt")
+    mimetype = next((kind for offset, magic, kind in MAGIC if head[offset:].startswith(magic)),
+                    "application/octet-stream")
+    return {"upload_id": upload_id, "sha256_verified": True, "mimetype": mimetype, "infected": infected}
+
+
+def release_blob(connection, digest):
+    """Delete a blob unless an Upload still refers to it; returns whether it was deleted."""
+    if connection.scalar(select(Upload.id).where(Upload.sha256 == digest).limit(1)) is not None:
+        return False
+    blob_store.delete(digest)
+    return True
+
+
+@event.listens_for(Upload, "after_delete")
+def _collect_released_blob(mapper, connection, target):
+    # Released once the delete commits; bulk deletes skip this and leave the blob
+    session = object_session(target)
+    if session is not None and target.sha256 is not None:
+        session.info.setdefault("released_blobs", set()).add(target.sha256)
+
+
+@event.listens_for(Session, "after_commit")
+def _release_committed_blobs(session):
+    digests = session.info.pop("released_blobs", None)
+    if digests and has_app_context():
+        with session.get_bind().connect() as connection:
+            for digest in digests:
+                release_blob(connection, digest)
+
+
+@event.listens_for(Session, "after_rollback")
+def _keep_rolled_back_blobs(session):
+    session.info.pop("released_blobs", None)
+
+
+@bp.cli.command("migrate-uploads")
+def migrate_uploads():
+    """Move Upload.data rows out of the database into the blob store."""
+    moved = 0
+    while True:
+        uploads = Upload.query.filter(Upload.sha256.is_(None), Upload.data.isnot(None)).limit(100).all()
+        if not uploads:
+            break
+        for upload in uploads:
+            upload.sha256, upload.size = blob_store.put_bytes(upload.data)
+            upload.data = None
+        db.session.commit()
+        moved += len(uploads)
+    print(f"Moved {moved} uploads to {current_app.config['BLOB_STORE_PATH']}")
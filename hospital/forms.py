@@ -11,6 +11,13 @@ class SignupForm(FlaskForm):
     confirm_password = PasswordField("confirm password",  validators=[DataRequired(), Length(2, 8), EqualTo("password")])
     submit = SubmitField("submit")
 
+class DoctorForm(FlaskForm):
+    name = StringField("Name", validators=[DataRequired(), Length(1, 25)])
+    email = StringField("Email", validators=[DataRequired(), Email()])
+    phone = IntegerField("Phone", validators=[DataRequired()])
+    specialist = StringField("Specialist", validators=[DataRequired(), Length(1, 100)])
+    password = PasswordField("Password", validators=[DataRequired()])
+
 class LoginForm(FlaskForm):
     email = StringField("Email", validators=[DataRequired(), Email()])
     password = PasswordField("Password", validators=[DataRequired()])
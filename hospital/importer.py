@@ -0,0 +1,235 @@
+import csv
+import hashlib
+import json
+import os
+import tempfile
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+
+class RowError(ValueError):
+    pass
+
+
+class UnreadableRow(RowError):
+    # Yielded by read_rows() in place of a line it cannot parse, so the
+    # importer reports it against its row number and carries on
+    def __init__(self, message, raw):
+        super().__init__(message)
+        self.raw = raw
+
+
+class ImportSpec:
+    # How to turn one input row into column values for one model.
+    #   validate(row) -> dict of column values, or raise RowError
+    #   unique: column checked against the database before inserting
+    #   references: {column: referenced model column}; rows pointing at a
+    #     missing row are reported instead of inserted
+    #   password: column to hash (in parallel, per chunk) before inserting
+    #   after_chunk(session, values): hook run inside each chunk transaction
+
+    def __init__(self, model, validate, unique=None, references=None, password=None, after_chunk=None):
+        self.model = model
+        self.validate = validate
+        self.unique = unique
+        self.references = references or {}
+        self.password = password
+        self.after_chunk = after_chunk
+
+
+def read_rows(path):
+    # CSV files with a header row, or JSON lines (one object per line)
+    if path.endswith((".json", ".ndjson", ".jsonl")):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield UnreadableRow(f"invalid JSON: {e}", line.rstrip("\r\n"))
+                    continue
+                if isinstance(row, dict):
+                    yield row
+                else:
+                    yield UnreadableRow(f"expected a JSON object, got {type(row).__name__}", row)
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+def spool_upload(stream, directory, extension, chunk_size=64 * 1024):
+    # Save an uploaded import file under its content hash, so uploading the
+    # same file again resumes from its checkpoint instead of starting over
+    os.makedirs(directory, exist_ok=True)
+    sha = hashlib.sha256()
+    fd, tmp = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+            out.write(chunk)
+    path = os.path.join(directory, sha.hexdigest() + extension)
+    os.replace(tmp, path)
+    return path
+
+
+class ImportReport:
+    def __init__(self, path):
+        self.path = path
+        self.imported = 0
+        self.skipped = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message, row):
+        self.failed += 1
+        self.errors.append({"row": row_number, "error": message, "data": row})
+
+    def flush(self):
+        # Append this chunk's errors to <source>.errors.csv
+        if not self.errors:
+            return
+        new = not os.path.exists(self.path)
+        with open(self.path, "a", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(["row", "error", "data"])
+            for e in self.errors:
+                writer.writerow([e["row"], e["error"], json.dumps(e["data"], default=str)])
+        self.errors = []
+
+    def summary(self):
+        return {
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "error_report": self.path if self.failed else None,
+        }
+
+
+class Importer:
+    # Streams rows from a file, validates them, and inserts them in chunked
+    # transactions with one executemany per chunk. The last committed row
+    # number is checkpointed to <source>.progress, so an interrupted import
+    # picks up where it stopped when run again.
+
+    def __init__(self, session, hasher, chunk_size=1000):
+        self.session = session
+        self.hasher = hasher
+        self.chunk_size = chunk_size
+
+    def run(self, spec, path, restart=False):
+        progress_path = path + ".progress"
+        report = ImportReport(path + ".errors.csv")
+        if restart:
+            for stale in (progress_path, report.path):
+                if os.path.exists(stale):
+                    os.remove(stale)
+        done = 0
+        if os.path.exists(progress_path):
+            with open(progress_path) as f:
+                done = int(f.read().strip() or 0)
+
+        chunk = []
+        row_number = 0
+        for row_number, row in enumerate(read_rows(path), start=1):
+            if row_number <= done:
+                report.skipped += 1
+                continue
+            chunk.append((row_number, row))
+            if len(chunk) >= self.chunk_size:
+                self._load_chunk(spec, chunk, report)
+                self._checkpoint(progress_path, row_number)
+                chunk = []
+        if chunk:
+            self._load_chunk(spec, chunk, report)
+            self._checkpoint(progress_path, row_number)
+        report.flush()
+        return report.summary()
+
+    def _checkpoint(self, path, row_number):
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(str(row_number))
+        os.replace(tmp, path)
+
+    def _load_chunk(self, spec, chunk, report):
+        valid = []
+        for row_number, row in chunk:
+            if isinstance(row, UnreadableRow):
+                report.error(row_number, str(row), row.raw)
+                continue
+            try:
+                valid.append((row_number, row, spec.validate(row)))
+            except RowError as e:
+                report.error(row_number, str(e), row)
+
+        if spec.unique is not None and valid:
+            valid = self._drop_duplicates(spec, valid, report)
+
+        for name, target in spec.references.items():
+            if valid:
+                valid = self._drop_missing(name, target, valid, report)
+
+        if spec.password is not None and valid:
+            hashes = self.hasher.hash_many([values[spec.password] for _, _, values in valid])
+            for (_, _, values), pwhash in zip(valid, hashes):
+                values[spec.password] = pwhash
+
+        if valid:
+            try:
+                self._insert(spec, [values for _, _, values in valid])
+            except IntegrityError:
+                # Something in the chunk conflicts; retry row by row so only
+                # the offending rows are reported
+                self.session.rollback()
+                self._insert_one_by_one(spec, valid, report)
+            else:
+                report.imported += len(valid)
+        report.flush()
+
+    def _insert(self, spec, rows):
+        self.session.execute(insert(spec.model), rows)
+        if spec.after_chunk is not None:
+            spec.after_chunk(self.session, rows)
+        self.session.commit()
+
+    def _insert_one_by_one(self, spec, valid, report):
+        for row_number, row, values in valid:
+            try:
+                self._insert(spec, [values])
+            except IntegrityError as e:
+                self.session.rollback()
+                report.error(row_number, str(e.orig), row)
+            else:
+                report.imported += 1
+
+    def _drop_duplicates(self, spec, valid, report):
+        column = getattr(spec.model, spec.unique)
+        keys = [values[spec.unique] for _, _, values in valid]
+        existing = set(self.session.execute(select(column).where(column.in_(keys))).scalars())
+        kept = []
+        for row_number, row, values in valid:
+            key = values[spec.unique]
+            if key in existing:
+                report.error(row_number, f"{spec.unique} {key!r} already exists", row)
+            else:
+                existing.add(key)
+                kept.append((row_number, row, values))
+        return kept
+
+    def _drop_missing(self, name, target, valid, report):
+        # One lookup per chunk; the database may not enforce the foreign key
+        keys = {values[name] for _, _, values in valid}
+        existing = set(self.session.execute(select(target).where(target.in_(keys))).scalars())
+        kept = []
+        for row_number, row, values in valid:
+            if values[name] in existing:
+                kept.append((row_number, row, values))
+            else:
+                report.error(row_number, f"{name} {values[name]!r} does not exist", row)
+        return kept
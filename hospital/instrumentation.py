@@ -0,0 +1,203 @@
+import sys
+import threading
+import time
+from collections import Counter, deque
+from bisect import bisect_left
+
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _labels(labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels, value):
+        labels = tuple(labels)
+        with self.lock:
+            counts, total = self.series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self.series[labels] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            series = sorted((k, (list(c), t)) for k, (c, t) in self.series.items())
+        for labels, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{{{_labels(labels + (('le', le),))}}} {cumulative}")
+            lines.append(f"{self.name}_sum{{{_labels(labels)}}} {total}")
+            lines.append(f"{self.name}_count{{{_labels(labels)}}} {cumulative}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.values = Counter()
+        self.lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self.lock:
+            self.values[tuple(labels)] += amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{{{_labels(labels)}}} {value}")
+        return lines
+
+
+class SamplingProfiler:
+    # Samples one thread's stack at a fixed interval and aggregates the
+    # samples as collapsed stacks ("outer;inner;leaf count"), the input
+    # format flame graph tools expect.
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+
+class Metrics:
+    def __init__(self, slow_query_seconds=0.1, slow_query_samples=50):
+        self.latency = Histogram(
+            "http_request_duration_seconds", "Request latency by endpoint.", LATENCY_BUCKETS)
+        self.queries = Histogram(
+            "db_queries_per_request", "SQL statements issued per request.", QUERY_BUCKETS)
+        self.sql_time = Histogram(
+            "db_time_per_request_seconds", "Time spent in SQL per request.", LATENCY_BUCKETS)
+        self.requests = CounterMetric("http_requests_total", "Requests by endpoint and status.")
+        self.slow_query_count = CounterMetric(
+            "db_slow_queries_total", "Statements slower than the slow query threshold, by endpoint.")
+        self.slow_query_seconds = slow_query_seconds
+        # The statements themselves are served at /metrics/slow-queries;
+        # as Prometheus labels they would be unbounded and repeat
+        self.slow_queries = deque(maxlen=slow_query_samples)
+        # Extra gauge sources: name -> callable returning {metric: value}
+        self.gauges = {}
+
+    def record_slow_query(self, endpoint, duration, statement):
+        self.slow_query_count.inc((("endpoint", endpoint),))
+        self.slow_queries.append((endpoint, duration, " ".join(statement.split())[:300]))
+
+    def slow_query_samples(self):
+        return [{"endpoint": endpoint, "seconds": duration, "sql": statement}
+                for endpoint, duration, statement in list(self.slow_queries)]
+
+    def render(self):
+        lines = []
+        for metric in (self.latency, self.queries, self.sql_time, self.requests, self.slow_query_count):
+            lines.extend(metric.render())
+        for prefix, source in sorted(self.gauges.items()):
+            for name, value in sorted(source().items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def init_instrumentation(app, engine):
+    # Record per-endpoint latency, query counts and SQL time, and serve them
+    # in Prometheus text format at /metrics. With PROFILER_ENABLED, adding
+    # ?_profile=1 to a request returns its sampled stacks instead of the page.
+    app.config.setdefault("SLOW_QUERY_SECONDS", 0.1)
+    app.config.setdefault("PROFILER_ENABLED", False)
+    app.config.setdefault("PROFILER_INTERVAL", 0.005)
+    metrics = Metrics(app.config["SLOW_QUERY_SECONDS"])
+    app.extensions["metrics"] = metrics
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        duration = time.perf_counter() - conn.info["query_start"].pop()
+        endpoint = "-"
+        if has_request_context():
+            endpoint = request.endpoint or "unmatched"
+            if "sql_time" in g:
+                g.sql_time += duration
+        if duration >= metrics.slow_query_seconds:
+            metrics.record_slow_query(endpoint, duration, statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.sql_time = 0.0
+        if app.config["PROFILER_ENABLED"] and request.args.get("_profile") == "1":
+            g.profiler = SamplingProfiler(threading.get_ident(), app.config["PROFILER_INTERVAL"])
+            g.profiler.start()
+
+    @app.after_request
+    def record_request(response):
+        if "request_start" not in g:
+            return response
+        endpoint = request.endpoint or "unmatched"
+        labels = (("endpoint", endpoint), ("method", request.method))
+        metrics.latency.observe(labels, time.perf_counter() - g.request_start)
+        metrics.queries.observe((("endpoint", endpoint),), g.get("query_count", 0))
+        metrics.sql_time.observe((("endpoint", endpoint),), g.sql_time)
+        metrics.requests.inc(labels + (("status", response.status_code),))
+        if "profiler" in g:
+            return Response(g.pop("profiler").stop(), mimetype="text/plain")
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # after_request is skipped when an exception propagates (DEBUG/TESTING)
+        if "profiler" in g:
+            g.pop("profiler").stop()
+
+    @app.route("/metrics")
+    def metrics_endpoint():
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    @app.route("/metrics/slow-queries")
+    def slow_queries_endpoint():
+        return {"threshold_seconds": metrics.slow_query_seconds, "samples": metrics.slow_query_samples()}
+
+    return metrics
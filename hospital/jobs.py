@@ -0,0 +1,253 @@
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from datetime import datetime, timedelta
+
+import click
+from flask import Blueprint, abort, current_app, request, send_file, url_for
+from sqlalchemy import and_, or_, select, update
+
+from .extensions import db, blob_store
+from .models import Job
+
+
+class Task:
+    def __init__(self, fn, priority=0, max_attempts=None):
+        self.fn = fn
+        self.priority = priority
+        self.max_attempts = max_attempts
+
+
+# kind -> Task; filled by @task in the modules that own the work
+TASKS = {}
+
+
+def task(kind, priority=0, max_attempts=None):
+    def register(fn):
+        TASKS[kind] = Task(fn, priority, max_attempts)
+        return fn
+    return register
+
+
+def make_job(kind, payload, config, priority=None, delay=0):
+    spec = TASKS[kind]
+    return Job(
+        kind=kind,
+        payload=json.dumps(payload),
+        priority=spec.priority if priority is None else priority,
+        max_attempts=spec.max_attempts or config["JOB_MAX_ATTEMPTS"],
+        run_after=datetime.utcnow() + timedelta(seconds=delay),
+    )
+
+
+def enqueue(kind, payload, priority=None, delay=0):
+    # Added to the current session, so the job is only visible to workers
+    # once the request's own changes commit
+    job = make_job(kind, payload, current_app.config, priority, delay)
+    db.session.add(job)
+    return job
+
+
+def store_artifact(chunks, filename, mimetype):
+    # Job output goes to the blob store; the result records where
+    writer = blob_store.writer()
+    try:
+        for chunk in chunks:
+            writer.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        digest, size = writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+    return {"blob": digest, "filename": filename, "mimetype": mimetype, "size": size}
+
+
+def _backoff(attempts):
+    return min(2 ** attempts, 300)
+
+
+class Worker:
+    # Claims one due job at a time: highest priority first, then oldest.
+    # A claim is a single UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP
+    # LOCKED), so concurrent workers never get the same job. The claim is
+    # a lease; if the worker dies, the job is handed out again after it.
+
+    def __init__(self, session, config, worker_id=None, kinds=None):
+        self.session = session
+        self.lease = config["JOB_LEASE_SECONDS"]
+        self.poll = config["JOB_POLL_SECONDS"]
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.stopping = False
+
+    def claim(self):
+        now = datetime.utcnow()
+        due = or_(
+            and_(Job.status == "queued", Job.run_after <= now),
+            and_(Job.status == "running", Job.locked_until < now, Job.attempts < Job.max_attempts),
+        )
+        candidate = select(Job.id).where(due)
+        if self.kinds:
+            candidate = candidate.where(Job.kind.in_(self.kinds))
+        candidate = candidate.order_by(Job.priority.desc(), Job.id).limit(1).with_for_update(skip_locked=True)
+        job_id = self.session.execute(
+            update(Job)
+            .where(Job.id == candidate.scalar_subquery(), due)
+            .values(status="running", locked_by=self.worker_id,
+                    locked_until=now + timedelta(seconds=self.lease), attempts=Job.attempts + 1)
+            .returning(Job.id)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+        self.session.commit()
+        return self.session.get(Job, job_id) if job_id is not None else None
+
+    def reap(self):
+        # Leases that ran out on their last attempt will never be claimed again
+        self.session.execute(
+            update(Job)
+            .where(Job.status == "running", Job.locked_until < datetime.utcnow(), Job.attempts >= Job.max_attempts)
+            .values(status="failed", error="lease expired", finished_at=datetime.utcnow(), locked_by=None)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+
+    def run_once(self):
+        job = self.claim()
+        if job is None:
+            return False
+        job_id, kind, payload, attempts, max_attempts = job.id, job.kind, job.payload, job.attempts, job.max_attempts
+        try:
+            if kind not in TASKS:
+                raise LookupError(f"no task registered for {kind!r}")
+            result = TASKS[kind].fn(**json.loads(payload))
+        except Exception as e:
+            self.session.rollback()
+            error = f"{type(e).__name__}: {e}"
+            if attempts < max_attempts:
+                values = {"status": "queued", "error": error,
+                          "run_after": datetime.utcnow() + timedelta(seconds=_backoff(attempts))}
+            else:
+                values = {"status": "failed", "error": error, "finished_at": datetime.utcnow()}
+        else:
+            values = {"status": "succeeded", "result": json.dumps(result), "error": None,
+                      "finished_at": datetime.utcnow()}
+        # Only if we still hold the lease; otherwise another worker owns it now
+        self.session.execute(
+            update(Job).where(Job.id == job_id, Job.locked_by == self.worker_id)
+            .values(locked_by=None, locked_until=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        self.session.commit()
+        return True
+
+    def run(self):
+        last_reap = 0
+        while not self.stopping:
+            if time.monotonic() - last_reap > self.lease:
+                self.reap()
+                last_reap = time.monotonic()
+            if not self.run_once():
+                self.session.close()
+                time.sleep(self.poll)
+
+
+def _worker_process(kinds, index):
+    # Each process builds its own app (and so its own connection pool)
+    from . import create_app
+
+    app = create_app()
+    with app.app_context():
+        worker = Worker(db.session, app.config, f"{socket.gethostname()}:{os.getpid()}:{index}", kinds)
+
+        def stop(signum, frame):
+            worker.stopping = True
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        worker.run()
+
+
+def job_status(job):
+    data = {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "created_at": job.created_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "error": job.error,
+        "result": json.loads(job.result) if job.result else None,
+    }
+    if data["result"] and isinstance(data["result"], dict) and "blob" in data["result"]:
+        data["download_url"] = url_for("jobs.download_job", job_id=job.id)
+    return data
+
+
+def accepted(job):
+    # 202 response for a route that handed its work to the queue
+    return job_status(job), 202, {"Location": url_for("jobs.show_job", job_id=job.id)}
+
+
+bp = Blueprint("jobs", __name__, cli_group=None)
+
+
+@bp.route("/jobs")
+def list_jobs():
+    query = Job.query.order_by(Job.id.desc())
+    for arg in ("status", "kind"):
+        if request.args.get(arg):
+            query = query.filter(getattr(Job, arg) == request.args[arg])
+    return {"jobs": [job_status(job) for job in query.limit(100)]}
+
+
+@bp.route("/jobs/<int:job_id>")
+def show_job(job_id):
+    return job_status(Job.query.get_or_404(job_id))
+
+
+@bp.route("/jobs/<int:job_id>/download")
+def download_job(job_id):
+    job = Job.query.get_or_404(job_id)
+    result = json.loads(job.result) if job.status == "succeeded" and job.result else {}
+    if "blob" not in result:
+        abort(404)
+    path = blob_store.path(result["blob"])
+    return send_file(path if path is not None else blob_store.open(result["blob"]),
+                     mimetype=result["mimetype"], as_attachment=True,
+                     download_name=result["filename"], conditional=True, etag=result["blob"])
+
+
+@bp.cli.command("jobs-worker")
+@click.option("--processes", type=int, default=None, help="Worker processes (default JOB_WORKERS).")
+@click.option("--kind", "kinds", multiple=True, help="Only run these job kinds.")
+def jobs_worker(processes, kinds):
+    """Run background jobs until interrupted."""
+    processes = current_app.config["JOB_WORKERS"] if processes is None else processes
+    if processes <= 1:
+        worker = Worker(db.session, current_app.config, kinds=list(kinds))
+        try:
+            worker.run()
+        except KeyboardInterrupt:
+            pass
+        return
+
+    context = multiprocessing.get_context("spawn")
+    children = [context.Process(target=_worker_process, args=(list(kinds), i)) for i in range(processes)]
+    for child in children:
+        child.start()
+
+    # Children finish their current job after SIGTERM, then exit
+    def stop(signum, frame):
+        for child in children:
+            if child.is_alive():
+                child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"Started {processes} job workers")
+    for child in children:
+        child.join()
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+from urllib.parse import urlencode
+
+from flask import current_app, request
+from sqlalchemy import func, select
+
+from .cache import snapshot
+from .extensions import cache, db
+from .models import (
+    AdminFile, AppointmentArchive, AppointmentFile, AppointmentHistory, DoctorFile, DoctorPatientLoad, PatientFile,
+    TreatmentFile, Upload,
+)
+from .pagination import Listing, Page, exact, prefix, at_least, before
+
+
+def patients_of(doctor_id):
+    # Ids of patients with any appointment with the doctor, archived ones
+    # included; read from the rollup rather than scanning appointments
+    return select(DoctorPatientLoad.patient_id).where(DoctorPatientLoad.doctor_id == doctor_id)
+
+
+def seen_by(doctor_id):
+    return PatientFile.patient_id.in_(patients_of(doctor_id))
+
+
+def _appointments(model):
+    return Listing(
+        model, "appointment_id",
+        sorts={"appointment_id", "appointment_time"},
+        filters={
+            "doctor_id": exact(model.doctor_id),
+            "patient_id": exact(model.patient_id),
+            "from": at_least(model.appointment_time, datetime.fromisoformat),
+            "to": before(model.appointment_time, datetime.fromisoformat),
+        },
+        fields=["appointment_id", "patient_id", "doctor_id", "appointment_time", "description"],
+        default_sort="appointment_time",
+    )
+
+
+# Keyset-paginated listings shared by the HTML views and /list/<resource>
+LISTINGS = {
+    "patients": Listing(
+        PatientFile, "patient_id",
+        sorts={"patient_id", "name", "email", "age"},
+        filters={
+            "name": prefix(PatientFile.name),
+            "email": prefix(PatientFile.email),
+            "gender": exact(PatientFile.gender),
+            "doctor_id": lambda query, value: query.filter(seen_by(int(value))),
+        },
+        fields=["patient_id", "name", "email", "gender", "age", "doctor_id"],
+    ),
+    "doctors": Listing(
+        DoctorFile, "doctor_id",
+        sorts={"doctor_id", "name", "specialist"},
+        filters={"name": prefix(DoctorFile.name), "specialist": exact(DoctorFile.specialist)},
+        fields=["doctor_id", "name", "email", "phone", "specialist"],
+    ),
+    "admins": Listing(
+        AdminFile, "admin_id",
+        sorts={"admin_id", "name", "role"},
+        filters={"name": prefix(AdminFile.name), "role": exact(AdminFile.role)},
+        fields=["admin_id", "name", "email", "role", "phone", "is_active", "last_login"],
+    ),
+    "appointments": _appointments(AppointmentFile),
+    "treatments": Listing(
+        TreatmentFile, "treatment_id",
+        sorts={"treatment_id", "updated_at"},
+        filters={"patient_id": exact(TreatmentFile.patient_id), "diagnosis": prefix(TreatmentFile.diagnosis)},
+        fields=["treatment_id", "patient_id", "diagnosis", "report_path", "updated_at"],
+    ),
+    "uploads": Listing(
+        Upload, "id",
+        sorts={"id", "time", "size"},
+        filters={"patient_id": exact(Upload.patient_id), "sha256": exact(Upload.sha256)},
+        fields=["id", "patient_id", "filename", "time", "size", "sha256"],
+    ),
+}
+
+
+# The same listings over live plus archived rows (see hospital.archive)
+HISTORY = {"appointments": _appointments(AppointmentHistory)}
+ARCHIVED_UNTIL = select(func.max(AppointmentArchive.appointment_time))
+
+
+def choose_listing(resource, args, archived_until):
+    # Only a read reaching back to the newest archived row needs the union;
+    # anything starting after it stays on the hot table
+    if resource not in HISTORY or archived_until is None:
+        return LISTINGS[resource]
+    try:
+        start = datetime.fromisoformat(args["from"])
+    except (KeyError, ValueError):
+        return HISTORY[resource]
+    return HISTORY[resource] if start <= archived_until else LISTINGS[resource]
+
+
+def listing_for(resource):
+    archived_until = db.session.scalar(ARCHIVED_UNTIL) if resource in HISTORY else None
+    return choose_listing(resource, request.args, archived_until)
+
+
+def list_page(resource, query=None):
+    listing = LISTINGS[resource] if query is not None else listing_for(resource)
+    return listing.page(request.args, query=query, limit=current_app.config["PAGE_SIZE"])
+
+
+def cached_list_page(resource, tags, query=None, key="", to_row=snapshot):
+    # Same as list_page, but the page is cached as plain row snapshots keyed
+    # by the request's listing arguments. query is a callable so nothing is
+    # built on a cache hit.
+    args = urlencode(sorted(request.args.items(multi=True)))
+
+    def load():
+        page = list_page(resource, query() if query is not None else None)
+        return [to_row(row) for row in page.items], page.next_cursor, page.sort, page.limit
+
+    items, next_cursor, sort, limit = cache.get_or_set(f"list:{resource}:{key}?{args}", tags, load)
+    return Page(items, next_cursor, sort, limit)
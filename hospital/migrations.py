@@ -0,0 +1,146 @@
+import warnings
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import UniqueConstraint, func, inspect, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateColumn, CreateIndex
+
+from .extensions import db
+
+
+# Databases predate most of the models' columns, indexes and tables, and
+# nothing else ever alters them. upgrade() compares the live schema with
+# the models and adds whatever is missing; it never drops or rewrites.
+
+# (tables, sources, when, fn): fn(connection) fills derived tables from
+# data already in the database. upgrade() runs it whenever one of `tables`
+# is empty while one of `sources` has rows, or whenever when(connection)
+# says so. That covers a table it has just created as well as one left
+# empty by an earlier upgrade that failed after creating it.
+BACKFILLS = []
+
+
+def backfills(*tables, sources=(), when=None):
+    def register(fn):
+        BACKFILLS.append((tables, sources, when, fn))
+        return fn
+    return register
+
+
+def _has_rows(connection, name):
+    quoted = connection.dialect.identifier_preparer.quote(name)
+    return connection.execute(text(f"SELECT 1 FROM {quoted} LIMIT 1")).first() is not None
+
+
+def _needs_backfill(connection, tables, sources, when):
+    if when is not None:
+        return when(connection)
+    return (any(not _has_rows(connection, name) for name in tables)
+            and any(_has_rows(connection, name) for name in sources))
+
+
+def _index_names(connection, inspector, table):
+    # Names of the table's indexes and unique constraints. The inspector
+    # skips expression indexes on SQLite, warning each time; PRAGMA lists them.
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", "Skipped unsupported reflection of expression-based index")
+        names = {constraint["name"] for constraint in inspector.get_unique_constraints(table.name)}
+        if connection.dialect.name != "sqlite":
+            return names | {index["name"] for index in inspector.get_indexes(table.name)}
+    quoted = connection.dialect.identifier_preparer.format_table(table)
+    return names | {row[1] for row in connection.exec_driver_sql(f"PRAGMA index_list({quoted})")}
+
+
+def duplicate_groups(connection, constraint):
+    # Value tuples held by more than one row, which stop `constraint` being added
+    columns = list(constraint.columns)
+    return connection.execute(
+        select(*columns, func.count()).group_by(*columns).having(func.count() > 1)
+    ).all()
+
+
+def upgrade(connection, metadata=None):
+    """Add missing tables, columns, indexes and unique constraints.
+
+    Returns (changes, conflicts). A unique constraint that existing rows
+    violate is skipped and reported in conflicts rather than failing the
+    upgrade; it is added by the first upgrade after the rows are fixed.
+    """
+    metadata = metadata if metadata is not None else db.metadata
+    inspector = inspect(connection)
+    existing = set(inspector.get_table_names())
+    preparer = connection.dialect.identifier_preparer
+    changes, conflicts = [], []
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            table.create(connection)
+            changes.append(f"created table {table.name}")
+            continue
+
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in columns:
+                # Added columns are nullable on every model, so ADD COLUMN works everywhere
+                ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {ddl}"))
+                changes.append(f"added column {table.name}.{column.name}")
+
+        named = _index_names(connection, inspector, table)
+        wanted = [(index.name, CreateIndex(index), None) for index in table.indexes]
+        # SQLite cannot add a constraint to an existing table; a unique index
+        # under the constraint's name enforces the same thing
+        wanted += [
+            (constraint.name, text(
+                f"CREATE UNIQUE INDEX {preparer.quote(constraint.name)} ON {preparer.format_table(table)} "
+                f"({', '.join(preparer.quote(column.name) for column in constraint.columns)})"
+            ), constraint)
+            for constraint in table.constraints
+            if isinstance(constraint, UniqueConstraint) and constraint.name
+        ]
+        for name, ddl, constraint in wanted:
+            if name in named:
+                continue
+            if constraint is not None:
+                groups = duplicate_groups(connection, constraint)
+                if groups:
+                    resolve = constraint.info.get("resolve", "remove the duplicates")
+                    conflicts.append(
+                        f"unique {name} not added: {len(groups)} duplicated "
+                        f"({', '.join(column.name for column in constraint.columns)}) values in {table.name}; "
+                        f"{resolve}, then run `flask db-upgrade`"
+                    )
+                    continue
+            connection.execute(ddl)
+            changes.append(f"added index {name}")
+
+    for tables, sources, when, fn in BACKFILLS:
+        if _needs_backfill(connection, tables, sources, when):
+            fn(connection)
+            changes.append(f"backfilled {', '.join(tables)}" if tables else f"ran {fn.__name__}")
+    return changes, conflicts
+
+
+def upgrade_database(engine, attempts=3):
+    # Workers starting together race to apply the same change; whoever loses
+    # sees it already applied on the next pass
+    for attempt in range(attempts):
+        try:
+            with engine.begin() as connection:
+                return upgrade(connection)
+        except DBAPIError:
+            if attempt == attempts - 1:
+                raise
+
+
+@click.command("db-upgrade")
+@with_appcontext
+def db_upgrade_command():
+    """Bring the database schema up to date with the models."""
+    changes, conflicts = upgrade_database(db.engine)
+    for change in changes:
+        print(change)
+    for conflict in conflicts:
+        print(f"warning: {conflict}")
+    print(f"{len(changes)} schema changes applied")
@@ -0,0 +1,324 @@
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+
+from .cache import track_changes
+from .extensions import db
+from .migrations import backfills
+
+
+class PatientFile(db.Model):
+    __tablename__ = "patient_file"
+
+    patient_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(25), nullable=False, index=True)
+    email = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    gender = db.Column(db.String(), nullable=False)
+    age = db.Column(db.Integer, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+
+    # Foreign key linking to the DoctorFile
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_file.doctor_id'), nullable=True)
+
+    # Case-insensitive prefix search for queries too short for the search index
+    __table_args__ = (
+        db.Index("ix_patient_file_name_lower", db.func.lower(name)),
+        db.Index("ix_patient_file_email_lower", db.func.lower(email)),
+    )
+
+    # Relationship with treatment (one patient can have many treatments)
+    treatment = db.relationship("TreatmentFile", backref="patient", lazy=True)
+
+    # Relationship with Upload (one patient can have many uploads)
+    uploads = db.relationship("Upload", backref="patient", lazy=True)
+
+    @classmethod
+    def profile(cls, name):
+        # Named loading profiles so listings don't fall into N+1 lazy loads
+        profiles = {
+            "roster": (db.selectinload(cls.doctor),),
+            "files": (db.selectinload(cls.uploads),),
+        }
+        return cls.query.options(*profiles[name])
+
+
+class Upload(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(50))
+    time = db.Column(db.DateTime, default=datetime.utcnow)
+    # Legacy inline payload; new uploads live in the blob store under sha256.
+    # Deferred so listings never pull blob bytes.
+    data = db.deferred(db.Column(db.LargeBinary))
+    sha256 = db.Column(db.String(64), index=True)
+    size = db.Column(db.BigInteger)
+
+    # Foreign key linking to PatientFile
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_file.patient_id'), nullable=False)
+
+class UploadSession(db.Model):
+    __tablename__ = "upload_session"
+
+    # A resumable upload in progress: fixed-size chunks are PUT into a spool
+    # file (hospital.uploads) and committed into an Upload once all arrived
+    id = db.Column(db.String(32), primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_file.patient_id'), nullable=False)
+    filename = db.Column(db.String(50), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunk_size = db.Column(db.Integer, nullable=False)
+    sha256 = db.Column(db.String(64), nullable=False)  # declared by the client
+    status = db.Column(db.String(20), nullable=False, default="open")  # open, committing, committed, failed
+    upload_id = db.Column(db.Integer, db.ForeignKey('upload.id'))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    chunks = db.relationship("UploadChunk", backref="session", lazy=True, cascade="all, delete-orphan")
+
+    __table_args__ = (db.Index("ix_upload_session_status_expires", "status", "expires_at"),)
+
+
+class UploadChunk(db.Model):
+    __tablename__ = "upload_chunk"
+
+    session_id = db.Column(db.String(32), db.ForeignKey('upload_session.id'), primary_key=True)
+    number = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), nullable=False)
+
+
+class TreatmentFile(db.Model):
+    __tablename__ = "treatment_file"
+
+    treatment_id = db.Column(db.Integer, primary_key=True)
+    diagnosis = db.Column(db.String(200), nullable=False)  # Corrected 'diagonis' to 'diagnosis'
+    report_path = db.Column(db.String(200), nullable=False)
+    # Part of a report's content version (hospital.reports)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_file.patient_id'), nullable=False, index=True)
+
+class AdminFile(db.Model):
+    __tablename__ = "admin_file"
+
+    admin_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), nullable=False, index=True)
+    email = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    password = db.Column(db.String(200), nullable=False)
+    role = db.Column(db.String(50), nullable=False)
+    phone = db.Column(db.String(15), unique=True, nullable=False)  # Changed to String
+    last_login = db.Column(db.DateTime, default=datetime.utcnow)
+    is_active = db.Column(db.Boolean, default=False)
+
+class DoctorFile(db.Model):
+    __tablename__ = "doctor_file"
+
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(25), nullable=False, index=True)
+    email = db.Column(db.String(100), unique=True, nullable=False, index=True)
+    phone = db.Column(db.Integer, unique=True, nullable=False)
+    specialist = db.Column(db.String(100), nullable=False, index=True)
+    password = db.Column(db.String(200), nullable=False)
+
+    # Relationship to patients (One doctor can have many patients)
+    patients = db.relationship("PatientFile", backref="doctor", lazy=True)
+
+
+class AppointmentFile(db.Model):
+    __tablename__ = "appointment_file"
+
+    appointment_id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_file.patient_id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_file.doctor_id'), nullable=False)
+    appointment_time = db.Column(db.DateTime, nullable=False)
+    description = db.Column(db.String(200), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Listing and dashboard filters are range scans on these. The unique
+    # constraint also makes double-booking a doctor's slot impossible; older
+    # databases may already hold double bookings, which block adding it.
+    __table_args__ = (
+        db.UniqueConstraint("doctor_id", "appointment_time", name="uq_appointment_doctor_time",
+                            info={"resolve": "see `flask appointments-double-booked`"}),
+        db.Index("ix_appointment_patient_time", "patient_id", "appointment_time"),
+        db.Index("ix_appointment_time", "appointment_time"),
+    )
+
+    # Relationships
+    patient = db.relationship("PatientFile", backref="appointments", lazy=True)
+    doctor = db.relationship("DoctorFile", backref="appointments", lazy=True)
+
+
+class AppointmentArchive(db.Model):
+    __tablename__ = "appointment_archive"
+
+    # Appointments moved out of appointment_file by hospital.archive once
+    # they are older than ARCHIVE_APPOINTMENTS_AFTER_DAYS; ids are kept
+    appointment_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient_file.patient_id'), nullable=False)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor_file.doctor_id'), nullable=False)
+    appointment_time = db.Column(db.DateTime, nullable=False, index=True)
+    description = db.Column(db.String(200), nullable=True)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index("ix_appointment_archive_doctor_time", "doctor_id", "appointment_time"),
+        db.Index("ix_appointment_archive_patient_time", "patient_id", "appointment_time"),
+    )
+
+
+HISTORY_COLUMNS = ["appointment_id", "patient_id", "doctor_id", "appointment_time", "description", "updated_at"]
+
+
+class AppointmentHistory(db.Model):
+    # Read-only: live and archived appointments as one relation, for reads
+    # that reach back past the archive horizon
+    __table__ = db.union_all(
+        db.select(*[AppointmentFile.__table__.c[name] for name in HISTORY_COLUMNS]),
+        db.select(*[AppointmentArchive.__table__.c[name] for name in HISTORY_COLUMNS]),
+    ).subquery("appointment_history")
+    __mapper_args__ = {"primary_key": [__table__.c.appointment_id]}
+
+
+class AppointmentDaily(db.Model):
+    __tablename__ = "appointment_daily"
+
+    # Rollups maintained by hospital.rollups on every booking change; the
+    # admin dashboard reads these instead of scanning appointment_file
+    day = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index("ix_appointment_daily_doctor_day", "doctor_id", "day"),)
+
+
+class DoctorPatientLoad(db.Model):
+    __tablename__ = "doctor_patient_load"
+
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    patient_id = db.Column(db.Integer, primary_key=True)
+    appointments = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Job(db.Model):
+    __tablename__ = "job"
+
+    # Durable queue for hospital.jobs; workers claim the highest-priority
+    # due row and hold it under a lease until they finish
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default="{}")
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_by = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime)
+    result = db.Column(db.Text)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.Index("ix_job_status_priority", "status", "priority", "run_after"),)
+
+
+class ServerSession(db.Model):
+    __tablename__ = "server_session"
+
+    # Server-side Flask sessions (hospital.sessions); the cookie holds only the id
+    id = db.Column(db.String(64), primary_key=True)
+    user = db.Column(db.String(64), index=True)  # "<user_type>:<user_id>" once logged in
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class CacheTag(db.Model):
+    __tablename__ = "cache_tag"
+
+    # Invalidation counters for hospital.cache, shared by every worker
+    tag = db.Column(db.String(200), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+
+
+class LoginIdentity(db.Model):
+    __tablename__ = "login_identity"
+
+    # Credentials of every admin, patient and doctor in one table so login is
+    # a single indexed lookup. Kept in sync by the mapper events below.
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(100), nullable=False, index=True)
+    user_type = db.Column(db.String(20), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    password = db.Column(db.String(200), nullable=False)
+
+    __table_args__ = (db.UniqueConstraint("user_type", "user_id"),)
+
+
+# model -> (user_type, primary key attribute)
+LOGIN_SOURCES = {
+    AdminFile: ("administrator", "admin_id"),
+    PatientFile: ("patient", "patient_id"),
+    DoctorFile: ("doctor", "doctor_id"),
+}
+
+# Which account wins when the same email exists in several tables
+LOGIN_PRIORITY = ["administrator", "patient", "doctor"]
+
+
+def normalize_email(email):
+    return (email or "").strip().lower()
+
+
+def _sync_login_identity(mapper, connection, target):
+    user_type, pk = LOGIN_SOURCES[mapper.class_]
+    table = LoginIdentity.__table__
+    values = {"email": normalize_email(target.email), "password": target.password}
+    result = connection.execute(
+        table.update()
+        .where(table.c.user_type == user_type, table.c.user_id == getattr(target, pk))
+        .values(**values)
+    )
+    if result.rowcount == 0:
+        connection.execute(table.insert().values(user_type=user_type, user_id=getattr(target, pk), **values))
+
+
+def _drop_login_identity(mapper, connection, target):
+    user_type, pk = LOGIN_SOURCES[mapper.class_]
+    table = LoginIdentity.__table__
+    connection.execute(
+        table.delete().where(table.c.user_type == user_type, table.c.user_id == getattr(target, pk))
+    )
+
+
+@backfills("login_identity", sources=("admin_file", "patient_file", "doctor_file"))
+def rebuild_login_identity(connection):
+    # Refill login_identity from the admin, patient and doctor tables. Runs
+    # whenever an upgrade finds it empty, so existing users can log in at once.
+    table = LoginIdentity.__table__
+    connection.execute(table.delete())
+    for model, (user_type, pk) in LOGIN_SOURCES.items():
+        source = model.__table__
+        connection.execute(table.insert().from_select(
+            ["email", "user_type", "user_id", "password"],
+            db.select(db.func.lower(db.func.trim(source.c.email)), db.literal(user_type), source.c[pk],
+                      source.c.password),
+        ))
+
+
+for _model in LOGIN_SOURCES:
+    event.listen(_model, "after_insert", _sync_login_identity)
+    event.listen(_model, "after_update", _sync_login_identity)
+    event.listen(_model, "after_delete", _drop_login_identity)
+
+
+def _changed_values(target, attr):
+    # Current value plus the pre-update one, if the attribute just changed
+    history = inspect(target).attrs[attr].history
+    return {getattr(target, attr)} | set(history.deleted or ())
+
+
+# Cache tags touched by a change to each model; None means a bulk statement
+track_changes(DoctorFile, lambda d: ["doctors", f"doctor:{d.doctor_id}"] if d else ["doctors", "doctor:all"])
+track_changes(PatientFile, lambda p: ["patients", f"patient:{p.patient_id}"] if p else ["patients", "patient:all"])
+track_changes(AppointmentFile, lambda a: [
+    f"doctor:{doctor_id}:appointments" for doctor_id in _changed_values(a, "doctor_id")
+] if a else ["appointments:all"])
@@ -0,0 +1,149 @@
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+
+class InvalidPageRequest(ValueError):
+    pass
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value["dt"])
+    return value
+
+
+def encode_cursor(sort, values):
+    raw = json.dumps([sort, [_encode_value(v) for v in values]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        sort, values = json.loads(raw)
+        return sort, [_decode_value(v) for v in values]
+    except (ValueError, TypeError, KeyError) as e:
+        raise InvalidPageRequest(str(e))
+
+
+class Page:
+    def __init__(self, items, next_cursor, sort, limit):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.sort = sort
+        self.limit = limit
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def exact(column):
+    return lambda query, value: query.filter(column == value)
+
+
+def prefix(column):
+    # A range on the raw value rather than LIKE 'abc%': SQLite's LIKE is
+    # case-insensitive, so it cannot use a binary-collated index and scans
+    # it whole, and no characters in the value need escaping
+    return lambda query, value: query.filter(column >= value, column < value + "\uffff")
+
+
+def at_least(column, parse):
+    return lambda query, value: query.filter(column >= parse(value))
+
+
+def before(column, parse):
+    return lambda query, value: query.filter(column < parse(value))
+
+
+def _after(column, pk, values, descending):
+    # Rows past the cursor (value, pk). A nullable sort column orders NULLs
+    # after every value, as PostgreSQL does; the tuple comparison alone is
+    # NULL for those rows and would end the listing at the first one.
+    key = tuple_(column, pk)
+    ahead = key < tuple_(*values) if descending else key > tuple_(*values)
+    if not column.nullable:
+        return ahead
+    value, last_pk = values
+    if value is None:
+        nulls_after = and_(column.is_(None), pk < last_pk if descending else pk > last_pk)
+        return or_(nulls_after, column.is_not(None)) if descending else nulls_after
+    return ahead if descending else or_(ahead, column.is_(None))
+
+
+class Listing:
+    # Keyset pagination over one model. Rows are ordered by (sort column,
+    # primary key) and each page starts strictly after the previous page's
+    # last key, so every page is an index range scan regardless of depth.
+
+    def __init__(self, model, pk, sorts, filters=None, fields=None, default_sort=None, max_limit=200):
+        self.model = model
+        self.pk = pk
+        self.sorts = sorts
+        self.filters = filters or {}
+        self.fields = fields or []
+        self.default_sort = default_sort or pk
+        self.max_limit = max_limit
+
+    def page(self, args, query=None, limit=50):
+        query, sort, limit = self.prepare(args, query if query is not None else self.model.query, limit)
+        return self.paginate(query.limit(limit + 1).all(), sort, limit)
+
+    def prepare(self, args, query, limit=50):
+        # Apply filters, cursor and ordering to a Query or select(); the
+        # caller fetches limit + 1 rows and hands them to paginate()
+        sort = args.get("sort", self.default_sort)
+        descending = sort.startswith("-")
+        if sort.lstrip("-") not in self.sorts:
+            raise InvalidPageRequest(f"cannot sort by {sort!r}")
+        try:
+            limit = max(1, min(int(args.get("limit", limit)), self.max_limit))
+            for name, apply in self.filters.items():
+                value = args.get(name)
+                if value not in (None, ""):
+                    query = apply(query, value)
+        except ValueError as e:
+            raise InvalidPageRequest(str(e))
+
+        sort_column = getattr(self.model, sort.lstrip("-"))
+        pk_column = getattr(self.model, self.pk)
+
+        cursor = args.get("cursor")
+        if cursor:
+            cursor_sort, values = decode_cursor(cursor)
+            if cursor_sort != sort:
+                raise InvalidPageRequest("cursor was issued for a different sort")
+            query = query.filter(_after(sort_column, pk_column, values, descending))
+
+        order = [sort_column, pk_column]
+        if sort_column.nullable:
+            order.insert(0, sort_column.is_(None))
+        query = query.order_by(*[column.desc() for column in order] if descending else order)
+        return query, sort, limit
+
+    def paginate(self, rows, sort, limit):
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = encode_cursor(sort, [getattr(last, sort.lstrip("-")), getattr(last, self.pk)])
+        return Page(rows, next_cursor, sort, limit)
+
+    def to_dict(self, row):
+        return {name: _encode_json(getattr(row, name)) for name in self.fields}
+
+
+def _encode_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+from flask import Blueprint, render_template, flash, redirect, url_for, request
+
+from .extensions import db, scheduler
+from .models import DoctorFile, PatientFile
+from .scheduling import SlotUnavailable
+
+
+bp = Blueprint("patient", __name__)
+
+
+@bp.route('/appointment_form/<int:id>', methods=['GET'])
+def appointment_form(id):
+    if request.method == "POST":
+        patient_id = id
+        doctor_id = request.form.get('doctor_id')
+        appointment_time = request.form.get('appointment_time')
+        description = request.form.get('description')
+
+        # Check if the patient exists in the database
+        patient = PatientFile.query.get(patient_id)
+        if not patient:
+            flash('Invalid patient ID. Patient not found.', 'danger')
+            return redirect(url_for('auth.home'))
+
+        # Check if the doctor exists in the database
+        doctor = DoctorFile.query.get(doctor_id)
+        if not doctor:
+            flash('Invalid doctor ID. Doctor not found.', 'danger')
+            return redirect(url_for('patient.pat'))
+
+        # Reserve the slot; the scheduler rejects overlapping bookings
+        try:
+            scheduler.reserve(
+                patient_id,
+                doctor.doctor_id,
+                datetime.strptime(appointment_time, '%Y-%m-%dT%H:%M'),
+                description
+            )
+            flash('Appointment booked successfully!', 'success')
+        except SlotUnavailable as e:
+            flash(f'Could not book the appointment: {e}', 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'An error occurred while booking the appointment: {str(e)}', 'danger')
+    return render_template('DOCTOR/appointment.html')
+
+@bp.route('/book_appointment/<int:id>', methods=['POST'])
+def book_appointment(id):
+    if request.method == "POST":
+        patient_id = id
+        doctor_id = request.form.get('doctor_id')
+        appointment_time = request.form.get('appointment_time')
+        description = request.form.get('description')
+
+        # Check if the patient exists in the database
+        patient = PatientFile.query.get(patient_id)
+        if not patient:
+            flash('Invalid patient ID. Patient not found.', 'danger')
+            return redirect(url_for('auth.home'))
+
+        # Check if the doctor exists in the database
+        doctor = DoctorFile.query.get(doctor_id)
+        if not doctor:
+            flash('Invalid doctor ID. Doctor not found.', 'danger')
+            return redirect(url_for('patient.pat'))
+
+        # Reserve the slot; the scheduler rejects overlapping bookings
+        try:
+            scheduler.reserve(
+                patient_id,
+                doctor.doctor_id,
+                datetime.strptime(appointment_time, '%Y-%m-%dT%H:%M'),
+                description
+            )
+            flash('Appointment booked successfully!', 'success')
+        except SlotUnavailable as e:
+            flash(f'Could not book the appointment: {e}', 'danger')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'An error occurred while booking the appointment: {str(e)}', 'danger')
+
+        return redirect(url_for('patient.pat', patient_id=patient_id))
+
+
+@bp.route("/patient/<int:patient_id>")
+def pat(patient_id):
+    patient = PatientFile.query.get_or_404(patient_id)
+    return render_template("patient.html", patient= patient)
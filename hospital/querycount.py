@@ -0,0 +1,50 @@
+from functools import wraps
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_budget(limit):
+    # Declare the maximum number of SQL statements a view may issue.
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "query_count" in g:
+        g.query_count += 1
+
+
+def init_query_counter(app):
+    # Count statements per request and enforce @query_budget limits. Over
+    # budget raises in testing (so the test fails) and logs otherwise.
+    app.config.setdefault("QUERY_BUDGET_STRICT", None)
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+
+    @app.before_request
+    def start_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def check_query_budget(response):
+        view = app.view_functions.get(request.endpoint)
+        budget = getattr(view, "query_budget", None)
+        count = g.get("query_count", 0)
+        if budget is not None and count > budget:
+            message = f"{request.endpoint} issued {count} queries, budget is {budget}"
+            strict = app.config["QUERY_BUDGET_STRICT"]
+            if strict or (strict is None and app.testing):
+                raise QueryBudgetExceeded(message)
+            app.logger.warning(message)
+        return response
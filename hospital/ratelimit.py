@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+
+class RateLimited(Exception):
+    # Raised before any expensive work; answered with 429 and Retry-After
+    def __init__(self, scope, retry_after):
+        super().__init__(f"rate limit for {scope} exceeded")
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+class MemoryBuckets:
+    # Token buckets in this process. Under several workers each keeps its
+    # own, so the effective limit is per worker; use redis to share them.
+    # Beyond max_keys the least recently used bucket is dropped (refilled).
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        # Returns seconds until a token is available; 0 means one was taken
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp = self.buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - stamp) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens - 1 if not wait else tokens, now)
+            self.buckets.move_to_end(key)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def reset(self, key):
+        with self.lock:
+            self.buckets.pop(key, None)
+
+
+class RedisBuckets:
+    # Buckets shared by every worker; the refill-and-take runs as one Lua
+    # script on the server clock, so concurrent takes cannot overspend
+
+    SCRIPT = """
+    local capacity, rate = tonumber(ARGV[1]), tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = clock[1] + clock[2] / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+    local tokens = math.min(capacity, (tonumber(state[1]) or capacity) + (now - (tonumber(state[2]) or now)) * rate)
+    local wait = 0
+    if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'stamp', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(wait)
+    """
+
+    def __init__(self, url, prefix="hospital:ratelimit:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_BACKEND='redis' requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.script = self.client.register_script(self.SCRIPT)
+        self.prefix = prefix
+
+    def take(self, key, capacity, rate):
+        return float(self.script(keys=[self.prefix + key], args=[capacity, rate]))
+
+    def reset(self, key):
+        self.client.delete(self.prefix + key)
+
+
+class RateLimiter:
+    # limits: scope -> (attempts, seconds), e.g. {"email": (5, 300)} allows a
+    # burst of 5 per email, then one more every 60 seconds. A scope whose
+    # limit is None is not limited.
+
+    def __init__(self, buckets, limits):
+        self.buckets = buckets
+        self.limits = {scope: limit for scope, limit in limits.items() if limit}
+        self._lock = threading.Lock()
+        self._allowed = 0
+        self._rejected = Counter()
+
+    def check(self, **keys):
+        """Take a token from each scope's bucket or raise RateLimited."""
+        for scope, value in keys.items():
+            if scope not in self.limits or value is None:
+                continue
+            attempts, seconds = self.limits[scope]
+            wait = self.buckets.take(f"{scope}:{value}", attempts, attempts / seconds)
+            if wait:
+                with self._lock:
+                    self._rejected[scope] += 1
+                raise RateLimited(scope, wait)
+        with self._lock:
+            self._allowed += 1
+
+    def reset(self, scope, value):
+        self.buckets.reset(f"{scope}:{value}")
+
+    def stats(self):
+        with self._lock:
+            return {"allowed": self._allowed, **{f"rejected_{scope}": n for scope, n in self._rejected.items()}}
+
+
+def make_rate_limiter(config):
+    if config.get("RATE_LIMIT_BACKEND", "memory") == "redis":
+        buckets = RedisBuckets(config["RATE_LIMIT_REDIS_URL"])
+    else:
+        buckets = MemoryBuckets(config.get("RATE_LIMIT_MAX_KEYS", 100_000))
+    return RateLimiter(buckets, {
+        "ip": config.get("LOGIN_LIMIT_PER_IP"),
+        "email": config.get("LOGIN_LIMIT_PER_EMAIL"),
+    })
@@ -0,0 +1,105 @@
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+from flask import current_app, render_template
+from sqlalchemy import func, select
+
+from .extensions import cache, db
+from .models import AppointmentHistory, DoctorFile, PatientFile, TreatmentFile
+
+
+REPORT_TEMPLATE = "genrate_report.html"
+FORMATS = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+
+def _template_stamp():
+    # Editing the template must change every report's version
+    template = current_app.jinja_env.get_template(REPORT_TEMPLATE)
+    # (templates not loaded from a file have the filename "<template>")
+    return os.stat(template.filename).st_mtime_ns if template.filename and os.path.isfile(template.filename) else 0
+
+
+def report_version(session, patient_id, doctor_id):
+    """Content version of a report, or None if the patient or doctor is missing.
+
+    One query: the patient and doctor rows plus the count and latest
+    updated_at of the patient's treatments and of their appointments with
+    this doctor. Counts catch deletes; updated_at catches edits and inserts.
+    Appointments are read live and archived alike, so archiving one leaves
+    the version unchanged.
+    """
+    def latest(model, *where):
+        return [select(aggregate).where(*where).scalar_subquery()
+                for aggregate in (func.count(), func.max(model.updated_at))]
+
+    treatments = latest(TreatmentFile, TreatmentFile.patient_id == patient_id)
+    appointments = latest(AppointmentHistory, AppointmentHistory.patient_id == patient_id,
+                          AppointmentHistory.doctor_id == doctor_id)
+    patient_columns = [c for c in PatientFile.__table__.columns if c.key != "password"]
+    doctor_columns = [c for c in DoctorFile.__table__.columns if c.key != "password"]
+    row = session.execute(
+        select(*patient_columns, *doctor_columns, *treatments, *appointments)
+        .select_from(PatientFile).join(DoctorFile, DoctorFile.doctor_id == doctor_id)
+        .where(PatientFile.patient_id == patient_id)
+    ).first()
+    if row is None:
+        return None
+    raw = json.dumps([list(row), _template_stamp()], default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()[:40]
+
+
+def render_report(patient_id, doctor_id, fmt="html"):
+    patient = db.session.get(PatientFile, patient_id)
+    doctor = db.session.get(DoctorFile, doctor_id)
+    if patient is None or doctor is None:
+        raise LookupError(f"no patient {patient_id} or doctor {doctor_id}")
+    # Templates may call url_for, which needs a request context
+    with current_app.test_request_context():
+        html = render_template(REPORT_TEMPLATE, patient=patient, doctor=doctor)
+    if fmt == "pdf":
+        try:
+            from weasyprint import HTML
+        except ImportError:
+            raise RuntimeError("PDF reports require the weasyprint package")
+        return HTML(string=html).write_pdf()
+    return html.encode()
+
+
+def _prerendered_path(directory, patient_id, doctor_id, version, fmt):
+    return os.path.join(directory, str(doctor_id), f"{patient_id}-{version}.{fmt}")
+
+
+def prerender(directory, patient_id, doctor_id, version, fmt="html"):
+    # Write the report to disk under its version and drop older versions
+    path = _prerendered_path(directory, patient_id, doctor_id, version, fmt)
+    if os.path.exists(path):
+        return path
+    body = render_report(patient_id, doctor_id, fmt)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as out:
+        out.write(body)
+    os.replace(tmp_path, path)
+    for stale in glob.glob(_prerendered_path(directory, patient_id, doctor_id, "*", fmt)):
+        if stale != path:
+            os.remove(stale)
+    return path
+
+
+def cached_report(patient_id, doctor_id, version, fmt="html"):
+    """Return ("path", path) for a pre-rendered file or ("body", bytes).
+
+    The version is part of the key, so entries never need invalidating;
+    stale ones just age out of the cache.
+    """
+    directory = current_app.config["REPORT_PRERENDER_DIR"]
+    if directory:
+        return "path", prerender(directory, patient_id, doctor_id, version, fmt)
+    body = cache.get_or_set(
+        f"report:{doctor_id}:{patient_id}:{fmt}:{version}", [],
+        lambda: render_report(patient_id, doctor_id, fmt),
+    )
+    return "body", body
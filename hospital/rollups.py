@@ -0,0 +1,226 @@
+from collections import Counter
+from datetime import date, timedelta
+
+from sqlalchemy import cast, delete, event, func, insert, inspect, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from .migrations import backfills
+from .models import AppointmentDaily, AppointmentFile, AppointmentHistory, DoctorFile, DoctorPatientLoad
+
+
+DAILY = AppointmentDaily.__table__
+LOAD = DoctorPatientLoad.__table__
+# Archived appointments still count, so rebuilds read live and archived rows
+APPOINTMENTS = AppointmentHistory.__table__
+
+UPSERT_INSERTS = {"sqlite": sqlite.insert, "postgresql": postgresql.insert}
+
+
+def _add(connection, table, keys, rows):
+    # rows: [{key..., "appointments": delta}]; adds each delta to the
+    # existing count, then drops rows that reached zero
+    if not rows:
+        return
+    upsert = UPSERT_INSERTS.get(connection.dialect.name)
+    if upsert is not None:
+        statement = upsert(table)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={"appointments": table.c.appointments + statement.excluded.appointments},
+        ), rows)
+    else:
+        for row in rows:
+            match = [table.c[key] == row[key] for key in keys]
+            result = connection.execute(
+                table.update().where(*match).values(appointments=table.c.appointments + row["appointments"])
+            )
+            if result.rowcount == 0:
+                connection.execute(table.insert().values(**row))
+    if any(row["appointments"] < 0 for row in rows):
+        connection.execute(table.delete().where(table.c.appointments <= 0))
+
+
+def apply_changes(connection, changes):
+    # changes: (doctor_id, patient_id, appointment_time, +1 or -1) tuples
+    daily, load = Counter(), Counter()
+    for doctor_id, patient_id, when, delta in changes:
+        daily[(when.date(), doctor_id)] += delta
+        load[(doctor_id, patient_id)] += delta
+    _add(connection, DAILY, ["day", "doctor_id"], [
+        {"day": day, "doctor_id": doctor_id, "appointments": n} for (day, doctor_id), n in daily.items() if n
+    ])
+    _add(connection, LOAD, ["doctor_id", "patient_id"], [
+        {"doctor_id": doctor_id, "patient_id": patient_id, "appointments": n}
+        for (doctor_id, patient_id), n in load.items() if n
+    ])
+
+
+def record_imported(connection, rows):
+    # The bulk importer inserts with executemany, which skips mapper events
+    apply_changes(connection, [(r["doctor_id"], r["patient_id"], r["appointment_time"], 1) for r in rows])
+
+
+def _key(appointment):
+    return appointment.doctor_id, appointment.patient_id, appointment.appointment_time
+
+
+def _previous_key(appointment):
+    state = inspect(appointment)
+    values = []
+    for attr in ("doctor_id", "patient_id", "appointment_time"):
+        history = state.attrs[attr].history
+        values.append(history.deleted[0] if history.deleted else getattr(appointment, attr))
+    return tuple(values)
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    pass
+
+
+# Load the previous value when a key column is assigned on an expired row,
+# so after_update can tell which rollup buckets the booking moved between
+for _attr in (AppointmentFile.doctor_id, AppointmentFile.patient_id, AppointmentFile.appointment_time):
+    event.listen(_attr, "set", _keep_old_value, active_history=True)
+
+
+@event.listens_for(AppointmentFile, "after_insert")
+def _count_booking(mapper, connection, target):
+    apply_changes(connection, [(*_key(target), 1)])
+
+
+@event.listens_for(AppointmentFile, "after_update")
+def _move_booking(mapper, connection, target):
+    before, after = _previous_key(target), _key(target)
+    if before != after:
+        apply_changes(connection, [(*before, -1), (*after, 1)])
+
+
+@event.listens_for(AppointmentFile, "after_delete")
+def _uncount_booking(mapper, connection, target):
+    apply_changes(connection, [(*_previous_key(target), -1)])
+
+
+def _day(connection, column):
+    # CAST(... AS DATE) on SQLite yields just the year
+    if connection.dialect.name == "sqlite":
+        return func.date(column)
+    return cast(column, DAILY.c.day.type)
+
+
+def backfill(connection, since=None, engine="sql", chunk_size=100_000):
+    """Rebuild the rollups from appointment_file and appointment_archive.
+
+    Daily counts are rebuilt from `since` onwards (everything if None);
+    the per-patient load table is always rebuilt in full. engine="pandas"
+    aggregates in vectorized chunks client-side instead of in SQL.
+    """
+    for table in (DAILY, LOAD):
+        table.create(connection, checkfirst=True)
+    connection.execute(delete(DAILY).where(DAILY.c.day >= since) if since else delete(DAILY))
+    connection.execute(delete(LOAD))
+    if engine == "pandas":
+        return _backfill_pandas(connection, since, chunk_size)
+
+    day = _day(connection, APPOINTMENTS.c.appointment_time)
+    daily = select(day, APPOINTMENTS.c.doctor_id, func.count()).group_by(day, APPOINTMENTS.c.doctor_id)
+    if since:
+        daily = daily.where(APPOINTMENTS.c.appointment_time >= since)
+    connection.execute(insert(DAILY).from_select(["day", "doctor_id", "appointments"], daily))
+    connection.execute(insert(LOAD).from_select(
+        ["doctor_id", "patient_id", "appointments"],
+        select(APPOINTMENTS.c.doctor_id, APPOINTMENTS.c.patient_id, func.count())
+        .group_by(APPOINTMENTS.c.doctor_id, APPOINTMENTS.c.patient_id),
+    ))
+    return connection.execute(select(func.count()).select_from(APPOINTMENTS)).scalar()
+
+
+@backfills("appointment_daily", "doctor_patient_load", sources=("appointment_file", "appointment_archive"))
+def _backfill_empty_rollups(connection):
+    # Rollup tables added to (or left empty in) a database with appointments
+    backfill(connection)
+
+
+def _backfill_pandas(connection, since, chunk_size):
+    try:
+        import pandas as pd
+    except ImportError:
+        raise RuntimeError("engine='pandas' requires the pandas package")
+
+    statement = select(APPOINTMENTS.c.doctor_id, APPOINTMENTS.c.patient_id, APPOINTMENTS.c.appointment_time)
+    daily, load, rows = None, None, 0
+    for chunk in pd.read_sql(statement, connection, chunksize=chunk_size, parse_dates=["appointment_time"]):
+        rows += len(chunk)
+        chunk_load = chunk.groupby(["doctor_id", "patient_id"]).size()
+        load = chunk_load if load is None else load.add(chunk_load, fill_value=0)
+        if since:
+            chunk = chunk[chunk["appointment_time"] >= pd.Timestamp(since)]
+        chunk_daily = chunk.groupby([chunk["appointment_time"].dt.date.rename("day"), "doctor_id"]).size()
+        daily = chunk_daily if daily is None else daily.add(chunk_daily, fill_value=0)
+
+    for table, counts in ((DAILY, daily), (LOAD, load)):
+        if counts is not None and len(counts):
+            frame = counts.astype("int64").rename("appointments").reset_index()
+            connection.execute(insert(table), frame.to_dict("records"))
+    return rows
+
+
+def _date_range(start, end):
+    conditions = []
+    if start is not None:
+        conditions.append(DAILY.c.day >= start)
+    if end is not None:
+        conditions.append(DAILY.c.day < end)
+    return conditions
+
+
+def stats(session, start=None, end=None, doctor_id=None):
+    """Appointment figures for [start, end) read from the rollup tables."""
+    conditions = _date_range(start, end)
+    if doctor_id is not None:
+        conditions.append(DAILY.c.doctor_id == doctor_id)
+
+    per_day = session.execute(
+        select(DAILY.c.day, func.sum(DAILY.c.appointments)).where(*conditions).group_by(DAILY.c.day)
+        .order_by(DAILY.c.day)
+    ).all()
+    per_doctor = session.execute(
+        select(DoctorFile.doctor_id, DoctorFile.name, DoctorFile.specialist, func.sum(DAILY.c.appointments))
+        .select_from(DAILY).join(DoctorFile, DoctorFile.doctor_id == DAILY.c.doctor_id)
+        .where(*conditions)
+        .group_by(DoctorFile.doctor_id, DoctorFile.name, DoctorFile.specialist)
+        .order_by(func.sum(DAILY.c.appointments).desc())
+    ).all()
+    specialists = Counter()
+    for _, _, specialist, n in per_doctor:
+        specialists[specialist] += n
+
+    load = select(
+        LOAD.c.doctor_id,
+        func.count().label("patients"),
+        func.sum(LOAD.c.appointments).label("appointments"),
+        func.sum((LOAD.c.appointments > 1).cast(LOAD.c.appointments.type)).label("returning_patients"),
+    ).group_by(LOAD.c.doctor_id)
+    if doctor_id is not None:
+        load = load.where(LOAD.c.doctor_id == doctor_id)
+
+    return {
+        "from": start.isoformat() if start else None,
+        "to": end.isoformat() if end else None,
+        "appointments": sum(n for _, n in per_day),
+        "per_day": [{"day": str(day), "appointments": n} for day, n in per_day],
+        "doctors": [
+            {"doctor_id": doc_id, "name": name, "specialist": specialist, "appointments": n}
+            for doc_id, name, specialist, n in per_doctor
+        ],
+        "specialists": [{"specialist": name, "appointments": n} for name, n in specialists.most_common()],
+        "patient_load": [
+            {"doctor_id": row.doctor_id, "patients": row.patients, "returning_patients": row.returning_patients,
+             "appointments_per_patient": round(row.appointments / row.patients, 2)}
+            for row in session.execute(load)
+        ],
+    }
+
+
+def dashboard_stats(session, days=30, today=None):
+    today = today or date.today()
+    return stats(session, today - timedelta(days=days - 1), today + timedelta(days=1))
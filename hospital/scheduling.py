@@ -0,0 +1,180 @@
+import threading
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+
+class SlotUnavailable(Exception):
+    pass
+
+
+class SlotIndex:
+    # Sorted appointment start times for one doctor. All appointments last one
+    # slot, so a candidate [start, start + slot) overlaps an existing booking
+    # exactly when the latest start before start + slot is after start - slot.
+
+    def __init__(self, slot, starts=()):
+        self.slot = slot
+        self.starts = sorted(starts)
+        self.lock = threading.Lock()
+        self.loaded_at = time.monotonic()
+
+    def is_free(self, start):
+        with self.lock:
+            i = bisect_left(self.starts, start + self.slot)
+            return i == 0 or self.starts[i - 1] <= start - self.slot
+
+    def add(self, start):
+        with self.lock:
+            i = bisect_left(self.starts, start)
+            if i == len(self.starts) or self.starts[i] != start:
+                insort(self.starts, start)
+
+    def discard(self, start):
+        with self.lock:
+            i = bisect_left(self.starts, start)
+            if i < len(self.starts) and self.starts[i] == start:
+                del self.starts[i]
+
+
+class Scheduler:
+    # Books appointments onto a per-doctor slot grid. The in-memory index
+    # answers availability without touching the database; the unique
+    # (doctor_id, appointment_time) constraint is what makes reservations
+    # atomic across threads and worker processes. Other workers' cancellations
+    # never reach this index, so it is reloaded after index_ttl seconds, or
+    # at once when a slot it reports as taken turns out free in the database.
+
+    def __init__(self, session, model, slot_minutes=30, open_hour=9, close_hour=17,
+                 retries=5, horizon_days=90, index_ttl=60):
+        self.session = session
+        self.model = model
+        self.slot = timedelta(minutes=slot_minutes)
+        self.open_hour = open_hour
+        self.close_hour = close_hour
+        self.retries = retries
+        self.horizon = timedelta(days=horizon_days)
+        self.index_ttl = index_ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, session, model, config):
+        return cls(
+            session, model,
+            slot_minutes=config.get("APPOINTMENT_SLOT_MINUTES", 30),
+            open_hour=config.get("CLINIC_OPEN_HOUR", 9),
+            close_hour=config.get("CLINIC_CLOSE_HOUR", 17),
+            index_ttl=config.get("SLOT_INDEX_TTL", 60),
+        )
+
+    def index(self, doctor_id, refresh=False):
+        with self._lock:
+            index = self._indexes.get(doctor_id)
+            if index is not None and (refresh or time.monotonic() - index.loaded_at > self.index_ttl):
+                del self._indexes[doctor_id]
+                index = None
+        if index is None:
+            # Load the doctor's upcoming calendar; past slots never matter again
+            since = datetime.now() - self.slot
+            starts = self.session.execute(
+                self.model.__table__.select()
+                .with_only_columns(self.model.appointment_time)
+                .where(self.model.doctor_id == doctor_id, self.model.appointment_time >= since)
+            ).scalars().all()
+            index = SlotIndex(self.slot, starts)
+            with self._lock:
+                index = self._indexes.setdefault(doctor_id, index)
+        return index
+
+    def forget(self, doctor_id, start=None):
+        # Drop a cancelled booking, or a doctor's whole calendar
+        if start is None:
+            with self._lock:
+                self._indexes.pop(doctor_id, None)
+        elif doctor_id in self._indexes:
+            self._indexes[doctor_id].discard(start)
+
+    def _booked(self, doctor_id, start):
+        # Whether the database holds a booking overlapping [start, start + slot)
+        return self.session.execute(
+            self.model.__table__.select()
+            .with_only_columns(self.model.appointment_id)
+            .where(self.model.doctor_id == doctor_id,
+                   self.model.appointment_time > start - self.slot,
+                   self.model.appointment_time < start + self.slot)
+            .limit(1)
+        ).first() is not None
+
+    def is_valid_slot(self, start):
+        minutes = start.hour * 60 + start.minute
+        slot_minutes = int(self.slot.total_seconds() // 60)
+        return (
+            start.second == 0 and start.microsecond == 0
+            and minutes % slot_minutes == 0
+            and self.open_hour * 60 <= minutes
+            and minutes + slot_minutes <= self.close_hour * 60
+        )
+
+    def is_free(self, doctor_id, start):
+        return self.is_valid_slot(start) and start > datetime.now() and self.index(doctor_id).is_free(start)
+
+    def _slots_from(self, after):
+        slot_minutes = int(self.slot.total_seconds() // 60)
+        start = after.replace(second=0, microsecond=0)
+        start += timedelta(minutes=-start.minute % slot_minutes)
+        end = after + self.horizon
+        while start < end:
+            if self.is_valid_slot(start):
+                yield start
+                start += self.slot
+            elif start.hour >= self.close_hour:
+                start = (start + timedelta(days=1)).replace(hour=self.open_hour, minute=0)
+            else:
+                start += self.slot
+
+    def next_free(self, doctor_id, after=None, n=5):
+        index = self.index(doctor_id)
+        free = []
+        now = datetime.now()
+        for start in self._slots_from(max(after or now, now)):
+            if start > now and index.is_free(start):
+                free.append(start)
+                if len(free) == n:
+                    break
+        return free
+
+    def reserve(self, patient_id, doctor_id, start, description=None):
+        if not self.is_valid_slot(start):
+            raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} is not a bookable slot")
+        if start <= datetime.now():
+            raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} has already passed")
+        index = self.index(doctor_id)
+        if not index.is_free(start) and not self._booked(doctor_id, start):
+            # Cancelled in another worker since the index was loaded
+            index = self.index(doctor_id, refresh=True)
+        for attempt in range(self.retries):
+            if not index.is_free(start):
+                raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} is already booked")
+            appointment = self.model(
+                patient_id=patient_id, doctor_id=doctor_id,
+                appointment_time=start, description=description,
+            )
+            try:
+                self.session.add(appointment)
+                self.session.commit()
+            except IntegrityError:
+                # Another worker won the slot; remember it and report
+                self.session.rollback()
+                index.add(start)
+                raise SlotUnavailable(f"{start:%Y-%m-%d %H:%M} is already booked")
+            except OperationalError:
+                # e.g. SQLite "database is locked" under write contention
+                self.session.rollback()
+                time.sleep(0.01 * 2 ** attempt)
+                continue
+            index.add(start)
+            return appointment
+        raise SlotUnavailable("The booking system is busy, please try again")
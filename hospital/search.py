@@ -0,0 +1,297 @@
+import json
+import re
+from difflib import SequenceMatcher
+
+from flask import Blueprint, request
+from sqlalchemy import event, text
+
+from .extensions import db
+from .migrations import backfills
+from .models import PatientFile, TreatmentFile
+
+
+def _trigrams(term):
+    term = term.lower()
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def _like_escape(term):
+    # Backslash is PostgreSQL's default LIKE escape character
+    return term.replace("\\", "\\\\").replace("%", r"\%").replace("_", r"\_")
+
+
+def _quote(term):
+    return '"' + term.replace('"', '""') + '"'
+
+
+def _similarity(query, patient):
+    # Rerank candidates: best of name / email local part, prefix match wins
+    query = query.lower()
+    best = 0.0
+    for value in (patient["name"], patient["email"].split("@", 1)[0], patient["email"]):
+        value = value.lower()
+        score = SequenceMatcher(None, query, value[:len(query) + 2]).ratio()
+        if value.startswith(query):
+            score += 1.0
+        best = max(best, score)
+    return round(best, 4)
+
+
+class SQLiteSearch:
+    # FTS5 tables mirror patient names/emails (trigram tokenizer, so any
+    # substring and misspellings sharing trigrams can match) and treatment
+    # diagnoses (porter stemming). The rowid is the source primary key.
+
+    DDL = (
+        "CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(name, email, tokenize='trigram')",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS treatment_search "
+        "USING fts5(diagnosis, patient_id UNINDEXED, tokenize='porter unicode61')",
+    )
+
+    # For queries too short for trigrams: prefix ranges on the lower()
+    # expression indexes, ignoring case like the trigram tokenizer does
+    # (LIKE would scan the table)
+    PREFIX_QUERY = (
+        "SELECT patient_id, name, email FROM patient_file "
+        "WHERE (lower(name) >= :q AND lower(name) < :end) OR (lower(email) >= :q AND lower(email) < :end) "
+        "LIMIT :limit"
+    )
+
+    def create(self, conn):
+        for statement in self.DDL:
+            conn.execute(text(statement))
+
+    def is_ready(self, conn):
+        return conn.execute(text(
+            "SELECT count(*) FROM sqlite_master WHERE name IN ('patient_search', 'treatment_search')"
+        )).scalar() == 2
+
+    def needs_rebuild(self, conn):
+        # Missing, or created and then left empty by an upgrade that failed
+        return not self.is_ready(conn) or conn.execute(text(
+            "SELECT (NOT EXISTS (SELECT 1 FROM patient_search) AND EXISTS (SELECT 1 FROM patient_file)) "
+            "OR (NOT EXISTS (SELECT 1 FROM treatment_search) AND EXISTS (SELECT 1 FROM treatment_file))"
+        )).scalar()
+
+    def reindex(self, conn):
+        self.create(conn)
+        conn.execute(text("DELETE FROM patient_search"))
+        conn.execute(text(
+            "INSERT INTO patient_search(rowid, name, email) SELECT patient_id, name, email FROM patient_file"
+        ))
+        conn.execute(text("DELETE FROM treatment_search"))
+        conn.execute(text(
+            "INSERT INTO treatment_search(rowid, diagnosis, patient_id) "
+            "SELECT treatment_id, diagnosis, patient_id FROM treatment_file"
+        ))
+
+    def index_patient(self, conn, patient):
+        conn.execute(text("INSERT OR REPLACE INTO patient_search(rowid, name, email) VALUES (:id, :name, :email)"),
+                     {"id": patient.patient_id, "name": patient.name, "email": patient.email})
+
+    def remove_patient(self, conn, patient):
+        conn.execute(text("DELETE FROM patient_search WHERE rowid = :id"), {"id": patient.patient_id})
+
+    def index_patients_by_email(self, conn, emails):
+        conn.execute(text(
+            "INSERT OR REPLACE INTO patient_search(rowid, name, email) "
+            "SELECT patient_id, name, email FROM patient_file WHERE email IN (SELECT value FROM json_each(:emails))"
+        ), {"emails": json.dumps(list(emails))})
+
+    def index_treatment(self, conn, treatment):
+        conn.execute(text(
+            "INSERT OR REPLACE INTO treatment_search(rowid, diagnosis, patient_id) VALUES (:id, :diagnosis, :patient_id)"
+        ), {"id": treatment.treatment_id, "diagnosis": treatment.diagnosis, "patient_id": treatment.patient_id})
+
+    def remove_treatment(self, conn, treatment):
+        conn.execute(text("DELETE FROM treatment_search WHERE rowid = :id"), {"id": treatment.treatment_id})
+
+    def search_patients(self, session, query, limit):
+        grams = _trigrams(query)
+        if not grams:
+            q = query.lower()
+            rows = session.execute(
+                text(self.PREFIX_QUERY), {"q": q, "end": q + "\uffff", "limit": limit * 5}
+            ).mappings().all()
+        else:
+            # OR of the query's trigrams: bm25 favours rows sharing the most,
+            # which tolerates typos; candidates are then reranked
+            rows = session.execute(text(
+                "SELECT rowid AS patient_id, name, email FROM patient_search "
+                "WHERE patient_search MATCH :match ORDER BY bm25(patient_search) LIMIT :limit"
+            ), {"match": " OR ".join(_quote(g) for g in sorted(grams)), "limit": limit * 5}).mappings().all()
+        return [dict(row, score=_similarity(query, row)) for row in rows]
+
+    def search_treatments(self, session, query, limit):
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        rows = session.execute(text(
+            "SELECT rowid AS treatment_id, patient_id, diagnosis, "
+            "snippet(treatment_search, 0, '[', ']', '…', 12) AS snippet, -bm25(treatment_search) AS score "
+            "FROM treatment_search WHERE treatment_search MATCH :match ORDER BY bm25(treatment_search) LIMIT :limit"
+        ), {"match": " ".join(_quote(t) + "*" for t in terms), "limit": limit}).mappings().all()
+        return [dict(row) for row in rows]
+
+
+class PostgresSearch:
+    # pg_trgm and tsvector expression indexes on the source tables; PostgreSQL
+    # maintains them on every write, so the index hooks are no-ops.
+
+    DDL = (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_patient_name_trgm ON patient_file USING gin (name gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_patient_email_trgm ON patient_file USING gin (email gin_trgm_ops)",
+        "CREATE INDEX IF NOT EXISTS ix_treatment_diagnosis_fts ON treatment_file "
+        "USING gin (to_tsvector('english', diagnosis))",
+    )
+
+    def create(self, conn):
+        for statement in self.DDL:
+            conn.execute(text(statement))
+
+    def is_ready(self, conn):
+        return True
+
+    def needs_rebuild(self, conn):
+        return conn.execute(text(
+            "SELECT count(*) FROM pg_indexes WHERE indexname IN "
+            "('ix_patient_name_trgm', 'ix_patient_email_trgm', 'ix_treatment_diagnosis_fts')"
+        )).scalar() < 3
+
+    def reindex(self, conn):
+        self.create(conn)
+
+    def index_patient(self, conn, patient):
+        pass
+
+    remove_patient = index_treatment = remove_treatment = index_patient
+
+    def index_patients_by_email(self, conn, emails):
+        pass
+
+    def search_patients(self, session, query, limit):
+        rows = session.execute(text(
+            "SELECT patient_id, name, email FROM patient_file "
+            "WHERE name % :q OR email % :q OR name ILIKE :prefix OR email ILIKE :prefix "
+            "ORDER BY greatest(similarity(name, :q), similarity(email, :q)) DESC LIMIT :limit"
+        ), {"q": query, "prefix": _like_escape(query) + "%", "limit": limit * 5}).mappings().all()
+        return [dict(row, score=_similarity(query, row)) for row in rows]
+
+    def search_treatments(self, session, query, limit):
+        terms = re.findall(r"\w+", query)
+        if not terms:
+            return []
+        tsquery = " & ".join(t + ":*" for t in terms)
+        rows = session.execute(text(
+            "SELECT treatment_id, patient_id, diagnosis, "
+            "ts_headline('english', diagnosis, to_tsquery('english', :q)) AS snippet, "
+            "ts_rank(to_tsvector('english', diagnosis), to_tsquery('english', :q)) AS score "
+            "FROM treatment_file WHERE to_tsvector('english', diagnosis) @@ to_tsquery('english', :q) "
+            "ORDER BY score DESC LIMIT :limit"
+        ), {"q": tsquery, "limit": limit}).mappings().all()
+        return [dict(row) for row in rows]
+
+
+BACKENDS = {"sqlite": SQLiteSearch, "postgresql": PostgresSearch}
+_backends = {}
+_ready = {}
+
+
+def backend_for(bind):
+    name = bind.dialect.name
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def search_patients(session, query, limit=20):
+    results = backend_for(session.get_bind()).search_patients(session, query.strip(), limit)
+    results.sort(key=lambda row: row["score"], reverse=True)
+    return results[:limit]
+
+
+def search_treatments(session, query, limit=20):
+    return backend_for(session.get_bind()).search_treatments(session, query.strip(), limit)
+
+
+def reindex(conn):
+    backend_for(conn).reindex(conn)
+    _ready[conn.engine.url] = True
+
+
+def index_patients_by_email(conn, emails):
+    # For bulk inserts, which skip the mapper events below
+    if _index_ready(conn):
+        backend_for(conn).index_patients_by_email(conn, emails)
+
+
+def _index_ready(conn):
+    # Writes skip indexing until the index exists. Only a positive answer is
+    # remembered: `flask search-reindex` may run in another process at any
+    # time, and every write after it must be indexed.
+    key = conn.engine.url
+    if not _ready.get(key):
+        _ready[key] = conn.dialect.name in BACKENDS and backend_for(conn).is_ready(conn)
+    return _ready[key]
+
+
+def _hook(method):
+    def listener(mapper, connection, target):
+        if _index_ready(connection):
+            getattr(backend_for(connection), method)(connection, target)
+    return listener
+
+
+for _model, _name in ((PatientFile, "patient"), (TreatmentFile, "treatment")):
+    event.listen(_model, "after_insert", _hook(f"index_{_name}"))
+    event.listen(_model, "after_update", _hook(f"index_{_name}"))
+    event.listen(_model, "after_delete", _hook(f"remove_{_name}"))
+
+
+@event.listens_for(PatientFile.metadata, "after_create")
+def _create_search_index(target, connection, **kw):
+    if connection.dialect.name in BACKENDS:
+        backend_for(connection).create(connection)
+        _ready[connection.engine.url] = True
+
+
+def _index_missing(connection):
+    return connection.dialect.name in BACKENDS and backend_for(connection).needs_rebuild(connection)
+
+
+@backfills(when=_index_missing)
+def _build_search_index(connection):
+    # Databases are created and upgraded by migrations.upgrade(), not create_all()
+    reindex(connection)
+
+
+bp = Blueprint("search", __name__, cli_group=None)
+
+
+@bp.route("/search")
+def search():
+    query = request.args.get("q", "").strip()
+    scope = request.args.get("scope", "all")
+    try:
+        limit = max(1, min(int(request.args.get("limit", 20)), 100))
+    except ValueError:
+        return {"error": "invalid limit"}, 400
+    if not query:
+        return {"error": "missing q"}, 400
+    if not _index_ready(db.session.connection()):
+        return {"error": "search index has not been built; run `flask search-reindex`"}, 503
+    results = {"query": query}
+    if scope in ("all", "patients"):
+        results["patients"] = search_patients(db.session, query, limit)
+    if scope in ("all", "treatments"):
+        results["treatments"] = search_treatments(db.session, query, limit)
+    return results
+
+
+@bp.cli.command("search-reindex")
+def search_reindex():
+    """Create the search index and rebuild it from patients and treatments."""
+    with db.engine.begin() as conn:
+        reindex(conn)
+    print("Search index rebuilt")
@@ -0,0 +1,237 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import session
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from sqlalchemy import delete, insert, select, update
+from werkzeug.datastructures import CallbackDict
+
+from .extensions import db, session_store
+from .models import ServerSession
+
+
+class MemorySessionStore:
+    # Per-process sessions; fine for a single worker or development. Oldest
+    # sessions are dropped beyond max_entries.
+
+    def __init__(self, max_entries=100_000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, sid):
+        with self.lock:
+            item = self.entries.get(sid)
+            if item is None:
+                return None
+            data, user, expires = item
+            if expires < time.monotonic():
+                del self.entries[sid]
+                return None
+            return data
+
+    def set(self, sid, data, user, ttl):
+        with self.lock:
+            self.entries[sid] = (data, user, time.monotonic() + ttl)
+            self.entries.move_to_end(sid)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self.lock:
+            self.entries.pop(sid, None)
+
+    def delete_user(self, user):
+        with self.lock:
+            sids = [sid for sid, (_, owner, _) in self.entries.items() if owner == user]
+            for sid in sids:
+                del self.entries[sid]
+        return len(sids)
+
+    def purge(self):
+        now = time.monotonic()
+        with self.lock:
+            expired = [sid for sid, (_, _, expires) in self.entries.items() if expires < now]
+            for sid in expired:
+                del self.entries[sid]
+        return len(expired)
+
+
+class DatabaseSessionStore:
+    # Rows in the app database (SQLite by default), written on their own
+    # connection so they never ride along with the request's transaction
+
+    TABLE = ServerSession.__table__
+
+    def get(self, sid):
+        with db.engine.connect() as conn:
+            return conn.execute(
+                select(self.TABLE.c.data).where(self.TABLE.c.id == sid, self.TABLE.c.expires_at > datetime.utcnow())
+            ).scalar()
+
+    def set(self, sid, data, user, ttl):
+        values = {"data": data, "user": user, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)}
+        with db.engine.begin() as conn:
+            if conn.execute(update(self.TABLE).where(self.TABLE.c.id == sid).values(**values)).rowcount == 0:
+                conn.execute(insert(self.TABLE).values(id=sid, **values))
+
+    def delete(self, sid):
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.TABLE).where(self.TABLE.c.id == sid))
+
+    def delete_user(self, user):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.TABLE).where(self.TABLE.c.user == user)).rowcount
+
+    def purge(self):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(self.TABLE).where(self.TABLE.c.expires_at <= datetime.utcnow())).rowcount
+
+
+class RedisSessionStore:
+    # Shared by every worker and host; needs the redis package
+
+    def __init__(self, url, prefix="hospital:session:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND='redis' requires the redis package")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        raw = self.client.get(self.prefix + sid)
+        return raw.decode() if raw is not None else None
+
+    def set(self, sid, data, user, ttl):
+        ttl = max(1, int(ttl))
+        pipe = self.client.pipeline()
+        pipe.set(self.prefix + sid, data, ex=ttl)
+        if user:
+            # Index of a user's sessions, for revoking them all at once
+            pipe.sadd(f"{self.prefix}user:{user}", sid)
+            pipe.expire(f"{self.prefix}user:{user}", ttl)
+        pipe.execute()
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+    def delete_user(self, user):
+        index = f"{self.prefix}user:{user}"
+        sids = [sid.decode() for sid in self.client.smembers(index)]
+        if sids:
+            self.client.delete(*[self.prefix + sid for sid in sids])
+        self.client.delete(index)
+        return len(sids)
+
+    def purge(self):
+        # Redis expires keys itself
+        return 0
+
+
+def make_session_store(config):
+    backend = config.get("SESSION_BACKEND", "database")
+    if backend == "redis":
+        return RedisSessionStore(config["SESSION_REDIS_URL"])
+    if backend == "memory":
+        return MemorySessionStore(config.get("SESSION_MAX_ENTRIES", 100_000))
+    return DatabaseSessionStore()
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.modified = False
+        self.accessed = False
+        self.regenerate = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+def user_key(data):
+    # Which account a session belongs to, for revocation
+    if "user_id" not in data:
+        return None
+    return f"{data.get('user_type')}:{data['user_id']}"
+
+
+class ServerSessionInterface(SessionInterface):
+    # The cookie only carries a random session id; the data lives in the
+    # store, so a session can be revoked server-side
+
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        if session.sid and (session.regenerate or not session):
+            self.store.delete(session.sid)
+            if not session:
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=self.get_cookie_secure(app),
+                    partitioned=self.get_cookie_partitioned(app), samesite=self.get_cookie_samesite(app),
+                    httponly=self.get_cookie_httponly(app),
+                )
+                return
+            session.sid = None
+        if not session:
+            return
+
+        new = session.sid is None
+        if new:
+            session.sid = secrets.token_urlsafe(32)
+        if new or session.modified or (session.permanent and app.config["SESSION_REFRESH_EACH_REQUEST"]):
+            ttl = app.permanent_session_lifetime.total_seconds()
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), user_key(session), ttl)
+        if new or self.should_set_cookie(app, session):
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session),
+                httponly=self.get_cookie_httponly(app), domain=domain, path=path, secure=self.get_cookie_secure(app),
+                partitioned=self.get_cookie_partitioned(app), samesite=self.get_cookie_samesite(app),
+            )
+
+
+def regenerate_session():
+    # Issue a new session id on the next response (after login or logout),
+    # so an id planted before authentication is never promoted
+    if isinstance(session._get_current_object(), ServerSideSession):
+        session.regenerate = True
+
+
+def revoke_user_sessions(user_type, user_id):
+    # Log an account out everywhere; returns how many sessions were dropped
+    return session_store.delete_user(f"{user_type}:{user_id}")
@@ -0,0 +1,247 @@
+import hashlib
+import os
+import re
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Blueprint, current_app, request, url_for
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+
+from .blobstore import CHUNK_SIZE
+from .extensions import db, blob_store
+from .jobs import enqueue
+from .models import PatientFile, Upload, UploadChunk, UploadSession
+
+
+SHA256 = re.compile(r"[0-9a-f]{64}")
+
+
+def spool_path(session_id):
+    return os.path.join(current_app.config["UPLOAD_SPOOL_PATH"], f"{session_id}.part")
+
+
+def chunk_count(upload_session):
+    return max(1, -(-upload_session.size // upload_session.chunk_size))
+
+
+def chunk_length(upload_session, number):
+    start = number * upload_session.chunk_size
+    return min(upload_session.chunk_size, upload_session.size - start)
+
+
+def session_status(upload_session):
+    received = sorted(chunk.number for chunk in upload_session.chunks)
+    data = {
+        "id": upload_session.id,
+        "patient_id": upload_session.patient_id,
+        "filename": upload_session.filename,
+        "size": upload_session.size,
+        "sha256": upload_session.sha256,
+        "chunk_size": upload_session.chunk_size,
+        "chunks": chunk_count(upload_session),
+        "received": received,
+        "missing": sorted(set(range(chunk_count(upload_session))) - set(received)),
+        "status": upload_session.status,
+        "expires_at": upload_session.expires_at.isoformat(),
+        "upload_id": upload_session.upload_id,
+    }
+    if upload_session.upload_id is not None:
+        data["download_url"] = url_for("files.download_file", file_id=upload_session.upload_id)
+    return data
+
+
+def expire_sessions(now=None):
+    # Drop sessions past their TTL, committed or not, and any spool file
+    # left behind; returns how many
+    now = now or datetime.utcnow()
+    stale = UploadSession.query.filter(UploadSession.expires_at < now).all()
+    for upload_session in stale:
+        _remove_spool(upload_session.id)
+        db.session.delete(upload_session)
+    db.session.commit()
+    return len(stale)
+
+
+def _remove_spool(session_id):
+    try:
+        os.remove(spool_path(session_id))
+    except FileNotFoundError:
+        pass
+
+
+def _open_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if upload_session is None or upload_session.expires_at < datetime.utcnow():
+        return None
+    return upload_session
+
+
+bp = Blueprint("uploads", __name__, cli_group=None)
+
+
+@bp.route("/upload/<int:patient_id>/sessions", methods=["POST"])
+def create_session(patient_id):
+    """Start a resumable upload: {"filename", "size", "sha256"} -> 201."""
+    db.get_or_404(PatientFile, patient_id)
+    config = current_app.config
+    data = request.get_json(silent=True) or {}
+    filename, size, digest = data.get("filename"), data.get("size"), str(data.get("sha256", "")).lower()
+    valid = filename and len(filename) <= 50 and isinstance(size, int) and size >= 0 and SHA256.fullmatch(digest)
+    if not valid:
+        return {"error": "expected filename (at most 50 characters), size and a hex sha256"}, 400
+    if size > config["UPLOAD_MAX_SIZE"]:
+        return {"error": f"file is larger than {config['UPLOAD_MAX_SIZE']} bytes"}, 413
+
+    expire_sessions()
+    upload_session = UploadSession(
+        id=uuid.uuid4().hex,
+        patient_id=patient_id,
+        filename=filename,
+        size=size,
+        sha256=digest,
+        chunk_size=config["UPLOAD_CHUNK_SIZE"],
+        expires_at=datetime.utcnow() + timedelta(seconds=config["UPLOAD_SESSION_TTL"]),
+    )
+    # Insert first, then count: counting before the insert lets concurrent
+    # requests all pass the check. Each request sees at least every session
+    # committed before its count, so the last one over the limit backs out
+    # (at worst two racing requests both do) and the limit always holds.
+    db.session.add(upload_session)
+    db.session.commit()
+    active = db.session.query(func.count()).select_from(UploadSession).filter(
+        UploadSession.status.in_(["open", "committing"])
+    ).scalar()
+    if active > config["UPLOAD_MAX_SESSIONS"]:
+        db.session.delete(upload_session)
+        db.session.commit()
+        return {"error": "too many uploads in progress, try again later"}, 429, {"Retry-After": "30"}
+
+    # Sparse file of the final size; chunks are written at their offsets
+    os.makedirs(config["UPLOAD_SPOOL_PATH"], exist_ok=True)
+    with open(spool_path(upload_session.id), "wb") as spool:
+        spool.truncate(size)
+    location = url_for("uploads.show_session", session_id=upload_session.id)
+    return session_status(upload_session), 201, {"Location": location}
+
+
+@bp.route("/upload_sessions/<session_id>")
+def show_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if upload_session is None:
+        return {"error": "unknown upload session"}, 404
+    return session_status(upload_session)
+
+
+@bp.route("/upload_sessions/<session_id>/chunks/<int:number>", methods=["PUT"])
+def put_chunk(session_id, number):
+    """Store one chunk; X-Chunk-SHA256 must match its bytes."""
+    upload_session = _open_session(session_id)
+    if upload_session is None:
+        return {"error": "unknown or expired upload session"}, 404
+    if upload_session.status != "open":
+        return {"error": f"upload session is {upload_session.status}"}, 409
+    if not 0 <= number < chunk_count(upload_session):
+        return {"error": f"chunk must be between 0 and {chunk_count(upload_session) - 1}"}, 400
+    expected = chunk_length(upload_session, number)
+    if request.content_length != expected:
+        return {"error": f"chunk {number} must be exactly {expected} bytes"}, 400
+    declared = request.headers.get("X-Chunk-SHA256", "").lower()
+    if not SHA256.fullmatch(declared):
+        return {"error": "X-Chunk-SHA256 header with the chunk's hex sha256 is required"}, 400
+
+    # Stream straight to the chunk's offset; at most CHUNK_SIZE bytes in memory
+    sha = hashlib.sha256()
+    received = 0
+    with open(spool_path(session_id), "r+b") as spool:
+        spool.seek(number * upload_session.chunk_size)
+        while received < expected:
+            piece = request.stream.read(min(CHUNK_SIZE, expected - received))
+            if not piece:
+                break
+            sha.update(piece)
+            spool.write(piece)
+            received += len(piece)
+    if received != expected:
+        return {"error": f"chunk {number} ended after {received} of {expected} bytes"}, 400
+    if sha.hexdigest() != declared:
+        # Not recorded, so the client simply sends it again
+        return {"error": f"chunk {number} does not match X-Chunk-SHA256", "sha256": sha.hexdigest()}, 422
+
+    db.session.merge(UploadChunk(session_id=session_id, number=number, sha256=declared))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The same chunk arrived twice at once; either copy is fine
+        db.session.rollback()
+    return {"id": session_id, "chunk": number, "sha256": declared}
+
+
+@bp.route("/upload_sessions/<session_id>/commit", methods=["POST"])
+def commit_session(session_id):
+    """Verify the whole file against the declared sha256 and store it."""
+    upload_session = _open_session(session_id)
+    if upload_session is None:
+        return {"error": "unknown or expired upload session"}, 404
+    status = session_status(upload_session)
+    if status["missing"]:
+        return dict(status, error="chunks are missing"), 409
+    # Only one request gets to commit a session
+    claimed = db.session.execute(
+        update(UploadSession).where(UploadSession.id == session_id, UploadSession.status == "open")
+        .values(status="committing").execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return {"error": f"upload session is {upload_session.status}"}, 409
+
+    path = spool_path(session_id)
+    sha = hashlib.sha256()
+    with open(path, "rb") as spool:
+        for piece in iter(lambda: spool.read(CHUNK_SIZE), b""):
+            sha.update(piece)
+    digest = sha.hexdigest()
+    if digest != upload_session.sha256:
+        _remove_spool(session_id)
+        upload_session.status = "failed"
+        db.session.commit()
+        return {"error": "file does not match the declared sha256", "sha256": digest}, 422
+
+    try:
+        blob_store.adopt(path, digest)
+    except OSError:
+        # Spool and blob store on different filesystems
+        with open(path, "rb") as spool:
+            blob_store.put_stream(spool)
+        _remove_spool(session_id)
+
+    upload = Upload(filename=upload_session.filename, sha256=digest, size=upload_session.size,
+                    patient_id=upload_session.patient_id)
+    db.session.add(upload)
+    db.session.flush()
+    enqueue("upload.postprocess", {"upload_id": upload.id})
+    upload_session.status = "committed"
+    upload_session.upload_id = upload.id
+    upload_session.chunks.clear()
+    db.session.commit()
+    return session_status(upload_session), 201, {"Location": url_for("files.download_file", file_id=upload.id)}
+
+
+@bp.route("/upload_sessions/<session_id>", methods=["DELETE"])
+def abort_session(session_id):
+    upload_session = db.session.get(UploadSession, session_id)
+    if upload_session is None:
+        return {"error": "unknown upload session"}, 404
+    if upload_session.status == "committing":
+        return {"error": "upload session is being committed"}, 409
+    if upload_session.status != "committed":
+        _remove_spool(session_id)
+    db.session.delete(upload_session)
+    db.session.commit()
+    return "", 204
+
+
+@bp.cli.command("upload-sessions-expire")
+def upload_sessions_expire():
+    """Delete expired resumable uploads and their spool files."""
+    print(f"Expired {expire_sessions()} upload sessions")
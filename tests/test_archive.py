@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from hospital.archive import archive_appointments
+from hospital.extensions import blob_store, db
+from hospital.models import AppointmentFile, DoctorFile, PatientFile, Upload
+from hospital.reports import report_version
+
+
+@pytest.fixture
+def visits(app):
+    # One visit a year ago and one next week; returns (doctor_id, patient_id)
+    with app.app_context():
+        doctor = DoctorFile(name="dr archive", email="archive@hospital.example", phone=8000000003,
+                            specialist="general", password="x")
+        patient = PatientFile(name="patient old", email="old@hospital.example", gender="others", age=60,
+                              password="x")
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        soon = datetime.now().replace(hour=10, minute=0, second=0, microsecond=0) + timedelta(days=7)
+        for when in (soon - timedelta(days=365), soon):
+            db.session.add(AppointmentFile(patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+                                           appointment_time=when))
+        db.session.commit()
+        return doctor.doctor_id, patient.patient_id
+
+
+def test_dashboard_and_report_include_archived_appointments(app, client, visits):
+    doctor_id, patient_id = visits
+    with app.app_context():
+        version = report_version(db.session, patient_id, doctor_id)
+        assert archive_appointments(db.session, datetime.now() - timedelta(days=30)) == 1
+        assert report_version(db.session, patient_id, doctor_id) == version
+
+    body = client.get(f"/doctor/{doctor_id}").get_data(as_text=True)
+    assert body.count("patient old dr archive") == 2
+
+
+def test_shared_blob_outlives_all_but_its_last_upload(app, visits):
+    _, patient_id = visits
+    with app.app_context():
+        digest, size = blob_store.put_bytes(b"same scan twice")
+        uploads = [Upload(filename=f"scan{i}.png", sha256=digest, size=size, patient_id=patient_id)
+                   for i in range(2)]
+        db.session.add_all(uploads)
+        db.session.commit()
+
+        db.session.delete(uploads[0])
+        db.session.commit()
+        assert blob_store.exists(digest)
+
+        db.session.delete(uploads[1])
+        db.session.commit()
+        assert not blob_store.exists(digest)
+
+
+def test_export_includes_archived_appointments(app, client, visits):
+    with app.app_context():
+        archive_appointments(db.session, datetime.now() - timedelta(days=30))
+    body = client.get("/export/appointments.csv").get_data(as_text=True)
+    assert len(body.strip().splitlines()) == 3
+
+
+def test_freeze_keeps_blobs_compression_would_grow(app):
+    with app.app_context():
+        small, _ = blob_store.put_bytes(b"0123456789")
+        large, _ = blob_store.put_bytes(b"ward 7 " * 10_000)
+        assert blob_store.freeze(small) is None
+        assert not blob_store.is_cold(small)
+        size, stored = blob_store.freeze(large)
+        assert stored < size and blob_store.is_cold(large)
+        with blob_store.open(large) as f:
+            assert f.read() == b"ward 7 " * 10_000
@@ -0,0 +1,23 @@
+import os
+
+from hospital import create_app
+from hospital.asgi import AsyncApp
+from hospital.extensions import db
+
+
+def test_async_engine_opens_the_same_sqlite_file(tmp_path, monkeypatch):
+    # A relative path means instance/ to Flask-SQLAlchemy, not the working directory
+    monkeypatch.chdir(tmp_path)
+    app = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "test",
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///relative.db",
+        "DB_AUTO_UPGRADE": False,
+        "SESSION_BACKEND": "memory",
+    })
+    with app.app_context():
+        sync_url = db.engine.url
+    asgi = AsyncApp(app)
+    asgi.start()
+    assert asgi.engine.url.drivername == "sqlite+aiosqlite"
+    assert asgi.engine.url.database == sync_url.database == os.path.join(app.instance_path, "relative.db")
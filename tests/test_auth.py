@@ -0,0 +1,49 @@
+import pytest
+from flask.json.tag import TaggedJSONSerializer
+
+from hospital.extensions import db, hasher, session_store
+from hospital.models import PatientFile
+
+
+def add_patient(app, email="login@hospital.example", password="right horse"):
+    with app.app_context():
+        db.session.add(PatientFile(name="patient login", email=email, gender="others", age=40,
+                                   password=hasher.hash(password)))
+        db.session.commit()
+
+
+def login(client, password, email="login@hospital.example", **kw):
+    return client.post("/login", data={"email": email, "password": password}, **kw)
+
+
+def test_login_issues_a_new_session_id(app, client):
+    add_patient(app)
+    login(client, "wrong")  # the flash message starts an anonymous session
+    before = client.get_cookie("session").value
+
+    response = login(client, "right horse")
+    assert response.status_code == 302
+    after = client.get_cookie("session").value
+    assert after != before
+    with app.app_context():
+        assert session_store.get(before) is None
+        assert TaggedJSONSerializer().loads(session_store.get(after))["user_type"] == "patient"
+
+
+def test_repeated_failures_for_one_email_are_throttled(app, client):
+    add_patient(app)
+    statuses = [login(client, "wrong").status_code for _ in range(6)]
+    assert statuses == [200] * 5 + [429]
+    # Another account from the same address is unaffected
+    assert login(client, "wrong", email="other@hospital.example").status_code == 200
+
+
+@pytest.mark.parametrize("app_config", [
+    {"TRUSTED_PROXIES": 1, "LOGIN_LIMIT_PER_IP": (2, 60), "LOGIN_LIMIT_PER_EMAIL": None},
+])
+def test_per_ip_limit_uses_the_forwarded_client_address(client):
+    def attempt(ip):
+        return login(client, "wrong", headers={"X-Forwarded-For": ip}).status_code
+
+    assert [attempt("10.1.0.1") for _ in range(3)] == [200, 200, 429]
+    assert attempt("10.1.0.2") == 200
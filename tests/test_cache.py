@@ -0,0 +1,53 @@
+from datetime import datetime
+
+import pytest
+
+from hospital.cache import make_cache
+from hospital.extensions import db
+from hospital.models import AppointmentFile, DoctorFile, PatientFile
+
+
+@pytest.fixture
+def doctor_id(app):
+    with app.app_context():
+        doctor = DoctorFile(name="dr cache", email="cache@hospital.example", phone=8000000008,
+                            specialist="general", password="x")
+        patient = PatientFile(name="patient one", email="one@hospital.example", gender="others", age=40,
+                              password="x")
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        db.session.add(AppointmentFile(patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+                                       appointment_time=datetime(2030, 1, 1, 10)))
+        db.session.commit()
+        return doctor.doctor_id
+
+
+def test_writes_invalidate_the_dashboard(app, client, doctor_id):
+    assert client.get(f"/doctor/{doctor_id}").get_data(as_text=True).count("patient one") == 1
+
+    with app.app_context():
+        db.session.add(AppointmentFile(patient_id=1, doctor_id=doctor_id, appointment_time=datetime(2030, 1, 2, 10)))
+        db.session.commit()
+    assert client.get(f"/doctor/{doctor_id}").get_data(as_text=True).count("patient one") == 2
+
+    with app.app_context():
+        db.session.get(PatientFile, 1).name = "patient renamed"
+        db.session.commit()
+    body = client.get(f"/doctor/{doctor_id}").get_data(as_text=True)
+    assert body.count("patient renamed") == 2 and "patient one" not in body
+
+
+def test_invalidation_reaches_other_workers(app):
+    # Two workers' caches: separate LRU entries, shared tag versions
+    with app.app_context():
+        first, second = make_cache(app.config, db.engine), make_cache(app.config, db.engine)
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        assert second.get_or_set("roster", ["doctors"], compute) == 1
+        assert second.get_or_set("roster", ["doctors"], compute) == 1
+        first.invalidate(["doctors"])
+        assert second.get_or_set("roster", ["doctors"], compute) == 2
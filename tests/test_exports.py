@@ -0,0 +1,35 @@
+from datetime import datetime
+
+import pytest
+
+from hospital.extensions import db
+from hospital.models import AppointmentFile, DoctorFile, PatientFile, TreatmentFile
+
+
+@pytest.fixture
+def seen(app):
+    # Patient 1 saw doctor 1; patient 2 saw doctor 2. Neither has a
+    # PatientFile.doctor_id, as patients signing up never do.
+    with app.app_context():
+        for i in (1, 2):
+            db.session.add(DoctorFile(name=f"dr {i}", email=f"dr{i}@hospital.example", phone=8000000000 + i,
+                                      specialist="general", password="x"))
+            db.session.add(PatientFile(name=f"patient {i}", email=f"p{i}@hospital.example", gender="others",
+                                       age=40, password="x"))
+        db.session.flush()
+        for i in (1, 2):
+            db.session.add(AppointmentFile(patient_id=i, doctor_id=i,
+                                           appointment_time=datetime(2030, 1, 1, 10 + i)))
+            db.session.add(TreatmentFile(diagnosis=f"diagnosis {i}", report_path=f"r{i}.pdf", patient_id=i))
+        db.session.commit()
+
+
+@pytest.mark.parametrize("resource, text", [
+    ("patients", "patient {}"),
+    ("appointments", "2030-01-01 1{}:00:00"),
+    ("treatments", "diagnosis {}"),
+])
+def test_doctor_filter(client, seen, resource, text):
+    body = client.get(f"/export/{resource}.csv?doctor_id=1").get_data(as_text=True)
+    assert text.format(1) in body
+    assert text.format(2) not in body
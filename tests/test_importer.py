@@ -0,0 +1,65 @@
+import csv
+import json
+
+import pytest
+
+from hospital.admin import IMPORT_SPECS
+from hospital.extensions import db
+from hospital.importer import Importer
+from hospital.models import AppointmentFile, DoctorFile, PatientFile
+
+
+@pytest.fixture
+def people(app):
+    with app.app_context():
+        db.session.add_all([
+            DoctorFile(name="dr import", email="import@hospital.example", phone=8000000004, specialist="general",
+                       password="x"),
+            PatientFile(name="patient import", email="import@patient.example", gender="others", age=50,
+                        password="x"),
+        ])
+        db.session.commit()
+
+
+def test_unreadable_json_lines_are_reported_per_row(app, tmp_path, people):
+    path = tmp_path / "appointments.jsonl"
+    good = {"patient_id": 1, "doctor_id": 1, "description": "checkup"}
+    path.write_text("\n".join([
+        json.dumps(dict(good, appointment_time="2030-01-01T09:00:00")),
+        '{"patient_id": 1, "doctor_id": ',
+        json.dumps([1, 1, "2030-01-01T09:30:00"]),
+        json.dumps(dict(good, appointment_time="2030-01-01T10:00:00")),
+    ]) + "\n", encoding="utf-8")
+
+    with app.app_context():
+        summary = Importer(db.session, hasher=None).run(IMPORT_SPECS["appointments"], str(path))
+        assert db.session.query(AppointmentFile).count() == 2
+
+    assert summary["imported"] == 2
+    assert summary["failed"] == 2
+    with open(summary["error_report"], newline="", encoding="utf-8") as f:
+        errors = list(csv.DictReader(f))
+    assert [e["row"] for e in errors] == ["2", "3"]
+    assert errors[0]["error"].startswith("invalid JSON")
+    assert errors[1]["error"] == "expected a JSON object, got list"
+
+
+def test_appointments_for_missing_patient_or_doctor_are_reported(app, tmp_path, people):
+    path = tmp_path / "appointments.csv"
+    path.write_text(
+        "patient_id,doctor_id,appointment_time,description\n"
+        "1,1,2030-01-01T09:00:00,checkup\n"
+        "7,1,2030-01-01T09:30:00,unknown patient\n"
+        "1,9,2030-01-01T10:00:00,unknown doctor\n",
+        encoding="utf-8",
+    )
+
+    with app.app_context():
+        summary = Importer(db.session, hasher=None).run(IMPORT_SPECS["appointments"], str(path))
+        assert [a.description for a in AppointmentFile.query] == ["checkup"]
+
+    assert (summary["imported"], summary["failed"]) == (1, 2)
+    with open(summary["error_report"], newline="", encoding="utf-8") as f:
+        errors = list(csv.DictReader(f))
+    assert [(e["row"], e["error"]) for e in errors] == [("2", "patient_id 7 does not exist"),
+                                                        ("3", "doctor_id 9 does not exist")]
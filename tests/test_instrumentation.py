@@ -0,0 +1,47 @@
+import re
+import threading
+
+import pytest
+
+from hospital.extensions import db
+from hospital.models import DoctorFile
+
+
+@pytest.mark.parametrize("app_config", [{"SLOW_QUERY_SECONDS": 0}])
+def test_slow_queries_are_counted_by_endpoint_and_sampled_elsewhere(client):
+    for _ in range(2):
+        client.get("/doctor/1/slots")
+
+    body = client.get("/metrics").get_data(as_text=True)
+    series = [line.rsplit(" ", 1)[0] for line in body.splitlines() if line and not line.startswith("#")]
+    assert len(series) == len(set(series))
+    assert "sql=" not in body
+    count = re.search(r'^db_slow_queries_total\{endpoint="doctor.free_slots"\} (\d+)$', body, re.M)
+    assert count and int(count.group(1)) >= 2
+
+    samples = client.get("/metrics/slow-queries").json["samples"]
+    assert any(s["endpoint"] == "doctor.free_slots" and "doctor_file" in s["sql"] for s in samples)
+
+
+@pytest.mark.parametrize("app_config", [{"PROFILER_ENABLED": True}])
+def test_profiler_stops_when_the_view_raises(app, client):
+    @app.route("/test/boom")
+    def boom():
+        raise RuntimeError("boom")
+
+    threads = threading.active_count()
+    with pytest.raises(RuntimeError):
+        client.get("/test/boom?_profile=1")
+    assert threading.active_count() == threads
+
+
+@pytest.mark.parametrize("app_config", [{"PROFILER_ENABLED": True}])
+def test_profiler_returns_collapsed_stacks(app, client):
+    with app.app_context():
+        db.session.add(DoctorFile(name="dr prof", email="prof@hospital.example", phone=8000000009,
+                                  specialist="general", password="x"))
+        db.session.commit()
+    threads = threading.active_count()
+    response = client.get("/doctor/1/slots?_profile=1")
+    assert response.mimetype == "text/plain"
+    assert threading.active_count() == threads
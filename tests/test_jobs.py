@@ -0,0 +1,109 @@
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from hospital.extensions import db
+from hospital.jobs import TASKS, Worker, make_job, task
+from hospital.models import Job
+
+
+@task("test.record")
+def _record(n):
+    return {"n": n}
+
+
+@task("test.broken", max_attempts=2)
+def _broken():
+    raise RuntimeError("scanner offline")
+
+
+def add_jobs(app, kind, payloads):
+    with app.app_context():
+        jobs = [make_job(kind, payload, app.config) for payload in payloads]
+        db.session.add_all(jobs)
+        db.session.commit()
+        return [job.id for job in jobs]
+
+
+def make_due(app, job_id, **values):
+    # Stands in for time passing: the lease or the retry backoff runs out
+    values = values or {"run_after": datetime.utcnow() - timedelta(seconds=1)}
+    with app.app_context():
+        db.session.execute(update(Job).where(Job.id == job_id).values(**values))
+        db.session.commit()
+
+
+def test_concurrent_workers_never_claim_the_same_job(app):
+    job_ids = add_jobs(app, "test.record", [{"n": n} for n in range(20)])
+    barrier = threading.Barrier(4)
+    claimed = {}
+
+    def drain(name):
+        with app.app_context():
+            worker = Worker(db.session, app.config, worker_id=name)
+            mine = claimed[name] = []
+            barrier.wait()
+            while (job := worker.claim()) is not None:
+                mine.append(job.id)
+
+    threads = [threading.Thread(target=drain, args=(f"worker-{i}",)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    everything = [job_id for ids in claimed.values() for job_id in ids]
+    assert sorted(everything) == job_ids
+    with app.app_context():
+        assert {job.attempts for job in Job.query} == {1}
+
+
+def test_expired_lease_is_handed_to_another_worker(app):
+    [job_id] = add_jobs(app, "test.record", [{"n": 1}])
+    with app.app_context():
+        first = Worker(db.session, app.config, worker_id="first")
+        assert first.claim().id == job_id
+        second = Worker(db.session, app.config, worker_id="second")
+        assert second.claim() is None
+
+    make_due(app, job_id, locked_until=datetime.utcnow() - timedelta(seconds=1))
+    with app.app_context():
+        assert second.run_once()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts, job.result) == ("succeeded", 2, '{"n": 1}')
+
+
+def test_failed_job_is_retried_then_marked_failed(app):
+    assert TASKS["test.broken"].max_attempts == 2
+    [job_id] = add_jobs(app, "test.broken", [{}])
+    with app.app_context():
+        worker = Worker(db.session, app.config, worker_id="retry")
+        assert worker.run_once()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts, job.locked_by) == ("queued", 1, None)
+        assert job.error == "RuntimeError: scanner offline"
+        # Backing off, so not due yet
+        assert job.run_after > datetime.utcnow()
+        assert not worker.run_once()
+
+    make_due(app, job_id)
+    with app.app_context():
+        assert worker.run_once()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.attempts) == ("failed", 2)
+        assert job.finished_at is not None
+        make_due(app, job_id)
+        assert not worker.run_once()
+
+
+def test_lease_expiring_on_last_attempt_is_reaped(app):
+    [job_id] = add_jobs(app, "test.broken", [{}])
+    make_due(app, job_id, status="running", attempts=2, locked_by="gone",
+             locked_until=datetime.utcnow() - timedelta(seconds=1))
+    with app.app_context():
+        worker = Worker(db.session, app.config, worker_id="reaper")
+        assert worker.claim() is None
+        worker.reap()
+        job = db.session.get(Job, job_id)
+        assert (job.status, job.error, job.locked_by) == ("failed", "lease expired", None)
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from sqlalchemy import func, select, text
+
+from hospital.extensions import db
+from hospital.migrations import upgrade_database
+from hospital.models import AppointmentFile, DoctorFile, DoctorPatientLoad, LoginIdentity, PatientFile
+
+
+def test_upgrade_refills_derived_tables_left_empty(app):
+    with app.app_context():
+        db.session.add(DoctorFile(name="dr mig", email="mig@hospital.example", phone=8000000005,
+                                  specialist="general", password="x"))
+        db.session.add(PatientFile(name="patient mig", email="PMig@hospital.example ", gender="others", age=40,
+                                   password="x"))
+        db.session.flush()
+        db.session.add(AppointmentFile(patient_id=1, doctor_id=1, appointment_time=datetime(2030, 1, 1, 10)))
+        db.session.commit()
+        # As after an upgrade that created these tables and then failed
+        with db.engine.begin() as conn:
+            for name in ("login_identity", "appointment_daily", "doctor_patient_load"):
+                conn.execute(text(f"DELETE FROM {name}"))
+
+        changes, conflicts = upgrade_database(db.engine)
+
+        assert conflicts == []
+        assert "backfilled login_identity" in changes
+        assert "backfilled appointment_daily, doctor_patient_load" in changes
+        emails = db.session.scalars(select(LoginIdentity.email).order_by(LoginIdentity.email)).all()
+        assert emails == ["mig@hospital.example", "pmig@hospital.example"]
+        assert db.session.scalar(select(func.sum(DoctorPatientLoad.appointments))) == 1
+        # Filled tables are left alone
+        assert not [change for change in upgrade_database(db.engine)[0] if change.startswith("backfilled")]
+
+
+def test_double_bookings_are_reported_not_fatal(app):
+    with app.app_context():
+        db.session.add(DoctorFile(name="dr dup", email="dup@hospital.example", phone=8000000006,
+                                  specialist="general", password="x"))
+        for i in (1, 2):
+            db.session.add(PatientFile(name=f"patient {i}", email=f"dup{i}@hospital.example", gender="others",
+                                       age=40, password="x"))
+        db.session.flush()
+        db.session.commit()
+        # A database from before the constraint, already double-booked
+        with db.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE appointment_file RENAME TO appointment_old"))
+            conn.execute(text("CREATE TABLE appointment_file AS SELECT * FROM appointment_old"))
+            conn.execute(text("DROP TABLE appointment_old"))
+            for patient_id in (1, 2):
+                conn.execute(text(
+                    "INSERT INTO appointment_file (appointment_id, patient_id, doctor_id, appointment_time) "
+                    "VALUES (:id, :id, 1, '2030-01-01 10:00:00.000000')"
+                ), {"id": patient_id})
+
+        changes, conflicts = upgrade_database(db.engine)
+        assert "added index uq_appointment_doctor_time" not in changes
+        assert len(conflicts) == 1 and "appointments-double-booked" in conflicts[0]
+
+    result = app.test_cli_runner().invoke(args=["appointments-double-booked", "--cancel-later"])
+    assert "appointment 1 (patient 1), appointment 2 (patient 2)" in result.output
+    assert "cancelled 1 appointments" in result.output
+
+    with app.app_context():
+        changes, conflicts = upgrade_database(db.engine)
+        assert conflicts == [] and "added index uq_appointment_doctor_time" in changes
+        assert db.session.scalars(select(AppointmentFile.patient_id)).all() == [1]
@@ -0,0 +1,56 @@
+import pytest
+from sqlalchemy import update
+
+from hospital.extensions import db
+from hospital.listings import LISTINGS
+from hospital.models import PatientFile, TreatmentFile
+
+
+@pytest.fixture
+def patients(app):
+    with app.app_context():
+        for i, name in enumerate(["abc", "ab_x", "abd", "a%b", "ABc"]):
+            db.session.add(PatientFile(name=name, email=f"p{i}@hospital.example", gender="others", age=40,
+                                       password="x"))
+        db.session.commit()
+
+
+@pytest.mark.parametrize("value, names", [
+    ("ab", ["ab_x", "abc", "abd"]),
+    ("ab_", ["ab_x"]),
+    ("a%", ["a%b"]),
+    ("AB", ["ABc"]),
+])
+def test_prefix_filter_matches_literal_prefix(app, patients, value, names):
+    with app.app_context():
+        query = LISTINGS["patients"].filters["name"](PatientFile.query, value)
+        assert sorted(p.name for p in query) == names
+
+
+def test_prefix_filter_is_an_index_range_search(app, patients):
+    with app.app_context():
+        statement = LISTINGS["patients"].filters["name"](PatientFile.query, "ab").statement
+        sql = str(statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[-1] for row in db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+        assert "SEARCH patient_file USING INDEX ix_patient_file_name" in plan
+
+
+@pytest.mark.parametrize("sort", ["updated_at", "-updated_at"])
+def test_nullable_sort_pages_through_every_row(app, patients, sort):
+    with app.app_context():
+        for i in range(7):
+            db.session.add(TreatmentFile(diagnosis=f"d{i}", report_path=f"r{i}.pdf", patient_id=1))
+        db.session.commit()
+        # Rows from before updated_at existed
+        db.session.execute(update(TreatmentFile).where(TreatmentFile.treatment_id.in_([2, 3, 5]))
+                           .values(updated_at=None))
+        db.session.commit()
+
+        seen, cursor = [], None
+        while True:
+            page = LISTINGS["treatments"].page({"sort": sort, "cursor": cursor}, limit=2)
+            seen += [t.treatment_id for t in page.items]
+            cursor = page.next_cursor
+            if cursor is None:
+                break
+        assert sorted(seen) == list(range(1, 8)) and len(seen) == 7
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from hospital.extensions import db
+from hospital.models import AppointmentFile, DoctorFile, PatientFile
+from hospital.querycount import QueryBudgetExceeded, query_budget
+
+
+APPOINTMENTS = 25
+
+
+@pytest.fixture
+def doctor_id(app):
+    # One doctor with APPOINTMENTS patients, all seen today
+    with app.app_context():
+        doctor = DoctorFile(name="dr budget", email="budget@hospital.example", phone=8000000001,
+                            specialist="general", password="x")
+        db.session.add(doctor)
+        db.session.flush()
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        for i in range(APPOINTMENTS):
+            patient = PatientFile(name=f"patient {i}", email=f"patient{i}@hospital.example", gender="others",
+                                  age=40, password="x", doctor_id=doctor.doctor_id)
+            db.session.add(patient)
+            db.session.flush()
+            db.session.add(AppointmentFile(patient_id=patient.patient_id, doctor_id=doctor.doctor_id,
+                                           appointment_time=today + timedelta(minutes=i)))
+        db.session.commit()
+        return doctor.doctor_id
+
+
+@pytest.mark.parametrize("path", ["/doctor/{}", "/doctor/{}/patients", "/allPatients/{}"])
+def test_doctor_views_stay_within_budget(client, doctor_id, path):
+    # Over budget raises QueryBudgetExceeded under TESTING
+    response = client.get(path.format(doctor_id))
+    assert response.status_code == 200
+    assert response.get_data(as_text=True).count("patient ") == APPOINTMENTS
+
+
+def test_lazy_route_exceeds_budget(app, client, doctor_id):
+    @app.route("/test/lazy/<int:doctor_id>")
+    @query_budget(2)
+    def lazy(doctor_id):
+        # One query for the appointments, then one per lazy-loaded patient
+        return ",".join(a.patient.name for a in AppointmentFile.query.filter_by(doctor_id=doctor_id))
+
+    with pytest.raises(QueryBudgetExceeded, match="budget is 2"):
+        client.get(f"/test/lazy/{doctor_id}")
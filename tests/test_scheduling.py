@@ -0,0 +1,119 @@
+import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, delete, func, select
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from hospital.extensions import db
+from hospital.models import AppointmentFile, DoctorFile, PatientFile
+from hospital.scheduling import Scheduler, SlotUnavailable
+
+
+DOCTORS = 2
+PATIENTS = 50
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'booking.db'}", connect_args={"timeout": 30})
+    db.metadata.create_all(engine)
+    with engine.begin() as conn:
+        conn.execute(DoctorFile.__table__.insert(), [
+            {"name": f"doctor{i}", "email": f"doctor{i}@hospital.example", "phone": 8000000000 + i,
+             "specialist": "general", "password": "x"}
+            for i in range(DOCTORS)
+        ])
+        conn.execute(PatientFile.__table__.insert(), [
+            {"name": f"patient{i}", "email": f"patient{i}@hospital.example", "gender": "others",
+             "age": 40, "password": "x"}
+            for i in range(PATIENTS)
+        ])
+    yield engine
+    engine.dispose()
+
+
+def make_scheduler(engine, **kwargs):
+    return Scheduler(scoped_session(sessionmaker(engine)), AppointmentFile, **kwargs)
+
+
+def tomorrow_at(hour, minute=0):
+    day = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    return day.replace(hour=hour, minute=minute)
+
+
+def test_concurrent_reservations_never_double_book(engine):
+    # Separate schedulers stand in for worker processes with their own indexes
+    schedulers = [make_scheduler(engine, retries=20) for _ in range(4)]
+    slots = [tomorrow_at(h, m) for h in range(9, 17) for m in (0, 30)]
+    rng = random.Random(0)
+    attempts = [(rng.choice(schedulers), rng.randint(1, PATIENTS), rng.randint(1, DOCTORS), rng.choice(slots))
+                for _ in range(400)]
+
+    def book(attempt):
+        scheduler, patient_id, doctor_id, start = attempt
+        try:
+            scheduler.reserve(patient_id, doctor_id, start)
+            return True
+        except SlotUnavailable:
+            return False
+        finally:
+            scheduler.session.remove()
+
+    with ThreadPoolExecutor(16) as pool:
+        booked = sum(pool.map(book, attempts))
+
+    with engine.connect() as conn:
+        doubles = conn.execute(
+            select(AppointmentFile.doctor_id, AppointmentFile.appointment_time)
+            .group_by(AppointmentFile.doctor_id, AppointmentFile.appointment_time)
+            .having(func.count() > 1)
+        ).all()
+        rows = conn.execute(select(func.count()).select_from(AppointmentFile)).scalar()
+    assert not doubles
+    assert rows == booked
+    assert booked <= len(slots) * DOCTORS
+
+
+def test_past_slots_cannot_be_booked(engine):
+    scheduler = make_scheduler(engine)
+    yesterday = tomorrow_at(10) - timedelta(days=2)
+    assert not scheduler.is_free(1, yesterday)
+    with pytest.raises(SlotUnavailable, match="already passed"):
+        scheduler.reserve(1, 1, yesterday)
+    assert all(start > datetime.now() for start in scheduler.next_free(1, yesterday, n=3))
+
+
+def test_slot_cancelled_by_another_worker_can_be_rebooked(engine):
+    first, second = make_scheduler(engine), make_scheduler(engine)
+    start = tomorrow_at(11)
+    first.reserve(1, 1, start)
+    assert not second.is_free(1, start)
+
+    # Cancelled outside `second`, which still has the booking in its index
+    with engine.begin() as conn:
+        conn.execute(delete(AppointmentFile).where(AppointmentFile.appointment_time == start))
+    assert second.reserve(2, 1, start).patient_id == 2
+
+
+def test_index_reloads_after_ttl(engine):
+    first, second = make_scheduler(engine), make_scheduler(engine, index_ttl=0)
+    start = tomorrow_at(12)
+    first.reserve(1, 1, start)
+    assert not second.is_free(1, start)
+    with engine.begin() as conn:
+        conn.execute(delete(AppointmentFile).where(AppointmentFile.appointment_time == start))
+    assert second.is_free(1, start)
+
+
+@pytest.mark.parametrize("n, status, count", [("0", 200, 1), ("-5", 200, 1), ("3", 200, 3), ("x", 400, None)])
+def test_free_slots_bounds_n(app, client, n, status, count):
+    with app.app_context():
+        db.session.add(DoctorFile(name="dr slots", email="slots@hospital.example", phone=8000000007,
+                                  specialist="general", password="x"))
+        db.session.commit()
+    response = client.get("/doctor/1/slots", query_string={"n": n})
+    assert response.status_code == status
+    if count is not None:
+        assert len(response.json["slots"]) == count
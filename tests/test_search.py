@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import text
+
+from hospital import search as search_module
+from hospital.extensions import db
+from hospital.migrations import upgrade_database
+from hospital.models import PatientFile
+
+
+@pytest.fixture
+def patients(app):
+    with app.app_context():
+        for i, name in enumerate(["Al", "Alma", "alfred", "A%l", "Bo"]):
+            db.session.add(PatientFile(name=name, email=f"p{i}@hospital.example", gender="others", age=40,
+                                       password="x"))
+        db.session.commit()
+
+
+@pytest.mark.parametrize("query, names", [
+    ("Al", ["Al", "Alma", "alfred"]),
+    ("al", ["Al", "Alma", "alfred"]),
+    ("A%", ["A%l"]),
+    ("P4", ["Bo"]),
+])
+def test_short_query_is_a_case_insensitive_literal_prefix(client, patients, query, names):
+    response = client.get("/search", query_string={"q": query, "scope": "patients"})
+    assert response.status_code == 200
+    assert sorted(p["name"] for p in response.json["patients"]) == names
+
+
+def test_short_query_uses_name_and_email_indexes(app, patients):
+    with app.app_context():
+        plan = " ".join(row[-1] for row in db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {search_module.SQLiteSearch.PREFIX_QUERY}", {"q": "al", "end": "al￿", "limit": 5}
+        ))
+        assert "USING INDEX ix_patient_file_name_lower" in plan
+        assert "USING INDEX ix_patient_file_email_lower" in plan
+
+
+def test_missing_index_is_reported_until_another_process_builds_it(app, client, patients):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP TABLE patient_search"))
+            conn.execute(text("DROP TABLE treatment_search"))
+        search_module._ready.pop(db.engine.url, None)
+
+    response = client.get("/search", query_string={"q": "Alma"})
+    assert response.status_code == 503
+    assert "search-reindex" in response.json["error"]
+
+    with app.app_context():
+        # As `flask search-reindex` would from another process: this one's cache is untouched
+        with db.engine.begin() as conn:
+            search_module.backend_for(conn).reindex(conn)
+        db.session.add(PatientFile(name="Almira", email="almira@hospital.example", gender="others", age=30,
+                                   password="x"))
+        db.session.commit()
+
+    response = client.get("/search", query_string={"q": "Almira", "scope": "patients"})
+    assert response.status_code == 200
+    assert "Almira" in [p["name"] for p in response.json["patients"]]
+
+
+def test_upgrade_builds_a_missing_or_empty_index(app, client, patients):
+    with app.app_context():
+        with db.engine.begin() as conn:
+            conn.execute(text("DROP TABLE treatment_search"))
+            conn.execute(text("DELETE FROM patient_search"))
+        search_module._ready.pop(db.engine.url, None)
+        assert "ran _build_search_index" in upgrade_database(db.engine)[0]
+
+    response = client.get("/search", query_string={"q": "Alma", "scope": "patients"})
+    assert response.status_code == 200
+    assert "Alma" in [p["name"] for p in response.json["patients"]]
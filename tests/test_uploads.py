@@ -0,0 +1,114 @@
+import hashlib
+import threading
+
+import pytest
+
+from hospital.extensions import db
+from hospital.models import PatientFile, Upload, UploadSession
+
+
+DATA = b"resumable scan"  # three chunks of 5, 5 and 4 bytes
+
+
+def sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+@pytest.fixture
+def app_config():
+    return {"UPLOAD_CHUNK_SIZE": 5, "UPLOAD_MAX_SESSIONS": 3}
+
+
+@pytest.fixture
+def patient_id(app):
+    with app.app_context():
+        patient = PatientFile(name="patient upload", email="upload@hospital.example", gender="others", age=30,
+                              password="x")
+        db.session.add(patient)
+        db.session.commit()
+        return patient.patient_id
+
+
+def start(client, patient_id, data=DATA, digest=None):
+    response = client.post(f"/upload/{patient_id}/sessions",
+                           json={"filename": "scan.bin", "size": len(data), "sha256": digest or sha(data)})
+    return response
+
+
+def put(client, session_id, number, chunk, digest=None):
+    return client.put(f"/upload_sessions/{session_id}/chunks/{number}", data=chunk,
+                      headers={"X-Chunk-SHA256": digest or sha(chunk)})
+
+
+def put_all(client, session_id, data=DATA):
+    for number in range(0, len(data), 5):
+        assert put(client, session_id, number // 5, data[number:number + 5]).status_code == 200
+
+
+def test_chunk_not_matching_its_checksum_is_rejected(client, patient_id):
+    session_id = start(client, patient_id).get_json()["id"]
+    response = put(client, session_id, 0, b"resum", digest=sha(b"other"))
+    assert response.status_code == 422
+    assert response.get_json()["sha256"] == sha(b"resum")
+    assert client.get(f"/upload_sessions/{session_id}").get_json()["received"] == []
+
+    assert put(client, session_id, 0, b"resum").status_code == 200
+    assert client.get(f"/upload_sessions/{session_id}").get_json()["received"] == [0]
+
+
+def test_commit_with_missing_chunk_is_refused(app, client, patient_id):
+    session_id = start(client, patient_id).get_json()["id"]
+    put(client, session_id, 0, DATA[:5])
+    put(client, session_id, 2, DATA[10:])
+
+    response = client.post(f"/upload_sessions/{session_id}/commit")
+    assert response.status_code == 409
+    assert response.get_json()["missing"] == [1]
+    assert response.get_json()["status"] == "open"
+    with app.app_context():
+        assert db.session.query(Upload).count() == 0
+
+
+def test_file_not_matching_declared_sha_fails_the_session(app, client, patient_id):
+    session_id = start(client, patient_id, digest=sha(b"something else")).get_json()["id"]
+    put_all(client, session_id)
+
+    response = client.post(f"/upload_sessions/{session_id}/commit")
+    assert response.status_code == 422
+    assert response.get_json()["sha256"] == sha(DATA)
+    assert client.get(f"/upload_sessions/{session_id}").get_json()["status"] == "failed"
+    with app.app_context():
+        assert db.session.query(Upload).count() == 0
+
+
+def test_session_is_committed_once(app, client, patient_id):
+    session_id = start(client, patient_id).get_json()["id"]
+    put_all(client, session_id)
+
+    first = client.post(f"/upload_sessions/{session_id}/commit")
+    assert first.status_code == 201
+    assert client.get(first.headers["Location"]).data == DATA
+    assert client.post(f"/upload_sessions/{session_id}/commit").status_code == 409
+    with app.app_context():
+        assert db.session.query(Upload).count() == 1
+
+
+def test_concurrent_creates_stay_within_session_limit(app, patient_id):
+    barrier = threading.Barrier(8)
+    statuses = []
+
+    def create():
+        client = app.test_client()
+        barrier.wait()
+        statuses.append(start(client, patient_id).status_code)
+
+    threads = [threading.Thread(target=create) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) <= {201, 429}
+    assert 0 < statuses.count(201) <= 3
+    with app.app_context():
+        assert db.session.query(UploadSession).count() == statuses.count(201)